@@ -1,155 +1,887 @@
-import open3d as o3d
+import threading
+import time
+from datetime import datetime
+
 import numpy as np
-import pyzed.sl as sl
 import cv2
 
 from PyQt5.QtCore import QThread, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QImage
 
+from buffer_pool import BufferPool, peak_rss_mb
+from change_detector import FULL, UNCHANGED, ChangeDetector, RegionCache
+from cloud_filters import CloudFilter
+from depth_colorizer import DepthColorizer
+from instrumentation import JsonLinesLog, Profiler
+from display import INTERPOLATIONS, ImageRing, fit_size, resize_into
+from frame_source import ZEDFrameSource
+from pipeline import Frame, FrameInfo, OutputSubscriptions, SlotRing, StageWorker
+from plane_segmentation import PlaneSegmenter, mark_planes
+from organized_cloud import OrganizedCloud
+from point_cloud import PointCloudProcessor
+from point_cloud_export import SnapshotExporter
+from point_cloud_lod import DEFAULT_POINT_BUDGET, PointCloudLOD
+from process_pool import ProcessPointCloudPool
+from quality_controller import QualityController, knobs_from_bounds
+from scene_map import SceneMap
+from voxel_grid import voxel_downsample
+
+
+# Outputs consumers can subscribe to, grouped by the stage that produces them.
+# A stage's data is only retrieved from the SDK on frames where one of its outputs is due.
+STAGE_OUTPUTS = {
+    "image": ("left", "right", "side_by_side"),
+    "depth": ("depth_view", "depth"),
+    "point_cloud": ("point_cloud",),
+}
+OUTPUTS = tuple(output for outputs in STAGE_OUTPUTS.values() for output in outputs)
+DEPTH_OUTPUTS = {"depth_view", "depth", "point_cloud"}
+# What a bare ZEDCameraThread shows: the previous always-on behaviour
+DEFAULT_OUTPUTS = ("left", "depth_view", "point_cloud")
+
+
 class ZEDCameraThread(QThread):
-    image_signal = pyqtSignal(QImage)
-    depth_signal = pyqtSignal(QImage)
+    # Every output carries the FrameInfo (grab id, timestamp) of its capture
+    # so consumers can pair image, depth and cloud from the same grab.
+    # Image and depth are sent as display.DisplayImage objects; the GUI must
+    # release() them after painting so their buffers can be reused.
+    # The point cloud is sent as a point_cloud_lod.RenderBatch, released by
+    # the 3D view once it has been replaced on screen.
+    image_signal = pyqtSignal(object)
+    depth_signal = pyqtSignal(object)
+    display_size_signal = pyqtSignal(str, int, int)
+    display_interpolation_signal = pyqtSignal(str)
     camera_selection_signal = pyqtSignal(str)
     depth_option_signal = pyqtSignal(str)
-
-    point_cloud_signal = pyqtSignal(np.ndarray)
-                                    
-    def __init__(self):
+    depth_auto_range_signal = pyqtSignal(bool)
+    view_position_signal = pyqtSignal(float, float, float)
+    point_budget_signal = pyqtSignal(int)
+    scene_map_signal = pyqtSignal(bool)
+    snapshot_signal = pyqtSignal()
+    snapshot_every_signal = pyqtSignal(int)
+    organized_cloud_signal = pyqtSignal(bool)
+    pick_signal = pyqtSignal(float, float)
+    pick_result_signal = pyqtSignal(object)
+
+    point_cloud_signal = pyqtSignal(object)
+    # (info, float32 depth) at full resolution, a copy per frame; only while "depth" is subscribed
+    raw_depth_signal = pyqtSignal(object, object)
+    # (output, consumer, rate Hz, 0 = every frame) / (consumer, output or "" for all)
+    subscribe_signal = pyqtSignal(str, str, float)
+    unsubscribe_signal = pyqtSignal(str, str)
+    pipeline_stats_signal = pyqtSignal(dict)
+    # Adaptive quality: target FPS (0 = off), pinned level (-1 = automatic) and the applied settings
+    target_fps_signal = pyqtSignal(float)
+    quality_level_signal = pyqtSignal(int)
+    quality_signal = pyqtSignal(dict)
+    # Span percentiles (instrumentation.Profiler.snapshot) once per second while profiling is on
+    profile_signal = pyqtSignal(dict)
+    profile_enabled_signal = pyqtSignal(bool)
+    # Static-scene gating on/off and its region of interest (left, top, right, bottom in 0-1; all 0 = whole frame).
+    # Skip rate and saved ms per second arrive with pipeline_stats_signal under "static".
+    static_scene_signal = pyqtSignal(bool)
+    static_roi_signal = pyqtSignal(float, float, float, float)
+    # Plane segmentation "off" / "mark" (tint plane points) / "remove" (drop them from view, map and exports);
+    # plane_signal carries PlaneResult.summary() for every segmented cloud.
+    plane_mode_signal = pyqtSignal(str)
+    plane_signal = pyqtSignal(dict)
+    # Early cloud filters (cloud_filters) on/off; removed points per filter and the estimated
+    # downstream time saved arrive with pipeline_stats_signal under "filters".
+    cloud_filter_signal = pyqtSignal(bool)
+    # (state, message): "loading" SDK import, "opening" zed.open, "streaming" from
+    # the first grabbed frame, then "stopped"; "failed" carries the error instead.
+    camera_state_signal = pyqtSignal(str, str)
+
+    def __init__(self, mailbox_capacity=1, point_budget=DEFAULT_POINT_BUDGET, snapshot_format=".ply",
+                 point_cloud_workers=0, point_cloud_delivery="ordered", outputs=DEFAULT_OUTPUTS, quality=None,
+                 profile=False, profile_log=None, source=None, static_scene=None, planes=None,
+                 cloud_filter=None):
         super().__init__()
         self.pointData = []
-
-    def cameraStart(self):
-        self.zed = sl.Camera()
-        self.running = True
+        self.mailbox_capacity = mailbox_capacity
+        self.depth_minimum_distance = 0.4
+        self.depth_maximum_distance = 5
+        self.depth_auto_range_interval = 15
+        self.depth_colorizer = DepthColorizer(self.depth_minimum_distance, self.depth_maximum_distance)
+        self.display_sizes = {"camera": (0, 0), "depth": (0, 0)}
+        self.display_interpolation = INTERPOLATIONS["Area"]
+        self.image_ring = ImageRing()
+        self.depth_ring = ImageRing()
+        self.stages = {}
+        self.frame_cost = {}
+        # One pool per stage thread: hot-loop arrays are reused instead of allocated per frame
+        self.depth_pool = BufferPool()
+        self.point_cloud_processor = PointCloudProcessor(voxel_size=0.01)
+        self.point_cloud_lod = PointCloudLOD(point_budget, pool=self.point_cloud_processor.pool)
+        self.scene_map = SceneMap(voxel_size=0.02)
+        self.scene_mapping = False
+        self.scene_map_reset = False
+        self.snapshot_format = snapshot_format
+        self.snapshot_every = 0
+        self.snapshot_requested = False
+        self.snapshot_exporter = None
+        # Organized mode keeps the HxW grid and decimates by stride instead of voxelizing
+        self.organized_cloud = False
+        self.organized_stride = 2
+        self.pick_request = None
+        # > 0: decode/voxelize in worker processes (process_pool), away from the GUI's GIL
+        self.point_cloud_workers = point_cloud_workers
+        self.point_cloud_delivery = point_cloud_delivery
+        self.point_cloud_pool = None
+        # Demand-driven outputs: nothing is retrieved or computed without a subscriber
+        self.outputs = OutputSubscriptions(OUTPUTS)
+        for output in outputs:
+            self.outputs.subscribe(output, "default")
+        # Voxel size, cloud stride, display and depth scale follow the quality controller;
+        # its level 0 is the fixed configuration above. quality: target_fps, levels, bounds.
+        quality = quality or {}
+        self.quality = QualityController(
+            quality.get("target_fps", 0), knobs_from_bounds(quality.get("bounds", {})), quality.get("levels", 6)
+        )
+        self.quality_lock = threading.Lock()
+        self.stage_ms = {}
+        self.apply_quality(self.quality.settings())
+        # Spans around every hot-path step; disabled, a span is a shared no-op
+        self.profiler = Profiler(enabled=profile)
+        self.profile_log = JsonLinesLog(profile_log) if profile_log else None
+        # Static-scene gating (change_detector): the depth view is reused and the cloud recomputed
+        # per grid cell only where sampled depth / color changed. static_scene: ChangeDetector settings.
+        static_scene = static_scene or {}
+        self.depth_change = ChangeDetector(**static_scene)
+        self.cloud_change = ChangeDetector(**static_scene)
+        self.depth_view_key = None
+        self.cloud_cache = RegionCache()
+        # Batched RANSAC planes on the reduced cloud, before the scene map and level of detail.
+        # planes: "mode" plus PlaneSegmenter settings.
+        planes = dict(planes or {})
+        self.plane_mode = planes.pop("mode", "off")
+        self.plane_segmenter = PlaneSegmenter(**planes)
+        self.plane_result = None
+        self.plane_view = None
+        # Cropping and outlier removal on the HxW grid, before any per-point work.
+        # cloud_filter: CloudFilter settings.
+        self.cloud_filter = CloudFilter(**(cloud_filter or {}))
+        self.camera_size = None
+        # frame_source.FrameSource to grab from; None opens the ZED (HD2K, NEURAL depth in meters) on each start
+        self.source = source
+        self.frame_source = None
+        self.running = False
         self.camera_selection = 'Left Camera'
         self.depth_option = 'Grayscale'
 
+        # Connected once here; connecting on every start would call each slot once per start
         self.camera_selection_signal.connect(self.set_camera_selection)
         self.depth_option_signal.connect(self.set_depth_option)
+        self.depth_auto_range_signal.connect(self.set_depth_auto_range)
+        self.display_size_signal.connect(self.set_display_size)
+        self.display_interpolation_signal.connect(self.set_display_interpolation)
+        self.view_position_signal.connect(self.set_view_position)
+        self.point_budget_signal.connect(self.set_point_budget)
+        self.scene_map_signal.connect(self.set_scene_mapping)
+        self.snapshot_signal.connect(self.request_snapshot)
+        self.snapshot_every_signal.connect(self.set_snapshot_every)
+        self.organized_cloud_signal.connect(self.set_organized_cloud)
+        self.pick_signal.connect(self.request_pick)
+        self.subscribe_signal.connect(self.subscribe)
+        self.target_fps_signal.connect(self.set_target_fps)
+        self.quality_level_signal.connect(self.set_quality_level)
+        self.profile_enabled_signal.connect(self.set_profiling)
+        self.static_scene_signal.connect(self.set_static_scene)
+        self.static_roi_signal.connect(self.set_static_roi)
+        self.plane_mode_signal.connect(self.set_plane_mode)
+        self.cloud_filter_signal.connect(self.set_cloud_filter)
+        self.unsubscribe_signal.connect(self.unsubscribe)
+
+    def cameraStart(self):
+        """Reset the per-session state, then start the thread; False while a previous session is still stopping.
+
+        Everything run() reads is set up before start(), so the two cannot race.
+        The camera itself is opened in run(); follow camera_state_signal.
+        """
+        if self.isRunning():
+            return False
+        self.running = True
+        self.image_ring.reset()
+        self.depth_ring.reset()
+        self.outputs.reset()
+        self.start()
+        return True
+
+    @pyqtSlot(str, str, float)
+    def subscribe(self, output, consumer, rate=0.0):
+        """Start computing `output` for `consumer`, at most `rate` times per second (0 = every frame)."""
+        self.outputs.subscribe(output, consumer, rate)
+
+    @pyqtSlot(str, str)
+    def unsubscribe(self, consumer, output=""):
+        self.outputs.unsubscribe(consumer, output or None)
+
+    @pyqtSlot(float)
+    def set_target_fps(self, fps):
+        with self.quality_lock:
+            self.quality.set_target(fps)
+
+    @pyqtSlot(int)
+    def set_quality_level(self, level):
+        """Pin a quality level (0 = best); -1 lets the controller choose."""
+        with self.quality_lock:
+            settings = self.quality.set_level(None if level < 0 else level)
+            if settings is not None:
+                self.apply_quality(settings)
+
+    @pyqtSlot(bool)
+    def set_profiling(self, enabled):
+        if enabled and not self.profiler.enabled:
+            self.profiler.reset()
+        self.profiler.enabled = enabled
+
+    @pyqtSlot(bool)
+    def set_static_scene(self, enabled):
+        for detector in (self.depth_change, self.cloud_change):
+            # Yeniden açıldığında ilk kare her zaman tam hesaplanır
+            detector.reset()
+            detector.enabled = enabled
+
+    @pyqtSlot(float, float, float, float)
+    def set_static_roi(self, left, top, right, bottom):
+        roi = (left, top, right, bottom) if right > left and bottom > top else None
+        for detector in (self.depth_change, self.cloud_change):
+            detector.set_roi(roi)
+
+    @pyqtSlot(str)
+    def set_plane_mode(self, mode):
+        if mode != self.plane_mode:
+            # Eski düzlemler yeni moda taşınmaz, ilk kare soğuk başlar
+            self.plane_segmenter.reset()
+            self.plane_result = None
+            self.plane_view = None
+        self.plane_mode = mode
+
+    @pyqtSlot(bool)
+    def set_cloud_filter(self, enabled):
+        self.cloud_filter.enabled = enabled
+
+    def publish_profile(self, frame_id):
+        """Emit the span percentiles and append them to the JSON-lines log (grab thread, once per window)."""
+        if not self.profiler.enabled:
+            return
+        snapshot = self.profiler.snapshot()
+        self.profile_signal.emit(snapshot)
+        if self.profile_log is not None:
+            self.profile_log.log({"time": time.time(), "frame_id": frame_id, "spans": snapshot})
+
+    def apply_quality(self, settings):
+        # Plain attribute writes; each stage picks the new value up with its next frame
+        self.point_cloud_processor.voxel_size = settings["voxel_size"]
+        self.organized_stride = settings["cloud_stride"]
+        self.display_scale = settings["display_scale"]
+        self.depth_scale = settings["depth_scale"]
+        self.quality_signal.emit(self.quality_state(settings))
+
+    def quality_state(self, settings=None):
+        """What quality_signal carries: level, knob values and a one-line description."""
+        settings = self.quality.settings() if settings is None else settings
+        return {"level": self.quality.level, "description": self.quality.describe(settings), **settings}
+
+    def adapt_quality(self):
+        """Feed the slowest stage's ms per processed frame to the controller (grab thread, once per window)."""
+        load = max(self.stage_ms.values(), default=None)
+        with self.quality_lock:
+            settings = self.quality.update(load)
+            if settings is not None:
+                self.apply_quality(settings)
 
     @pyqtSlot(str)
     def set_camera_selection(self, selection):
+        # Only maps pick clicks to the cloud; which image is shown follows the subscribed outputs
         self.camera_selection = selection
         print(self.camera_selection)
 
     @pyqtSlot(str)
     def set_depth_option(self, option):
         self.depth_option = option
+        self.depth_colorizer.set_colormap(option)
         print(self.depth_option)
 
+    @pyqtSlot(bool)
+    def set_depth_auto_range(self, enabled):
+        """Follow the scene depth range or go back to the configured one."""
+        self.depth_colorizer.auto_range_interval = self.depth_auto_range_interval if enabled else 0
+        if not enabled:
+            self.depth_colorizer.set_range(self.depth_minimum_distance, self.depth_maximum_distance)
+
+    @pyqtSlot(str, int, int)
+    def set_display_size(self, pane, width, height):
+        """Size of the GUI label a pane is shown in; frames are downscaled to it here."""
+        self.display_sizes[pane] = (width, height)
+
+    @pyqtSlot(str)
+    def set_display_interpolation(self, name):
+        self.display_interpolation = INTERPOLATIONS[name]
+
+    @pyqtSlot(float, float, float)
+    def set_view_position(self, x, y, z):
+        """Eye position of the 3D view; the level of detail is densest around it."""
+        self.point_cloud_lod.set_eye(x, y, z)
+
+    @pyqtSlot(int)
+    def set_point_budget(self, budget):
+        self.point_cloud_lod.budget = max(1, budget)
+
+    @pyqtSlot(bool)
+    def set_scene_mapping(self, enabled):
+        """Show the fused scene map instead of the latest frame; turning it on starts a new map."""
+        if enabled:
+            # Cleared by the point-cloud stage itself, which owns the map
+            self.scene_map_reset = True
+        self.scene_mapping = enabled
+
+    @pyqtSlot()
+    def request_snapshot(self):
+        """Save the next point cloud (the scene map when mapping is on)."""
+        self.snapshot_requested = True
+
+    @pyqtSlot(int)
+    def set_snapshot_every(self, every_n):
+        """Keep saving every Nth point-cloud frame; 0 turns it off."""
+        self.snapshot_every = max(0, every_n)
+
+    @pyqtSlot(bool)
+    def set_organized_cloud(self, enabled):
+        self.organized_cloud = enabled
+
+    @pyqtSlot(float, float)
+    def request_pick(self, u, v):
+        """Look up the 3D point under a camera-pane click, given as 0-1 coordinates of the shown image."""
+        self.pick_request = (u, v)
+
     def run(self):
-        init_params = sl.InitParameters()
-        init_params.depth_mode = sl.DEPTH_MODE.NEURAL
-        init_params.coordinate_units = sl.UNIT.METER
-        init_params.depth_minimum_distance = 0.4
-        init_params.depth_maximum_distance = 5
-        init_params.camera_resolution = sl.RESOLUTION.HD2K
-
-        status = self.zed.open(init_params)
-        if status != sl.ERROR_CODE.SUCCESS:
-            print("Kamera Açılmadı: " + repr(status) + ". Programdan çıkılıyor.")
+        source = self.frame_source = self.source or ZEDFrameSource(
+            "HD2K", depth_mode="NEURAL", units="METER",
+            minimum_distance=self.depth_minimum_distance, maximum_distance=self.depth_maximum_distance,
+        )
+        self.camera_state_signal.emit("loading", "")
+        try:
+            source.load()
+        except ImportError as error:
+            self.camera_state_signal.emit("failed", f"ZED SDK yüklenemedi: {error}")
             return
 
-        runtime_parameters = sl.RuntimeParameters()
-        image = sl.Mat()
-        depth = sl.Mat()
-        point_cloud = sl.Mat()
-
-        image_left = sl.Mat()
-        image_right = sl.Mat()
+        # NEURAL derinlik modeli açılışta yüklenir, uzun sürebilir; GUI bu sırada çalışmaya devam eder
+        self.camera_state_signal.emit("opening", "")
+        try:
+            source.open()
+        except RuntimeError as error:
+            self.camera_state_signal.emit("failed", str(error))
+            return
+        self.camera_size = source.size
+        if not self.running:
+            # Stopped while the camera was opening
+            source.close()
+            self.camera_state_signal.emit("stopped", "")
+            return
 
+        # Each output runs in its own worker; the grab loop only retrieves into
+        # free slots and posts them, so a slow stage drops its own frames only.
+        self.stages = {
+            "image": StageWorker("image", self.process_image, self.mailbox_capacity),
+            "depth": StageWorker("depth", self.process_depth, self.mailbox_capacity),
+            "point_cloud": StageWorker("point_cloud", self.process_point_cloud, self.mailbox_capacity),
+        }
+        # A stage holds at most `capacity` queued frames plus the one being
+        # processed, so capacity + 2 slots always leaves one free for the grab.
+        slot_count = self.mailbox_capacity + 2
+        rings = {
+            "image": SlotRing(lambda: {"left": source.new_mat(), "right": source.new_mat()}, slot_count),
+            "depth": SlotRing(lambda: {"depth": source.new_mat()}, slot_count),
+            "point_cloud": SlotRing(lambda: {"cloud": source.new_mat()}, slot_count),
+        }
+        for stage in self.stages.values():
+            stage.start()
+
+        frame_id = 0
+        last_stats_time = time.monotonic()
+        self.frame_cost = {}
+        window = {"frames": 0, "grab": 0.0, "busy": {}}
+
+        profiler = self.profiler
         while self.running:
-            if self.zed.grab(runtime_parameters) == sl.ERROR_CODE.SUCCESS:
-                if self.camera_selection == 'Left Camera':
-                    self.zed.retrieve_image(image, sl.VIEW.LEFT)
-                    frame = image.get_data()[:, :, :3].copy()
-                elif self.camera_selection == 'Right Camera':
-                    self.zed.retrieve_image(image, sl.VIEW.RIGHT)
-                    frame = image.get_data()[:, :, :3].copy()
-                elif self.camera_selection == 'Both Cameras':
-                    self.zed.retrieve_image(image_left, sl.VIEW.LEFT)
-                    self.zed.retrieve_image(image_right, sl.VIEW.RIGHT)
-                    frame_left = image_left.get_data()[:, :, :3].copy()
-                    frame_right = image_right.get_data()[:, :, :3].copy()
-
-                    # Görüntüleri Yatayda Birleştir
-                    combined_frame = np.hstack((frame_left, frame_right))
-
-                    # Yeniden Boyutlandır (Sol Kamera Boyutunda)
-                    combined_frame = cv2.resize(
-                        combined_frame, (frame_left.shape[1], frame_left.shape[0])
-                    )
-                    frame = combined_frame
-                else:
-                    self.zed.retrieve_image(image, sl.VIEW.LEFT)
-                    frame = image.get_data()[:, :, :3].copy()
-
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
-
-                height, width, channel = frame.shape
-                bytes_per_line = channel * width
-                frame_qimage = QImage(
-                    frame.data.tobytes(),
-                    width,
-                    height,
-                    bytes_per_line,
-                    QImage.Format_RGB888,
-                )
-                self.image_signal.emit(frame_qimage)
-
-                self.zed.retrieve_measure(depth, sl.MEASURE.DEPTH)
-                # Derinlik İşleme
-                depth_data = depth.get_data().copy()
-                depth_data[np.isnan(depth_data)] = 0
-                depth_data[np.isinf(depth_data)] = 0
-                depth_normalized = cv2.normalize(
-                    depth_data, None, 0, 255, cv2.NORM_MINMAX
-                )
-                depth_normalized = depth_normalized.astype(np.uint8)
-
-                if self.depth_option == 'Grayscale':
-                    depth_colormap = cv2.cvtColor(depth_normalized, cv2.COLOR_GRAY2RGB)
-                else:  # Colormap
-                    depth_colormap = cv2.applyColorMap(
-                        255 - depth_normalized, cv2.COLORMAP_JET
-                    )
-
-                height_d, width_d = depth_colormap.shape[:2]
-                bytes_per_line_d = 3 * width_d
-                depth_qimage = QImage(
-                    depth_colormap.data.tobytes(),
-                    width_d,
-                    height_d,
-                    bytes_per_line_d,
-                    QImage.Format_RGB888,
+            # Derinlik, nokta bulutu ya da ölçüm isteyen kimse yoksa SDK derinliği hiç hesaplamaz
+            depth = bool(self.outputs.active() & DEPTH_OUTPUTS or self.pick_request is not None)
+            grab_start = time.perf_counter()
+            try:
+                with profiler.span("grab"):
+                    grabbed = source.grab(depth)
+            except EOFError:
+                # Sonlu kaynak (kayıt ya da sentetik) bitti
+                break
+            if not grabbed:
+                continue
+            frame_id += 1
+            profiler.frame_grabbed(frame_id)
+            if frame_id == 1:
+                self.camera_state_signal.emit("streaming", "")
+            info = FrameInfo(frame_id, source.timestamp())
+
+            due = self.outputs.due(time.monotonic())
+            for name, stage in self.stages.items():
+                wanted = due.intersection(STAGE_OUTPUTS[name])
+                if name == "point_cloud" and self.pick_request is not None:
+                    # A pick needs one cloud even while the 3D view is off
+                    wanted.add("pick")
+                if not wanted:
+                    continue
+                ring = rings[name]
+                slot = ring.acquire()
+                if slot is None:
+                    stage.skip()
+                    continue
+                slot["outputs"] = wanted
+                with profiler.span(f"retrieve.{name}"):
+                    self.retrieve(name, slot)
+                stage.submit(Frame(info, slot, lambda ring=ring, slot=slot: ring.release(slot)))
+            window["frames"] += 1
+            window["grab"] += time.perf_counter() - grab_start
+
+            now = time.monotonic()
+            if now - last_stats_time >= 1.0:
+                self.measure_window(window)
+                for detector in (self.depth_change, self.cloud_change):
+                    detector.next_window(now - last_stats_time)
+                self.adapt_quality()
+                self.pipeline_stats_signal.emit(self.stage_stats())
+                self.publish_profile(frame_id)
+                last_stats_time = now
+
+        for stage in self.stages.values():
+            stage.stop()
+        if self.point_cloud_pool is not None:
+            self.point_cloud_pool.stop()
+            self.point_cloud_pool = None
+        if self.snapshot_exporter is not None:
+            self.snapshot_exporter.close()
+            stats = self.snapshot_exporter.stats()
+            print(f"snapshots: {stats['written']} yazıldı, {stats['dropped']} atlandı")
+            self.snapshot_exporter = None
+        source.close()
+        self.running = False
+        self.camera_state_signal.emit("stopped", "")
+
+    def retrieve(self, name, slot):
+        """Copy the just-grabbed data for the slot's due outputs into it (grab thread only)."""
+        source = self.frame_source
+        outputs = slot["outputs"]
+        if name == "image":
+            # The image pane shows one view: side by side wins over a single eye
+            slot["both"] = "side_by_side" in outputs
+            if slot["both"]:
+                source.retrieve_image(slot["left"], "left")
+                source.retrieve_image(slot["right"], "right")
+            elif "left" in outputs:
+                source.retrieve_image(slot["left"], "left")
+            else:
+                source.retrieve_image(slot["left"], "right")
+        elif name == "depth":
+            source.retrieve_depth(slot["depth"], self.measure_resolution())
+        else:
+            source.retrieve_cloud(slot["cloud"], self.measure_resolution())
+
+    def measure_resolution(self):
+        """Depth / cloud retrieval (width, height) for the current depth_scale; None is the full resolution."""
+        if self.depth_scale >= 1.0 or self.camera_size is None:
+            return None
+        width, height = self.camera_size
+        return max(1, int(width * self.depth_scale)), max(1, int(height * self.depth_scale))
+
+    def display_target(self, pane, source_width, source_height):
+        """Size a pane's frames are scaled to: fit to the label, then the quality's display_scale."""
+        width, height = fit_size(source_width, source_height, *self.display_sizes[pane])
+        return max(1, int(width * self.display_scale)), max(1, int(height * self.display_scale))
+
+    def measure_window(self, window):
+        """Per-frame costs over the last stats window.
+
+        frame_cost: average ms per grabbed frame, grab + retrieve and each stage's
+        work; a stage with no subscribed output adds nothing to either.
+        stage_ms: ms per frame a stage actually processed, what the quality
+        controller holds under the frame budget (worker time included with a process pool).
+        """
+        frames = max(window["frames"], 1)
+        cost = {"grab": 1000.0 * window["grab"] / frames}
+        stage_ms = {}
+        processed = window.setdefault("processed", {})
+        for name, stage in self.stages.items():
+            busy = stage.busy_time - window["busy"].get(name, 0.0)
+            count = stage.processed - processed.get(name, 0)
+            cost[name] = 1000.0 * busy / frames
+            if count:
+                stage_ms[name] = 1000.0 * busy / count
+            window["busy"][name] = stage.busy_time
+            processed[name] = stage.processed
+        pool = self.point_cloud_pool
+        if pool is not None:
+            # İşçi süresi de pencere başına farkla ölçülür; yeniden kurulan havuz sıfırdan sayar
+            seconds, count = pool.worker_totals()
+            last_pool, last_seconds, last_count = window.get("pool", (None, 0.0, 0))
+            if last_pool is not pool:
+                last_seconds, last_count = 0.0, 0
+            if count > last_count and "point_cloud" in stage_ms:
+                worker_ms = 1000.0 * (seconds - last_seconds) / (count - last_count)
+                stage_ms["point_cloud"] = max(stage_ms["point_cloud"], worker_ms / pool.workers)
+            window["pool"] = (pool, seconds, count)
+        window["frames"] = 0
+        window["grab"] = 0.0
+        self.frame_cost = cost
+        self.stage_ms = stage_ms
+
+    def stage_stats(self):
+        """Per-stage processed/dropped counters and buffer-pool usage, plus the process peak RSS."""
+        stats = {name: stage.stats() for name, stage in self.stages.items()}
+        stats["outputs"] = self.outputs.stats()
+        stats["frame_ms"] = self.frame_cost
+        stats["quality"] = self.quality.stats()
+        pools = {"depth": self.depth_pool, "point_cloud": self.point_cloud_processor.pool}
+        rings = {"image": self.image_ring, "depth": self.depth_ring}
+        for name, stage_stats in stats.items():
+            if name in pools:
+                stage_stats["pool_allocations"] = pools[name].allocations
+                stage_stats["pool_mb"] = pools[name].nbytes / 1e6
+            if name in rings:
+                stage_stats["ring_skipped"] = rings[name].skipped
+        for name, detector in (("depth", self.depth_change), ("point_cloud", self.cloud_change)):
+            if name in stats and detector.enabled:
+                stats[name]["static"] = detector.stats()
+        if "point_cloud" in stats:
+            stats["point_cloud"]["ring_skipped"] = self.point_cloud_lod.ring.skipped
+            stats["point_cloud"]["unchanged"] = self.point_cloud_lod.unchanged
+            if self.point_cloud_pool is not None:
+                stats["point_cloud"]["process_pool"] = self.point_cloud_pool.stats()
+            if self.snapshot_exporter is not None:
+                stats["point_cloud"]["snapshots"] = self.snapshot_exporter.stats()
+            if self.cloud_filter.enabled:
+                stats["point_cloud"]["filters"] = self.cloud_filter.stats()
+            if self.plane_mode != "off":
+                stats["point_cloud"]["planes"] = self.plane_segmenter.stats()
+            if self.scene_mapping:
+                stats["point_cloud"]["map_voxels"] = self.scene_map.size
+                stats["point_cloud"]["map_mb"] = self.scene_map.nbytes / 1e6
+        stats["peak_rss_mb"] = peak_rss_mb()
+        return stats
+
+    def process_image(self, frame):
+        slot = frame.data
+        frame_left = slot["left"].get_data()
+        source_height, source_width = frame_left.shape[:2]
+        width, height = self.display_target("camera", source_width, source_height)
+
+        # SDK görüntüsü BGRA, bellekte QImage.Format_RGB32 ile aynı düzende:
+        # renk dönüşümü yok, sadece etiket boyutuna küçültülüp halkadaki tampona yazılır
+        display = self.image_ring.acquire((height, width, 4))
+        if display is None:
+            return
+        profiler = self.profiler
+        with profiler.span("image.resize"):
+            if slot["both"]:
+                # Her göz doğrudan çıktının kendi yarısına küçültülür
+                half = width // 2
+                resize_into(frame_left, display.array[:, :half], self.display_interpolation)
+                resize_into(slot["right"].get_data(), display.array[:, half:], self.display_interpolation)
+            else:
+                resize_into(frame_left, display.array, self.display_interpolation)
+
+        with profiler.span("image.qimage"):
+            display.wrap(QImage.Format_RGB32, frame.info)
+        with profiler.span("image.emit"):
+            self.image_signal.emit(display)
+
+    def process_depth(self, frame):
+        depth_data = frame.data["depth"].get_data()
+        if "depth" in frame.data["outputs"]:
+            # Slot is reused after this frame, the consumer gets its own copy
+            self.raw_depth_signal.emit(frame.info, depth_data.copy())
+        if "depth_view" not in frame.data["outputs"]:
+            return
+        profiler = self.profiler
+        source_height, source_width = depth_data.shape[:2]
+        width, height = self.display_target("depth", source_width, source_height)
+        gate = self.depth_change
+        # GUI bu bayrağı her an değiştirebilir: kare boyunca tek bir okuma kullanılır
+        enabled = gate.enabled
+        if enabled:
+            start = time.perf_counter()
+            with profiler.span("depth.gate"):
+                # Boyut, renk tablosu ya da aralık değiştiyse ekrandaki görüntü geçersiz: tam hesap
+                mode, _ = gate.check(depth_data, force=self.depth_view_key != self.depth_view_state(width, height))
+            if mode == UNCHANGED:
+                # Sahne değişmedi: ekrandaki derinlik görüntüsü olduğu gibi kalır
+                gate.record(mode, 1000.0 * (time.perf_counter() - start))
+                return
+        if (width, height) != (source_width, source_height):
+            # En yakın komşu: geçersiz (NaN/inf) pikseller komşularına karışmaz
+            with profiler.span("depth.resize"):
+                depth_data = cv2.resize(
+                    depth_data, (width, height),
+                    dst=self.depth_pool.get("depth.display", (height, width), np.float32),
+                    interpolation=cv2.INTER_NEAREST,
                 )
-                self.depth_signal.emit(depth_qimage)
-
-                self.zed.retrieve_measure(point_cloud, sl.MEASURE.XYZRGBA)
-
-                point_cloud_data = point_cloud.get_data()
-                point_cloud_np = np.array(point_cloud_data, copy=True)
 
-                mask = ~np.isnan(point_cloud_np[:, :, 0]) 
-                valid_points = point_cloud_np[mask]
-
-                xyz = valid_points[:, :3] 
-                rgba = valid_points[:, 3]
+        display = self.depth_ring.acquire((height, width, 3))
+        if display is None:
+            # Bu kare ekrana gitmedi; bir sonraki kare atlanmadan hesaplanır
+            self.depth_view_key = None
+            return
+        # Derinlik İşleme: sabit aralıklı renk tablosu, tek geçişte geçersiz pikseller dahil
+        with profiler.span("depth.colorize"):
+            self.depth_colorizer.colorize(depth_data, out=display.array)
+        with profiler.span("depth.qimage"):
+            display.wrap(QImage.Format_RGB888, frame.info)
+        with profiler.span("depth.emit"):
+            self.depth_signal.emit(display)
+        if enabled:
+            # Otomatik aralık colorize sırasında değişmiş olabilir: anahtar sonradan alınır
+            self.depth_view_key = self.depth_view_state(width, height)
+            # A partial change still recolors the whole view: one LUT pass costs no more than cutting it up
+            gate.record(mode, 1000.0 * (time.perf_counter() - start))
+
+    def depth_view_state(self, width, height):
+        """Everything besides the depth itself that decides how the colorized view looks."""
+        colorizer = self.depth_colorizer
+        return width, height, colorizer.colormap, colorizer.min_depth, colorizer.max_depth
+
+    def process_point_cloud(self, frame):
+        point_cloud_data = frame.data["cloud"].get_data()
+        if self.pick_request is not None:
+            self.pick_point(point_cloud_data, frame.info)
+        if "point_cloud" not in frame.data["outputs"]:
+            return
 
-                rgba_uint32 = np.frombuffer(rgba.astype(np.float32).tobytes(), dtype=np.uint32)
-                r = ((rgba_uint32 & 0x00FF0000) >> 16) / 255.0  # Kırmızı
-                g = ((rgba_uint32 & 0x0000FF00) >> 8) / 255.0   # Yeşil
-                b = (rgba_uint32 & 0x000000FF) / 255.0          # Mavi
-                colors = np.stack((b,g,r), axis=1)
+        gate = self.cloud_change
+        if gate.enabled and (self.snapshot_requested or self.snapshot_every):
+            # Kayıtlar tam çözünürlüklü buluttan alınır: bu kare kapıdan geçmez, önbellek yenilenir
+            self.cloud_cache.reset()
+        elif gate.enabled:
+            start = time.perf_counter()
+            key = (self.organized_cloud, self.organized_stride, self.point_cloud_processor.voxel_size,
+                   self.point_cloud_workers > 0, self.scene_map_reset, self.plane_mode,
+                   self.cloud_filter.settings())
+            with self.profiler.span("cloud.gate"):
+                mode, cells = gate.check(point_cloud_data[..., 2], point_cloud_data, force=key != self.cloud_cache.key)
+            if self.point_cloud_workers == 0:
+                self.process_point_cloud_cells(frame.info, point_cloud_data, mode, cells, key)
+                gate.record(mode, 1000.0 * (time.perf_counter() - start))
+                return
+            # İşçi süreçleri hep tüm kareyi alır: yalnızca değişmeyen kare atlanır
+            self.cloud_cache.reset(key)
+            if mode == UNCHANGED:
+                gate.record(mode, 0.0)
+                return
+
+        if self.point_cloud_workers > 0:
+            # Kare paylaşılan belleğe kopyalanır, sonucu toplayıcı iş parçacığı finish_point_cloud'a verir
+            # Kalite adımları (derinlik çözünürlüğü, voksel boyutu) kareyle birlikte gider, havuz yeniden kurulmaz
+            pool = self.point_cloud_pool
+            height, width = point_cloud_data.shape[:2]
+            if pool is not None and (
+                height > pool.layout.height or width > pool.layout.width
+                or pool.cloud_filter != self.worker_cloud_filter()
+            ):
+                # Filtreler değişti: işçiler yeni ayarla baştan kurulur
+                pool.stop()
+                self.point_cloud_pool = None
+            if self.point_cloud_pool is None:
+                # Paylaşılan bellek bir kez, kameranın tam çözünürlüğüne göre ayrılır
+                full_width, full_height = self.camera_size or (width, height)
+                self.point_cloud_pool = self.start_point_cloud_pool(max(height, full_height), max(width, full_width))
+            self.point_cloud_pool.submit(
+                frame.info, point_cloud_data, self.organized_stride if self.organized_cloud else 0,
+                voxel_size=self.point_cloud_processor.voxel_size,
+            )
+            return
 
-                self.pointData = [xyz,colors]
-                
-                down_xyz, down_colors = self.voxel_downsample_point_cloud(xyz, colors, voxel_size=0.01)
-                # down_xyz, down_colors = xyz,colors
-                # print(down_xyz.shape)
-                # print(down_colors.shape)
-                point_cloud_array = np.hstack((down_xyz, down_colors))
-                self.point_cloud_signal.emit(point_cloud_array)
+        profiler = self.profiler
+        start = time.perf_counter()
+        if self.organized_cloud:
+            # Görüntü ızgarası korunur, vokselleştirme yerine adımlı seyreltme
+            organized = OrganizedCloud(point_cloud_data, self.organized_stride)
+            xyz, colors = self.decode_point_cloud(organized.cloud)
+            down_xyz, down_colors = xyz, colors
+        else:
+            xyz, colors = self.decode_point_cloud(point_cloud_data)
+            with profiler.span("cloud.voxelize"):
+                down_xyz, down_colors = self.point_cloud_processor.downsample(xyz, colors)
+        self.record_filter_downstream(len(xyz), start)
+
+        # Havuzdaki tamponlara bakar, bir sonraki karede üzerine yazılır
+        self.pointData = [xyz, colors]
+        self.finish_point_cloud(frame.info, xyz, colors, down_xyz, down_colors)
+
+    def process_point_cloud_cells(self, info, point_cloud_data, mode, cells, key):
+        """Gated in-thread path: decode and reduce only the recomputed grid cells, reuse the others.
+
+        Cells are voxelized on their own, so a voxel on a cell border can be
+        kept once per cell.
+        """
+        cache = self.cloud_cache
+        profiler = self.profiler
+        if mode != UNCHANGED:
+            if mode == FULL or not cache.matches(key):
+                cache.reset(key)
+                cells = range(self.cloud_change.grid[0] * self.cloud_change.grid[1])
+            height, width = point_cloud_data.shape[:2]
+            with profiler.span("cloud.cells"):
+                for cell in cells:
+                    start = time.perf_counter()
+                    rows, cols = self.cloud_change.cell_slices(cell, height, width)
+                    part = point_cloud_data[rows, cols]
+                    if self.organized_cloud:
+                        xyz, colors = self.decode_point_cloud(OrganizedCloud(part, self.organized_stride).cloud)
+                        points = len(xyz)
+                    else:
+                        xyz, colors = self.decode_point_cloud(part)
+                        points = len(xyz)
+                        xyz, colors = self.point_cloud_processor.downsample(xyz, colors)
+                    self.record_filter_downstream(points, start)
+                    cache.put(cell, xyz, colors)
+            cache.info = info
+            cache.joined = cache.join(self.point_cloud_processor.pool, "cloud.cached")
+            self.pointData = list(cache.joined)
+            self.finish_point_cloud(info, *cache.joined, *cache.joined)
+            return
+        if not cache.matches(key):
+            return
+        # Aynı içerik: LOD yalnızca bakış noktası ya da nokta bütçesi değiştiyse yeniden hazırlanır
+        if self.scene_mapping:
+            down_xyz, down_colors = self.scene_map.render_set()
+        elif self.plane_mode != "off" and self.plane_view is not None:
+            down_xyz, down_colors = self.plane_view
+        else:
+            down_xyz, down_colors = cache.joined
+        with profiler.span("cloud.lod"):
+            batch = self.point_cloud_lod.prepare(down_xyz, down_colors, cache.info)
+        if batch is not None:
+            with profiler.span("cloud.emit"):
+                self.point_cloud_signal.emit(batch)
+
+    def start_point_cloud_pool(self, height, width):
+        pool = ProcessPointCloudPool(
+            height, width, self.point_cloud_workers, delivery=self.point_cloud_delivery,
+            voxel_size=self.point_cloud_processor.voxel_size,
+            voxel_mode=self.point_cloud_processor.voxel_mode,
+            cloud_filter=self.worker_cloud_filter(),
+            # Workers only return the reduced cloud, which then also stands in for the full one
+            on_result=lambda info, xyz, colors: self.finish_point_cloud(info, xyz, colors, xyz, colors),
+            on_filtered=self.record_worker_filter,
+        )
+        return pool.start()
+
+    def record_worker_filter(self, removed, filter_ms, points, downstream_ms):
+        """Add one frame filtered in a pool worker to the GUI's filter statistics (collector thread)."""
+        self.cloud_filter.record(removed, filter_ms)
+        self.cloud_filter.record_downstream(points, downstream_ms)
+
+    def finish_point_cloud(self, info, xyz, colors, down_xyz, down_colors):
+        """Scene map, snapshots and level of detail for one processed cloud.
+
+        Runs on the point-cloud stage thread, or on the process pool's
+        collector thread when point_cloud_workers > 0 (never both).
+        """
+        if self.plane_mode != "off" and len(down_xyz):
+            down_xyz, down_colors = self.segment_planes(down_xyz, down_colors)
+        if self.scene_mapping:
+            # Sadece bu karenin dokunduğu vokseller güncellenir, harita baştan kurulmaz
+            if self.scene_map_reset:
+                self.scene_map.reset()
+                self.scene_map_reset = False
+            with self.profiler.span("cloud.scene_map"):
+                self.scene_map.integrate(down_xyz, down_colors)
+                down_xyz, down_colors = self.scene_map.render_set()
+        if self.snapshot_requested or self.snapshot_every:
+            self.save_snapshot(xyz, colors)
+        # Nokta bütçesi ve mesafeye göre detay seviyesi, GUI'ye hazır float32 RGBA
+        with self.profiler.span("cloud.lod"):
+            batch = self.point_cloud_lod.prepare(down_xyz, down_colors, info)
+        if batch is not None:
+            with self.profiler.span("cloud.emit"):
+                self.point_cloud_signal.emit(batch)
+
+    def segment_planes(self, xyz, colors):
+        """Planes of the reduced cloud; returns it with plane points tinted (mark) or dropped (remove)."""
+        with self.profiler.span("cloud.planes"):
+            result = self.plane_result = self.plane_segmenter.segment(xyz)
+            if self.plane_mode == "remove":
+                outliers = result.outliers
+                xyz, colors = xyz[outliers], colors[outliers]
+            elif self.plane_mode == "mark":
+                colors = mark_planes(colors, result.labels)
+            # Yeni diziler: değişmeyen karelerde LOD bunları yeniden kullanır
+            self.plane_view = (xyz, colors)
+        self.plane_signal.emit(result.summary())
+        return xyz, colors
+
+    def save_snapshot(self, xyz, colors):
+        """Copy the cloud once and queue it for the background exporter (point-cloud stage only)."""
+        exporter = self.snapshot_exporter
+        if exporter is None:
+            now = datetime.now()
+            exporter = self.snapshot_exporter = SnapshotExporter(
+                f"snapshots/{now.day}-{now.month}-{now.year}", extension=self.snapshot_format
+            )
+        exporter.every_n = self.snapshot_every
+        if not (exporter.due() or self.snapshot_requested):
+            return
+        self.snapshot_requested = False
+        if not exporter.accepting():
+            exporter.dropped += 1
+            return
+        if self.scene_mapping:
+            xyz, colors = self.scene_map.render_set()
+        elif self.plane_mode == "remove" and self.plane_result is not None:
+            # Tam çözünürlüklü bulut, indirgenmiş buluttaki düzlemlerle süzülür
+            outliers = ~self.plane_segmenter.inlier_mask(xyz, self.plane_result.planes)
+            exporter.snapshot(xyz[outliers], colors[outliers])
+            return
+        # Havuz görünümleri bir sonraki karede değişir, kuyruğa kopyası girer
+        exporter.snapshot(xyz.copy(), colors.copy())
+
+    def pick_point(self, point_cloud_data, info):
+        """Answer a pending pick with a single lookup in the organized (left-camera) cloud."""
+        u, v = self.pick_request
+        self.pick_request = None
+        if self.camera_selection == 'Both Cameras':
+            # Sol yarı sol göz; sağ gözün pikselleri buluta karşılık gelmez
+            u = u * 2 if u < 0.5 else None
+        elif self.camera_selection == 'Right Camera':
+            u = None
+
+        height, width = point_cloud_data.shape[:2]
+        result = {"pixel": None, "point": None, "normal": None, "info": info}
+        if u is not None:
+            row, col = min(int(v * height), height - 1), min(int(u * width), width - 1)
+            organized = OrganizedCloud(point_cloud_data)
+            result.update(pixel=(row, col), point=organized.point_at(row, col),
+                          normal=organized.normal_at(row, col))
+        self.pick_result_signal.emit(result)
+
+    def record_filter_downstream(self, points, start):
+        """Decode + reduce time since `start`, filtering excluded, for `points` surviving points."""
+        if self.cloud_filter.enabled:
+            # Atılan noktaların kazandırdığı süre, kalan nokta başına maliyetle tahmin edilir
+            self.cloud_filter.record_downstream(
+                points, 1000.0 * (time.perf_counter() - start) - self.cloud_filter.last_ms
+            )
+
+    def worker_cloud_filter(self):
+        """CloudFilter settings for the process pool's workers; None while filtering is off."""
+        return self.cloud_filter.settings() if self.cloud_filter.enabled else None
+
+    def decode_point_cloud(self, point_cloud_data):
+        """Decode the XYZRGBA cloud into pooled float32 XYZ / uint8 RGB buffers, filtered when enabled."""
+        mask = None
+        if self.cloud_filter.enabled:
+            with self.profiler.span("cloud.filter"):
+                mask = self.cloud_filter.mask(point_cloud_data, self.point_cloud_processor.pool)
+        with self.profiler.span("cloud.decode"):
+            return self.point_cloud_processor.decode(point_cloud_data, mask)
 
     def rgba_float_to_rgb(self,rgba_array):
         rgba_array_contiguous = np.ascontiguousarray(rgba_array)
@@ -164,24 +896,14 @@ class ZEDCameraThread(QThread):
 
         return rgb_normalized
     
-    def voxel_downsample_point_cloud(self, xyz, colors, voxel_size=0.01):
-        # Create Open3D point cloud
-        pcd = o3d.geometry.PointCloud()
-        pcd.points = o3d.utility.Vector3dVector(xyz)
-        pcd.colors = o3d.utility.Vector3dVector(colors)
-
-        # Perform voxel downsampling
-        down_pcd = pcd.voxel_down_sample(voxel_size=voxel_size)
-
-        # Extract downsampled points and colors
-        down_xyz = np.asarray(down_pcd.points)
-        down_colors = np.asarray(down_pcd.colors)
-
-        return down_xyz, down_colors
+    def voxel_downsample_point_cloud(self, xyz, colors, voxel_size=0.01, mode="centroid"):
+        return voxel_downsample(xyz, colors, voxel_size=voxel_size, mode=mode)
 
 
-    def stop(self):
+    def stop(self, wait=True):
+        # run() stops the stage workers and closes the camera once the grab loop exits.
+        # With wait=False the caller follows camera_state_signal until "stopped".
         self.running = False
-        if self.zed.is_opened():
-            self.zed.close()
+        if wait:
+            self.wait()
 
@@ -0,0 +1,1279 @@
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from camera import get_resolution_dimensions
+from buffer_pool import AllocationMonitor, BufferPool, peak_rss_mb
+from capture_file import CaptureReader
+from cloud_filters import CloudFilter
+from depth_codec import DepthDecoder, DepthEncoder, quantize_depth
+from depth_colorizer import DepthColorizer
+from frame_source import (
+    RESOLUTIONS, FrameGrabber, ReplayFrameSource, SyntheticFrameSource, nominal_calibration, synthetic_scene,
+)
+from instrumentation import Profiler
+from organized_cloud import OrganizedCloud
+from pipeline import FrameInfo
+from plane_segmentation import PlaneSegmenter
+from point_cloud import PointCloudProcessor, decode_xyzrgba
+from point_cloud_lod import PointCloudLOD
+from process_pool import ProcessPointCloudPool
+from quality_controller import QualityController
+from scene_map import SceneMap
+from stereo_depth import StereoCalibration, StereoMatcher, xyzrgba_from_depth
+from stream_server import StreamClient, StreamServer
+from voxel_grid import voxel_downsample, voxel_keys
+
+
+def synthetic_cloud(num_points, seed=0):
+    """Room-like test cloud in meters: a floor, a back wall and some noise."""
+    rng = np.random.default_rng(seed)
+    xyz = np.empty((num_points, 3), dtype=np.float32)
+    half = num_points // 2
+    xyz[:half, 0] = rng.uniform(-2.0, 2.0, half)
+    xyz[:half, 1] = -1.0 + rng.normal(0, 0.005, half)
+    xyz[:half, 2] = rng.uniform(0.4, 5.0, half)
+    xyz[half:, 0] = rng.uniform(-2.0, 2.0, num_points - half)
+    xyz[half:, 1] = rng.uniform(-1.0, 1.5, num_points - half)
+    xyz[half:, 2] = 5.0 + rng.normal(0, 0.01, num_points - half)
+    colors = rng.random((num_points, 3))
+    return xyz, colors
+
+
+def synthetic_xyzrgba(width, height, hole_ratio=0.2, seed=0):
+    """HxWx4 float32 cloud with packed RGBA colors and NaN holes, like MEASURE.XYZRGBA."""
+    rng = np.random.default_rng(seed)
+    cloud = rng.uniform(-3.0, 3.0, (height, width, 4)).astype(np.float32)
+    cloud[..., 3] = rng.integers(0, 2 ** 32, (height, width), dtype=np.uint32).view(np.float32)
+    cloud[rng.random((height, width)) < hole_ratio, :3] = np.nan
+    return cloud
+
+
+def synthetic_depth(width, height, hole_ratio=0.1, seed=0):
+    """HxW float32 depth in meters: a tilted plane with noise, NaN holes and +/-inf."""
+    rng = np.random.default_rng(seed)
+    rows = np.linspace(0.5, 4.5, height, dtype=np.float32)[:, None]
+    depth = rows + rng.normal(0, 0.02, (height, width)).astype(np.float32)
+    holes = rng.random((height, width))
+    depth[holes < hole_ratio] = np.nan
+    depth[(holes >= hole_ratio) & (holes < hole_ratio * 1.1)] = np.inf
+    depth[(holes >= hole_ratio * 1.1) & (holes < hole_ratio * 1.2)] = -np.inf
+    return depth
+
+
+def synthetic_organized_cloud(width, height, focal=None, seed=0):
+    """HxWx4 XYZRGBA cloud back-projected from synthetic_depth with a pinhole camera."""
+    focal = focal or width * 0.6
+    depth = synthetic_depth(width, height, seed=seed)
+    depth[~np.isfinite(depth)] = np.nan
+    rows, cols = np.mgrid[0:height, 0:width].astype(np.float32)
+    cloud = np.empty((height, width, 4), dtype=np.float32)
+    cloud[..., 0] = (cols - width / 2) * depth / focal
+    cloud[..., 1] = (rows - height / 2) * depth / focal
+    cloud[..., 2] = depth
+    cloud[..., 3] = synthetic_xyzrgba(width, height, hole_ratio=0, seed=seed)[..., 3]
+    return cloud, focal
+
+
+def legacy_colorize_depth(depth):
+    """The copy/mask/normalize/applyColorMap sequence the camera thread used before."""
+    import cv2
+
+    depth_data = depth.copy()
+    depth_data[np.isnan(depth_data)] = 0
+    depth_data[np.isinf(depth_data)] = 0
+    depth_normalized = cv2.normalize(depth_data, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    return cv2.applyColorMap(255 - depth_normalized, cv2.COLORMAP_JET)
+
+
+def legacy_decode_xyzrgba(cloud):
+    """The copy/mask/shift decode the camera thread used before decode_xyzrgba."""
+    point_cloud_np = np.array(cloud, copy=True)
+    valid_points = point_cloud_np[~np.isnan(point_cloud_np[:, :, 0])]
+    xyz = valid_points[:, :3]
+    rgba_uint32 = np.frombuffer(valid_points[:, 3].astype(np.float32).tobytes(), dtype=np.uint32)
+    r = ((rgba_uint32 & 0x00FF0000) >> 16) / 255.0
+    g = ((rgba_uint32 & 0x0000FF00) >> 8) / 255.0
+    b = (rgba_uint32 & 0x000000FF) / 255.0
+    return xyz, np.stack((b, g, r), axis=1)
+
+
+def open3d_voxel_downsample(xyz, colors, voxel_size):
+    """Reference implementation: the Open3D round-trip the camera code used before."""
+    import open3d as o3d
+
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(xyz)
+    pcd.colors = o3d.utility.Vector3dVector(colors)
+    down_pcd = pcd.voxel_down_sample(voxel_size=voxel_size)
+    return np.asarray(down_pcd.points), np.asarray(down_pcd.colors)
+
+
+def time_call(fn, repeat):
+    """Run fn `repeat` times and return (last result, list of durations in ms)."""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append((time.perf_counter() - start) * 1000.0)
+    return result, durations
+
+
+def report(name, durations, extra=""):
+    print(f"{name:<28} median {np.median(durations):8.2f} ms   min {min(durations):8.2f} ms  {extra}")
+
+
+def _sorted_by_voxel(xyz, colors, origin, voxel_size):
+    keys, _ = voxel_keys(xyz, voxel_size, origin=origin)
+    order = np.lexsort(keys.T[::-1])
+    return keys[order], xyz[order], colors[order]
+
+
+def bench_voxel(args):
+    width, height = get_resolution_dimensions(args.resolution)
+    num_points = args.points or width * height
+    xyz, colors = synthetic_cloud(num_points)
+    print(f"{num_points} points ({args.resolution}), voxel size {args.voxel_size} m")
+
+    for mode in ("centroid", "first", "nearest"):
+        (down_xyz, _), durations = time_call(
+            lambda: voxel_downsample(xyz, colors, args.voxel_size, mode=mode), args.repeat
+        )
+        report(f"numpy [{mode}]", durations, f"-> {len(down_xyz)} points")
+
+    try:
+        (ref_xyz, ref_colors), durations = time_call(
+            lambda: open3d_voxel_downsample(xyz, colors, args.voxel_size), args.repeat
+        )
+    except ImportError:
+        print("open3d is not installed, skipping the reference comparison.")
+        return
+    report("open3d", durations, f"-> {len(ref_xyz)} points")
+
+    down_xyz, down_colors = voxel_downsample(xyz, colors, args.voxel_size)
+    origin = xyz.min(axis=0) - args.voxel_size * 0.5
+    keys, down_xyz, down_colors = _sorted_by_voxel(down_xyz, down_colors, origin, args.voxel_size)
+    ref_keys, ref_xyz, ref_colors = _sorted_by_voxel(ref_xyz, ref_colors, origin, args.voxel_size)
+
+    matches = (
+        len(keys) == len(ref_keys)
+        and np.array_equal(keys, ref_keys)
+        and np.allclose(down_xyz, ref_xyz, atol=args.tolerance)
+        and np.allclose(down_colors, ref_colors, atol=args.tolerance)
+    )
+    print("outputs match open3d" if matches else "OUTPUTS DIFFER from open3d")
+
+
+def bench_decode(args):
+    width, height = get_resolution_dimensions(args.resolution)
+    cloud = synthetic_xyzrgba(width, height)
+    out_xyz = np.empty((width * height, 3), dtype=np.float32)
+    out_colors = np.empty((width * height, 3), dtype=np.uint8)
+    print(f"{width}x{height} XYZRGBA cloud")
+
+    (ref_xyz, ref_colors), durations = time_call(lambda: legacy_decode_xyzrgba(cloud), args.repeat)
+    report("legacy copy + shifts", durations)
+    (xyz, colors), durations = time_call(
+        lambda: decode_xyzrgba(cloud, out_xyz=out_xyz, out_colors=out_colors), args.repeat
+    )
+    report("decode_xyzrgba uint8", durations)
+    _, durations = time_call(lambda: decode_xyzrgba(cloud, color_dtype=np.float32), args.repeat)
+    report("decode_xyzrgba float32", durations)
+
+    matches = np.array_equal(xyz, ref_xyz) and np.allclose(colors / 255.0, ref_colors)
+    print("outputs match legacy decode" if matches else "OUTPUTS DIFFER from legacy decode")
+
+
+def bench_depth(args):
+    width, height = get_resolution_dimensions(args.resolution)
+    depth = synthetic_depth(width, height)
+    print(f"{width}x{height} depth map")
+
+    _, durations = time_call(lambda: legacy_colorize_depth(depth), args.repeat)
+    report("legacy normalize + colormap", durations)
+    for colormap in ("Grayscale", "Colormap"):
+        colorizer = DepthColorizer(0.4, 5.0, colormap=colormap)
+        _, durations = time_call(lambda: colorizer.colorize(depth), args.repeat)
+        report(f"DepthColorizer [{colormap}]", durations)
+    colorizer = DepthColorizer(0.4, 5.0, colormap="Colormap", auto_range_interval=15)
+    _, durations = time_call(lambda: colorizer.colorize(depth), args.repeat)
+    report("DepthColorizer [auto range]", durations)
+
+
+def bench_alloc(args):
+    import cv2
+
+    width, height = get_resolution_dimensions(args.resolution)
+    cloud = synthetic_xyzrgba(width, height)
+    depth = synthetic_depth(width, height)
+    display_width, display_height = args.display_size
+    print(f"{width}x{height}, {args.frames} frames, display {display_width}x{display_height}")
+
+    def pooled_frame(processor, depth_pool, colorizer, display):
+        xyz, colors = processor.decode(cloud)
+        processor.downsample(xyz, colors)
+        small = cv2.resize(
+            depth, (display_width, display_height),
+            dst=depth_pool.get("depth.display", (display_height, display_width), np.float32),
+            interpolation=cv2.INTER_NEAREST,
+        )
+        colorizer.colorize(small, out=display)
+
+    def legacy_frame():
+        xyz, colors = legacy_decode_xyzrgba(cloud)
+        voxel_downsample(xyz, colors, 0.01)
+        legacy_colorize_depth(depth)
+
+    processor = PointCloudProcessor()
+    depth_pool = BufferPool()
+    colorizer = DepthColorizer(0.4, 5.0)
+    display = np.empty((display_height, display_width, 3), dtype=np.uint8)
+    runs = {
+        "pooled": lambda: pooled_frame(processor, depth_pool, colorizer, display),
+        "legacy": legacy_frame,
+    }
+    for name, run_frame in runs.items():
+        with AllocationMonitor() as monitor:
+            for _ in range(args.frames):
+                with monitor.frame():
+                    run_frame()
+        summary = monitor.summary(skip=1)
+        print(
+            f"{name:<8} frames with allocations >= 1 MiB: {summary['large_allocation_frames']}/{args.frames - 1}"
+            f"   max transient {summary['max_transient_mb']:8.1f} MB"
+            f"   peak RSS {summary['peak_rss_mb']:8.1f} MB"
+        )
+    print(f"pool: {processor.pool.stats()}")
+
+
+def bench_lod(args):
+    xyz, colors = synthetic_cloud(args.points)
+    colors = (colors * 255).astype(np.uint8)
+    print(f"{args.points} points, budgets {args.budgets}")
+
+    def legacy_prepare():
+        # What the GUI thread built before every setData call
+        cloud = np.hstack((xyz, colors / np.float32(255.0)))
+        return cloud[:, :3], np.hstack((cloud[:, 3:], np.ones((len(cloud), 1))))
+
+    _, durations = time_call(legacy_prepare, args.repeat)
+    mb = args.points * (3 * 4 + 4 * 8) / 1e6
+    report("legacy full cloud", durations, f"-> {args.points} points, {mb:.1f} MB per upload")
+
+    for budget in args.budgets:
+        lod = PointCloudLOD(budget)
+        frame_ids = iter(range(args.repeat))
+
+        def prepare():
+            batch = lod.prepare(xyz, colors, FrameInfo(next(frame_ids), 0))
+            batch.release()
+            return batch
+
+        batch, durations = time_call(prepare, args.repeat)
+        mb = len(batch.pos) * 7 * 4 / 1e6
+        report(f"PointCloudLOD [{budget}]", durations, f"-> {len(batch.pos)} points, {mb:.1f} MB per upload")
+
+
+def bench_map(args):
+    # Different seeds sample the same floor and wall again, like consecutive frames of a still scene
+    frames = []
+    for seed in range(args.frames):
+        xyz, colors = synthetic_cloud(args.points, seed=seed)
+        frames.append((xyz, (colors * 255).astype(np.uint8)))
+    print(f"{args.frames} frames of {args.points} points, voxel size {args.voxel_size} m")
+
+    scene_map = SceneMap(voxel_size=args.voxel_size)
+    durations = []
+    for xyz, colors in frames:
+        _, frame_durations = time_call(lambda: scene_map.integrate(xyz, colors), 1)
+        durations += frame_durations
+    report("SceneMap.integrate", durations, f"-> {scene_map.size} voxels, {scene_map.nbytes / 1e6:.1f} MB")
+
+    all_xyz = np.concatenate([xyz for xyz, _ in frames])
+    all_colors = np.concatenate([colors for _, colors in frames])
+    (down_xyz, _), durations = time_call(
+        lambda: voxel_downsample(all_xyz, all_colors, args.voxel_size), args.repeat
+    )
+    report("re-voxelize all frames", durations, f"-> {len(down_xyz)} voxels")
+
+
+def bench_pick(args):
+    width, height = get_resolution_dimensions(args.resolution)
+    cloud, focal = synthetic_organized_cloud(width, height)
+    rng = np.random.default_rng(1)
+    clicks = list(zip(rng.integers(0, height, args.clicks), rng.integers(0, width, args.clicks)))
+    print(f"{width}x{height} cloud, {args.clicks} clicks")
+
+    def flatten_and_search():
+        # Flattened points lost their pixel, so every click projects the whole cloud back
+        xyz, _ = decode_xyzrgba(cloud)
+        cols = xyz[:, 0] / xyz[:, 2] * focal + width / 2
+        rows = xyz[:, 1] / xyz[:, 2] * focal + height / 2
+        return [xyz[np.argmin((rows - row) ** 2 + (cols - col) ** 2)] for row, col in clicks]
+
+    def organized_lookup():
+        organized = OrganizedCloud(cloud)
+        return [organized.point_at(row, col) for row, col in clicks]
+
+    legacy, durations = time_call(flatten_and_search, args.repeat)
+    report("flatten + search", durations, f"{np.median(durations) / args.clicks:.3f} ms per click")
+    picked, durations = time_call(organized_lookup, args.repeat)
+    report("organized lookup", durations, f"{np.median(durations) / args.clicks * 1000:.2f} us per click")
+
+    matches = all(
+        np.allclose(point[:3], ref, atol=1e-4) for point, ref in zip(picked, legacy) if point is not None
+    )
+    print("picked points match" if matches else "PICKED POINTS DIFFER")
+
+    organized = OrganizedCloud(cloud)
+    for stride in (1, 2, 4):
+        grid = organized.decimate(stride)
+        _, durations = time_call(lambda: grid.normals(max_edge=0.1), args.repeat)
+        report(f"normals [stride {stride}]", durations, f"{grid.shape[1]}x{grid.shape[0]} grid")
+
+
+def gui_stalls(workload, tick=0.005):
+    """Run `workload` on a thread and measure how late a 5 ms timer on this thread fires meanwhile.
+
+    The timer stands in for the Qt event loop; its lateness is the jank a
+    GIL-holding point-cloud stage causes in the GUI.
+    """
+    thread = threading.Thread(target=workload)
+    thread.start()
+    late = []
+    while thread.is_alive():
+        start = time.perf_counter()
+        time.sleep(tick)
+        late.append((time.perf_counter() - start - tick) * 1000)
+    thread.join()
+    return np.array(late or [0.0])
+
+
+def bench_procpool(args):
+    for resolution in args.resolutions:
+        width, height = get_resolution_dimensions(resolution)
+        frames = [synthetic_organized_cloud(width, height, seed=seed)[0] for seed in range(2)]
+        print(f"{resolution} ({width}x{height}), {args.frames} frames, voxel size {args.voxel_size} m")
+
+        processor = PointCloudProcessor(voxel_size=args.voxel_size)
+
+        def in_thread():
+            for index in range(args.frames):
+                processor.downsample(*processor.decode(frames[index % 2]))
+
+        results = _run_timed(in_thread)
+        report_throughput("in-thread", args.frames, *results)
+
+        for workers in args.workers:
+            delivered = []
+            pool = ProcessPointCloudPool(
+                height, width, workers, delivery=args.delivery, voxel_size=args.voxel_size,
+                on_result=lambda info, xyz, colors: delivered.append(len(xyz)),
+            ).start()
+            # Warm up: spawn the workers and let them import numpy before timing
+            pool.submit(FrameInfo(-1, 0), frames[0])
+            while not delivered:
+                time.sleep(0.01)
+            delivered.clear()
+
+            def process_pool():
+                for index in range(args.frames):
+                    while pool.pending() == pool.layout.slots:
+                        time.sleep(0.0005)
+                    pool.submit(FrameInfo(index, 0), frames[index % 2])
+                while pool.pending():
+                    time.sleep(0.0005)
+
+            results = _run_timed(process_pool)
+            stats = pool.stats()
+            pool.stop()
+            report_throughput(
+                f"process pool [{workers} workers, {args.delivery}]", len(delivered), *results,
+                f", worker {stats['worker_ms']:.1f} ms/frame",
+            )
+
+
+def _run_timed(workload):
+    start = time.perf_counter()
+    late = gui_stalls(workload)
+    return time.perf_counter() - start, late
+
+
+def report_throughput(name, frames, elapsed, late, extra=""):
+    print(
+        f"  {name:38s} {frames / elapsed:7.1f} fps, "
+        f"GUI timer late p95 {np.percentile(late, 95):6.1f} ms / max {late.max():6.1f} ms{extra}"
+    )
+
+
+def bench_stream(args):
+    source = FrameGrabber(SyntheticFrameSource(args.resolution, args.fps, paced=True))
+    server = StreamServer(port=0, http_port=0, max_cloud_points=args.cloud_points).start()
+    address = ("127.0.0.1", server.port)
+    print(f"{args.resolution} at {args.fps} fps, {args.clients} clients + 1 slow + 1 MJPEG, {args.seconds} s")
+
+    received = {}
+    running = True
+
+    def read_loop(name, client, delay=0.0):
+        received[name] = [0, 0]
+        while running:
+            message = client.read()
+            if message is None:
+                break
+            received[name][0] += 1
+            received[name][1] += len(message[-1])
+            time.sleep(delay)
+
+    def mjpeg_loop():
+        connection = socket.create_connection(("127.0.0.1", server.http_port))
+        connection.sendall(b"GET /color.mjpg HTTP/1.0\r\n\r\n")
+        received["mjpeg"] = [0, 0]
+        while running:
+            chunk = connection.recv(1 << 16)
+            if not chunk:
+                break
+            received["mjpeg"][0] += chunk.count(b"--frame\r\n")
+            received["mjpeg"][1] += len(chunk)
+        connection.close()
+
+    threads = [threading.Thread(target=mjpeg_loop, daemon=True)]
+    for index in range(args.clients):
+        client = StreamClient(address, {"color": 0, "depth": 0, "cloud": args.cloud_fps})
+        threads.append(threading.Thread(target=read_loop, args=(f"client-{index}", client), daemon=True))
+    # Reads one message every 0.5 s with a tiny receive buffer, so the server's sends block
+    slow = StreamClient(address, {"color": 0, "depth": 0})
+    slow.connection.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    threads.append(threading.Thread(target=read_loop, args=("slow", slow, 0.5), daemon=True))
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+
+    source.open()
+    published = 0
+    grab_late = []
+    end = time.monotonic() + args.seconds
+    while time.monotonic() < end:
+        frame = source.grab()
+        if frame is None:
+            continue
+        start = time.perf_counter()
+        server.publish(frame)
+        grab_late.append((time.perf_counter() - start) * 1000)
+        published += 1
+    elapsed = args.seconds
+    stats = server.stats()
+    running = False
+    server.stop()
+    source.close()
+
+    print(f"  capture: {published / elapsed:.1f} fps, publish() p99 {np.percentile(grab_late, 99):.3f} ms, "
+          f"{stats['frames']['dropped']} frames superseded before encoding")
+    print("  encode ms: " + ", ".join(f"{stream} {ms:.1f}" for stream, ms in stats["encode_ms"].items()
+                                      if stats["encoded"][stream]))
+    for name, (messages, size) in sorted(received.items()):
+        print(f"  {name:10s} {messages / elapsed:6.1f} msg/s, {size / elapsed / 1e6:6.1f} MB/s")
+    for name, subscriber in stats["subscribers"].items():
+        if subscriber["dropped"] or subscriber["error"]:
+            print(f"  server side {name}: {subscriber['dropped']} dropped, error {subscriber['error']}")
+
+
+def synthetic_depth_sequence(width, height, frames, seed=0):
+    """Depth frames of a still scene: a fixed synthetic_depth with a few mm of noise on 20% of the pixels."""
+    rng = np.random.default_rng(seed)
+    base = synthetic_depth(width, height, seed=seed)
+    sequence = []
+    for _ in range(frames):
+        depth = base.copy()
+        noisy = rng.random((height, width)) < 0.2
+        depth[noisy] += rng.normal(0, 0.003, int(noisy.sum())).astype(np.float32)
+        sequence.append(depth)
+    return sequence
+
+
+def bench_depthcodec(args):
+    if args.capture:
+        reader = CaptureReader(args.capture)
+        unit = reader.header["metadata"].get("depth_unit", "METER")
+        scale = 1.0 if unit == "MILLIMETER" else 1000.0
+        frames = [np.array(reader[index]["depth"]) for index in range(min(args.frames, len(reader)))]
+        reader.close()
+        print(f"{args.capture}: {len(frames)} frames, depth in {unit}")
+    else:
+        width, height = get_resolution_dimensions(args.resolution)
+        scale = 1000.0
+        frames = synthetic_depth_sequence(width, height, args.frames)
+        print(f"synthetic {width}x{height}, {len(frames)} frames")
+    float_mb = sum(frame.nbytes for frame in frames) / 1e6
+    quantized = [quantize_depth(frame, scale) for frame in frames]
+
+    def report_codec(name, encode, decode):
+        start = time.perf_counter()
+        packets = [encode(frame) for frame in frames]
+        encode_s = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = [np.array(decode(packet)) for packet in packets]
+        decode_s = time.perf_counter() - start
+        size_mb = sum(len(packet) for packet in packets) / 1e6
+        exact = all(np.array_equal(a, b) for a, b in zip(decoded, quantized))
+        print(
+            f"  {name:24s} ratio {float_mb / size_mb:5.2f}x, {size_mb / len(frames):6.2f} MB/frame, "
+            f"encode {float_mb / encode_s:6.0f} MB/s, decode {float_mb / decode_s:6.0f} MB/s"
+            + ("" if exact else "  NOT EXACT")
+        )
+
+    def png_encode(frame):
+        return cv2.imencode(".png", quantize_depth(frame, scale), [cv2.IMWRITE_PNG_COMPRESSION, 1])[1]
+
+    report_codec("PNG 16-bit", png_encode, lambda packet: cv2.imdecode(packet, cv2.IMREAD_UNCHANGED))
+    for compressor in args.compressors:
+        for interval in args.keyframe_intervals:
+            encoder = DepthEncoder(compressor, args.level if compressor == "zlib" else 0, interval, scale)
+            decoder = DepthDecoder(scale)
+            report_codec(f"{compressor} [keyframe {interval}]", encoder.encode, decoder.decode_quantized)
+
+
+def synthetic_stereo_pair(width, height, disparity_range=(20, 60), seed=0):
+    """Rectified BGR pair of a random texture; the disparity ramps with the row, so depth is known per row."""
+    rng = np.random.default_rng(seed)
+    texture = cv2.GaussianBlur(rng.integers(0, 255, (height, width + disparity_range[1]), dtype=np.uint8), (3, 3), 0)
+    disparity = np.round(np.linspace(*disparity_range, height)).astype(int)
+    left = np.repeat(texture[:, :width, None], 3, axis=2)
+    right = np.empty_like(left)
+    for row, shift in enumerate(disparity):
+        right[row] = texture[row, shift:shift + width, None]
+    return left, right, disparity.astype(np.float32)
+
+
+def bench_stereo(args):
+    width, height = get_resolution_dimensions(args.resolution)
+    left, right, disparity = synthetic_stereo_pair(width, height)
+    calibration = StereoCalibration(0.55 * width, 0.55 * width, width / 2, height / 2, 0.12, width, height)
+    truth = (calibration.fx * calibration.baseline / disparity)[:, None]
+    print(f"{width}x{height} synthetic pair, {args.algorithm}, {args.repeat} repeats")
+    reference = None
+    for workers in args.workers:
+        matcher = StereoMatcher(calibration, args.algorithm, workers=workers)
+        depth, durations = time_call(lambda: matcher.depth(left, right), args.repeat)
+        matcher.close()
+        valid = np.isfinite(depth)
+        error = np.median(np.abs(depth[valid] - np.broadcast_to(truth, depth.shape)[valid]) / depth[valid])
+        if reference is None:
+            reference = depth
+        seams = np.mean(~((reference == depth) | (np.isnan(reference) & np.isnan(depth))))
+        report(
+            f"{workers} workers, {matcher.strips} strips", durations,
+            f"{1000 / np.median(durations):5.2f} pairs/s, {100 * valid.mean():.0f}% valid, "
+            f"median error {100 * error:.2f}%, {100 * seams:.3f}% px differ from the first row",
+        )
+
+
+def bench_quality(args):
+    """Closed loop: real decode + voxelize work under a stepped synthetic load, fed to the controller.
+
+    Depth resolution is modelled by resizing the cloud (untimed, the SDK does
+    it), a load factor of N stretches each frame to N times its measured cost.
+    """
+    width, height = get_resolution_dimensions(args.resolution)
+    source, _ = synthetic_organized_cloud(width, height)
+    processor = PointCloudProcessor()
+    controller = QualityController(args.target_fps, levels=args.levels, log=None)
+    print(f"{width}x{height}, target {args.target_fps} FPS ({controller.budget_ms:.1f} ms/frame)")
+    print("window  load  level   ms/frame    fps")
+    window = 0
+    phases = []
+    for factor in args.loads:
+        levels = []
+        for _ in range(args.windows):
+            settings = controller.settings()
+            processor.voxel_size = settings["voxel_size"]
+            scale = settings["depth_scale"]
+            cloud = source if scale >= 1.0 else cv2.resize(
+                source, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_NEAREST
+            )
+            elapsed = 0.0
+            for _ in range(args.frames):
+                start = time.perf_counter()
+                processor.downsample(*processor.decode(cloud))
+                cost = time.perf_counter() - start
+                time.sleep(cost * (factor - 1.0))
+                elapsed += cost * factor
+            load_ms = 1000.0 * elapsed / args.frames
+            changed = controller.update(load_ms) is not None
+            level = f"{controller.level}*" if changed else str(controller.level)
+            print(f"{window:6d}  {factor:4.1f}  {level:>5s}  {load_ms:9.1f}  {1000.0 / load_ms:5.1f}")
+            levels.append(controller.level)
+            window += 1
+        phases.append((factor, levels, load_ms))
+
+    print("phase summary:")
+    for factor, levels, load_ms in phases:
+        # Settled from the last level change of the phase on
+        changes = sum(1 for a, b in zip(levels, levels[1:]) if a != b)
+        settled = next(index for index in range(len(levels)) if len(set(levels[index:])) == 1)
+        print(
+            f"  load x{factor:.1f}: level {levels[-1]} ({controller.describe(controller.settings(levels[-1]))}), "
+            f"{1000.0 / load_ms:.1f} FPS, {changes} changes, settled after window {settled}"
+        )
+
+
+def synthetic_plane_scene(points, floor_ratio=0.5, table_ratio=0.2, noise=0.005, seed=0):
+    """Floor at y = 1.2 m and a table top at y = 0.45 m (camera frame, y down) among clutter.
+
+    Returns xyz and the true label of each point: 0 floor, 1 table, -1 clutter.
+    """
+    rng = np.random.default_rng(seed)
+    floor, table = int(points * floor_ratio), int(points * table_ratio)
+    clutter = points - floor - table
+    xyz = np.empty((points, 3), np.float32)
+    xyz[:floor] = np.column_stack((rng.uniform(-2, 2, floor), np.full(floor, 1.2), rng.uniform(0.8, 5, floor)))
+    xyz[floor:floor + table] = np.column_stack(
+        (rng.uniform(-0.5, 0.5, table), np.full(table, 0.45), rng.uniform(1.5, 2.3, table))
+    )
+    xyz[floor + table:] = rng.uniform((-2, -1, 0.8), (2, 1.1, 5), (clutter, 3))
+    xyz[:floor + table] += rng.normal(0, noise, (floor + table, 3))
+    labels = np.full(points, -1, np.int8)
+    labels[:floor] = 0
+    labels[floor:floor + table] = 1
+    return xyz, labels
+
+
+def sequential_ransac(xyz, distance, iterations, rng):
+    """Reference: one hypothesis at a time, each scored against every point."""
+    best, best_count = None, -1
+    for _ in range(iterations):
+        triple = xyz[rng.integers(0, len(xyz), 3)]
+        normal = np.cross(triple[1] - triple[0], triple[2] - triple[0])
+        length = np.linalg.norm(normal)
+        if length < 1e-9:
+            continue
+        inliers = np.abs(xyz @ (normal / length) - (normal / length) @ triple[0]) < distance
+        count = np.count_nonzero(inliers)
+        if count > best_count:
+            best, best_count = inliers, count
+    return best
+
+
+def plane_accuracy(found, truth):
+    """Precision and recall of a predicted inlier mask against the true one."""
+    hits = np.count_nonzero(found & truth)
+    return hits / max(1, np.count_nonzero(found)), hits / max(1, np.count_nonzero(truth))
+
+
+def normal_error(normal, reference):
+    return np.degrees(np.arccos(min(1.0, abs(float(np.asarray(normal) @ reference)))))
+
+
+def bench_planes(args):
+    xyz, truth = synthetic_plane_scene(args.points, noise=args.noise)
+    floor_normal = np.array([0, -1, 0], np.float32)
+    print(f"{args.points} points (50% floor, 20% table, 30% clutter), noise {args.noise} m, "
+          f"distance {args.distance} m, budget {args.budget_ms} ms")
+
+    for name, normal in (("batched", None), ("batched +normal", floor_normal)):
+        for warm in (False, True):
+            segmenter = PlaneSegmenter(args.distance, args.hypotheses, args.sample, max_planes=2, normal=normal,
+                                       budget_ms=args.budget_ms, warm_start=warm)
+            segmenter.segment(xyz)
+            result, durations = time_call(lambda: segmenter.segment(xyz), args.repeat)
+            precision, recall = plane_accuracy(result.labels == 0, truth == 0)
+            report(
+                f"{name} [{'warm' if warm else 'cold'}]", durations,
+                f"{len(result.planes)} planes, floor normal error {normal_error(result.planes[0][0], floor_normal):.2f} deg, "
+                f"precision {precision:.3f} recall {recall:.3f}, {segmenter.hypotheses} hypotheses",
+            )
+
+    rng = np.random.default_rng(0)
+    found, durations = time_call(lambda: sequential_ransac(xyz, args.distance, args.hypotheses, rng), args.repeat)
+    precision, recall = plane_accuracy(found, truth == 0)
+    report("sequential", durations, f"1 plane, precision {precision:.3f} recall {recall:.3f}")
+
+    try:
+        import open3d as o3d
+    except ImportError:
+        print("open3d is not installed, skipping the reference comparison.")
+        return
+    pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(xyz.astype(np.float64)))
+    (model, inliers), durations = time_call(
+        lambda: pcd.segment_plane(args.distance, 3, args.hypotheses), args.repeat
+    )
+    found = np.zeros(len(xyz), bool)
+    found[inliers] = True
+    precision, recall = plane_accuracy(found, truth == 0)
+    report("open3d segment_plane", durations,
+           f"1 plane, floor normal error {normal_error(model[:3], floor_normal):.2f} deg, "
+           f"precision {precision:.3f} recall {recall:.3f}")
+
+
+def synthetic_outlier_scene(width, height, speckle_ratio=0.005, far_ratio=0.005, seed=0):
+    """Synthetic floor-and-box cloud with injected flying pixels, speckles and far points.
+
+    Returns the cloud and an HxW mask of the injected points.
+    """
+    rng = np.random.default_rng(seed)
+    scene = synthetic_scene(width, height, seed=seed)
+    depth = scene["depth"].copy()
+    injected = np.zeros((height, width), bool)
+    # Kutu kenarlarında ön ve arka plan arasında asılı tek piksellik sütunlar
+    rows, box_width = slice(height // 3, height // 3 + height // 3), width // 5
+    for col in (width // 8 - 1, width // 8 + box_width):
+        depth[rows, col] = 0.5 * (1.5 + depth[rows, col - 1 if col > width // 8 else col + 1])
+        injected[rows, col] = True
+    speckles = rng.random((height, width)) < speckle_ratio
+    depth[speckles] *= rng.uniform(0.5, 0.8, np.count_nonzero(speckles)).astype(np.float32)
+    far = rng.random((height, width)) < far_ratio
+    depth[far] = 30.0
+    injected |= (speckles | far) & np.isfinite(depth)
+    return xyzrgba_from_depth(depth, scene["left"], nominal_calibration(width, height)), injected
+
+
+def bench_filters(args):
+    width, height = get_resolution_dimensions(args.resolution)
+    cloud, injected = synthetic_outlier_scene(width, height)
+    processor = PointCloudProcessor(voxel_size=args.voxel_size)
+    valid = np.isfinite(cloud[..., 0])
+    print(f"{width}x{height}, {np.count_nonzero(valid)} valid points, {np.count_nonzero(injected)} injected outliers")
+
+    def downstream(mask):
+        xyz, colors = processor.decode(cloud, mask)
+        return processor.downsample(xyz, colors)
+
+    (down, _), base = time_call(lambda: downstream(None), args.repeat)
+    report("unfiltered", base, f"decode + voxelize -> {len(down)} voxels")
+
+    # Filters are added in the order they run; each later one sees what the earlier ones left
+    stages = (("crop", {"min_depth": 0.3, "max_depth": 10.0}), ("+flying", {"flying_threshold": args.flying_threshold}),
+              ("+radius", {"radius": args.radius}), ("+statistical", {"std_ratio": args.std_ratio}))
+    settings = {}
+    for name, stage in stages:
+        settings.update(stage)
+        cloud_filter = CloudFilter(enabled=True, **settings)
+        mask, filter_ms = time_call(lambda: cloud_filter.mask(cloud, processor.pool), args.repeat)
+        removed = valid & ~mask
+        caught = np.count_nonzero(removed & injected) / max(1, np.count_nonzero(injected))
+        clean = np.count_nonzero(removed & ~injected) / max(1, np.count_nonzero(valid & ~injected))
+        counts = ", ".join(f"{key} {count}" for key, count in cloud_filter.last_removed.items() if count)
+        (down, _), filtered = time_call(lambda: downstream(cloud_filter.mask(cloud, processor.pool)), args.repeat)
+        saved = min(base) - (min(filtered) - min(filter_ms))
+        report(
+            f"filter [{name}]", filter_ms,
+            f"removed {counts}: {100 * caught:.1f}% of injected, {100 * clean:.2f}% of clean; "
+            f"-> {len(down)} voxels, {saved:+.1f} ms decode + voxelize saved",
+        )
+
+
+HEAVY_MODULES = ("numpy", "cv2", "PyQt5.QtWidgets", "pyqtgraph.opengl", "pyzed.sl", "open3d")
+
+# Runs in a fresh interpreter: window shown, finish_startup done, first camera frame
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+import view
+marks = {"import": time.perf_counter() - start}
+camera, timeout = sys.argv[1] == "1", float(sys.argv[2])
+
+def done():
+    print(json.dumps(marks))
+    window.close()
+    app.quit()
+
+finish_startup = view.EnhancedMainWindow.finish_startup
+def timed_finish_startup(self):
+    finish_startup(self)
+    marks["ready"] = time.perf_counter() - start
+    if not camera:
+        return QTimer.singleShot(0, done)
+    def camera_state(state, message):
+        if state == "streaming" and "first_frame" not in marks:
+            marks["first_frame"] = time.perf_counter() - start
+            QTimer.singleShot(0, done)
+        elif state == "failed":
+            marks["error"] = message
+            QTimer.singleShot(0, done)
+    self.camera_thread.camera_state_signal.connect(camera_state)
+    self.start_camera()
+view.EnhancedMainWindow.finish_startup = timed_finish_startup
+
+window = view.EnhancedMainWindow()
+window.show()
+app.processEvents()
+marks["shown"] = time.perf_counter() - start
+QTimer.singleShot(int(timeout * 1000), done)
+app.exec_()
+"""
+
+
+def bench_startup(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    environment = dict(os.environ)
+    if args.offscreen:
+        environment["QT_QPA_PLATFORM"] = "offscreen"
+
+    print("cold import, each in a fresh interpreter:")
+    for module in HEAVY_MODULES:
+        code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+        samples = []
+        for _ in range(args.repeat):
+            result = subprocess.run([sys.executable, "-c", code], cwd=here, env=environment,
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                break
+            samples.append(float(result.stdout.strip().splitlines()[-1]))
+        if samples:
+            print(f"  {module:18s} {1000 * np.median(samples):7.1f} ms")
+        else:
+            print(f"  {module:18s} not installed")
+
+    print("GUI startup (median of runs):")
+    runs = []
+    for _ in range(args.repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE, "1" if args.camera else "0", str(args.timeout)],
+            cwd=here, env=environment, capture_output=True, text=True,
+        )
+        lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+        if result.returncode != 0 or not lines:
+            print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "startup probe failed")
+            return
+        runs.append(json.loads(lines[-1]))
+    for mark, label in (("import", "import view"), ("shown", "window shown"),
+                        ("ready", "views + camera thread ready"), ("first_frame", "first camera frame")):
+        samples = [run[mark] for run in runs if mark in run]
+        if samples:
+            print(f"  {label:28s} {1000 * np.median(samples):8.1f} ms")
+    errors = {run["error"] for run in runs if "error" in run}
+    for error in errors:
+        print(f"  camera: {error}")
+
+
+PIPELINES = ("gui", "record", "depth_sensing")
+# Metrics compared between result files, and whether higher is better
+COMPARED_METRICS = (("fps", True), ("peak_rss_mb", False))
+# Span medians closer than this are timer noise, whatever the percentage
+MIN_SPAN_CHANGE_MS = 0.1
+
+
+def pipeline_source(args, resolution):
+    if args.capture:
+        return ReplayFrameSource(args.capture, paced=args.paced, loop=True, frames=args.frames)
+    return SyntheticFrameSource(resolution, args.fps, paced=args.paced, frames=args.frames,
+                                variants=args.variants, seed=args.seed)
+
+
+def run_gui_pipeline(source, static_scene=False, planes="off"):
+    """ZEDCameraThread's grab loop and image / depth / point-cloud stages, with the GUI replaced by counters."""
+    from PyQt5.QtCore import Qt
+    from ZEDCamera import ZEDCameraThread
+
+    thread = ZEDCameraThread(source=source, profile=True, outputs=("left", "depth_view", "point_cloud"),
+                             static_scene={"enabled": static_scene}, planes={"mode": planes})
+    profiler = thread.profiler
+    shown = {"camera": 0, "depth": 0, "cloud": 0}
+    on_screen = []
+
+    def show_image(pane):
+        def show(display):
+            profiler.frame_shown(pane, display.info.frame_id)
+            shown[pane] += 1
+            display.release()
+        return show
+
+    def show_cloud(batch):
+        profiler.frame_shown("cloud", batch.info.frame_id)
+        shown["cloud"] += 1
+        # Like the 3D view: the previous batch is released once it has been replaced
+        if on_screen:
+            on_screen.pop().release()
+        on_screen.append(batch)
+
+    # No event loop here: the handlers run on the emitting stage thread
+    thread.image_signal.connect(show_image("camera"), Qt.DirectConnection)
+    thread.depth_signal.connect(show_image("depth"), Qt.DirectConnection)
+    thread.point_cloud_signal.connect(show_cloud, Qt.DirectConnection)
+    thread.set_display_size("camera", 960, 540)
+    thread.set_display_size("depth", 960, 540)
+    thread.running = True
+    start = time.perf_counter()
+    thread.run()
+    elapsed = time.perf_counter() - start
+    stages = {}
+    stage_stats = thread.stage_stats()
+    for name, stage in thread.stages.items():
+        stages[name] = {
+            "fps": stage.processed / elapsed,
+            "ms": 1000.0 * stage.busy_time / max(stage.processed, 1),
+            "dropped": stage_stats[name]["dropped"],
+        }
+        if "static" in stage_stats[name]:
+            static = stage_stats[name]["static"]
+            stages[name].update(skip_rate=static["skip_rate"], saved_ms=static["saved_ms"])
+    return elapsed, source.frame_id, stages, profiler.snapshot()
+
+
+def run_record_pipeline(source, static_scene=False, planes="off"):
+    """Camera.videoSave writing both AVIs and the .zcap recording into the working directory."""
+    from camera import Camera
+
+    # A replay without resolution metadata has resolution None; Camera then records at source.size
+    options = argparse.Namespace(
+        frame_rate=source.fps, video_resolution=source.resolution, video_save=True, frame_save=False,
+        raw_save=True, depth_codec="raw", keyframe_interval=30, save_time=float("inf"), frame_time=1,
+        show=False, queue_size=32, drop_when_full=False, image_format="png", png_compression=3,
+        jpeg_quality=95, profile=True, profile_log=None,
+    )
+    start = time.perf_counter()
+    # Records until the source runs out, then waits for the writers to flush
+    camera = Camera(options, source)
+    elapsed = time.perf_counter() - start
+    return elapsed, source.frame_id, {}, camera.profiler.snapshot()
+
+
+def run_depth_sensing_pipeline(source, static_scene=False, planes="off"):
+    """depth_sensing's per-frame work (colorize, decode, voxelize, Open3D cloud) without the windows."""
+    import depth_sensing
+
+    profiler = Profiler()
+    image, depth, cloud = source.new_mat(), source.new_mat(), source.new_mat()
+    colorizer = depth_sensing.make_depth_colorizer()
+    source.open()
+    start = time.perf_counter()
+    while True:
+        try:
+            with profiler.span("grab"):
+                grabbed = source.grab()
+        except EOFError:
+            break
+        if not grabbed:
+            continue
+        with profiler.span("retrieve"):
+            source.retrieve_image(image, "left")
+            source.retrieve_depth(depth)
+            source.retrieve_cloud(cloud)
+        with profiler.span("process"):
+            depth_sensing.process_frame(depth, cloud, colorizer)
+    elapsed = time.perf_counter() - start
+    source.close()
+    return elapsed, source.frame_id, {}, profiler.snapshot()
+
+
+PIPELINE_RUNNERS = {
+    "gui": run_gui_pipeline,
+    "record": run_record_pipeline,
+    "depth_sensing": run_depth_sensing_pipeline,
+}
+
+
+def run_pipeline_case(args):
+    """One pipeline at one resolution, in this (fresh) process so peak RSS belongs to it alone."""
+    source = pipeline_source(args, args.resolutions[0])
+    # Scene generation / file mapping is setup, not pipeline time
+    source.open()
+    elapsed, frames, stages, spans = PIPELINE_RUNNERS[args.case](source, args.static_scene, args.planes)
+    return {
+        "pipeline": args.case,
+        "resolution": source.resolution or "x".join(map(str, source.size)),
+        "source": source.name,
+        "frames": frames,
+        "elapsed_s": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "stages": stages,
+        "spans": {name: {key: values[key] for key in ("mean", "p50", "p95", "p99")} for name, values in spans.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def environment_info(args):
+    """Enough to tell two result files apart: commit, machine and library versions."""
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def git(*command):
+        result = subprocess.run(["git", *command], cwd=here, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(status),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "frames": args.frames,
+        "paced": args.paced,
+        "static_scene": args.static_scene,
+        "planes": args.planes,
+        "source": args.capture or "synthetic",
+        "variants": args.variants,
+    }
+
+
+def print_pipeline_result(result):
+    if "error" in result:
+        print(f"  {result['pipeline']:14s} {result['resolution']:7s} skipped: {result['error']}")
+        return
+    stages = ", ".join(f"{name} {stage['fps']:.1f} fps / {stage['ms']:.1f} ms"
+                       for name, stage in result["stages"].items())
+    print(f"  {result['pipeline']:14s} {result['resolution']:7s} {result['fps']:7.1f} frames/s "
+          f"{result['peak_rss_mb']:7.0f} MB  {stages}")
+
+
+def bench_pipeline(args):
+    if args.case:
+        print(json.dumps(run_pipeline_case(args)))
+        return
+
+    script = os.path.abspath(__file__)
+    resolutions = [None] if args.capture else args.resolutions
+    results = []
+    print(f"{args.frames} frames per run, {'paced' if args.paced else 'unpaced'}:")
+    for pipeline in args.pipelines:
+        for resolution in resolutions:
+            command = [sys.executable, script, "pipeline", "--case", pipeline, "--frames", str(args.frames),
+                       "--fps", str(args.fps), "--variants", str(args.variants), "--seed", str(args.seed)]
+            command += ["--capture", os.path.abspath(args.capture)] if args.capture else ["--resolutions", resolution]
+            if args.paced:
+                command.append("--paced")
+            if args.static_scene:
+                command.append("--static_scene")
+            command += ["--planes", args.planes]
+            # Each case in its own interpreter and scratch directory: clean peak RSS, no recordings left behind
+            with tempfile.TemporaryDirectory() as scratch:
+                completed = subprocess.run(command, cwd=scratch, capture_output=True, text=True)
+            lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+            if completed.returncode == 0 and lines:
+                result = json.loads(lines[-1])
+            else:
+                error = completed.stderr.strip().splitlines()
+                result = {"pipeline": pipeline, "resolution": resolution or "-",
+                          "error": error[-1] if error else "no result"}
+            print_pipeline_result(result)
+            results.append(result)
+
+    document = {"environment": environment_info(args), "results": results}
+    output = args.output
+    if output is None:
+        environment = document["environment"]
+        name = f"pipeline-{environment['time'].replace(':', '')}-{environment['commit'] or 'nogit'}.json"
+        output = os.path.join(os.path.dirname(script), "benchmarks", name)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(document, handle, indent=2)
+    print(f"saved {output}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            regressions = compare_results(json.load(handle), document, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+def compare_results(baseline, current, threshold):
+    """Print metric changes per (pipeline, resolution); return how many got worse by more than threshold %."""
+    def cases(document):
+        return {(result["pipeline"], result["resolution"]): result
+                for result in document["results"] if "error" not in result}
+
+    def metrics(result):
+        values = {name: (result[name], higher) for name, higher in COMPARED_METRICS}
+        for stage, stats in result["stages"].items():
+            values[f"{stage}.fps"] = (stats["fps"], True)
+        for span, stats in result["spans"].items():
+            values[f"{span}.p50"] = (stats["p50"], False)
+        return values
+
+    print(f"{baseline['environment'].get('commit')} -> {current['environment'].get('commit')} "
+          f"(changes over {threshold:.0f}%):")
+    old_cases, new_cases = cases(baseline), cases(current)
+    regressions = 0
+    for key in sorted(old_cases.keys() & new_cases.keys()):
+        old, new = metrics(old_cases[key]), metrics(new_cases[key])
+        for name in sorted(old.keys() & new.keys()):
+            (before, higher), (after, _) = old[name], new[name]
+            if before <= 0 or (name.endswith(".p50") and abs(after - before) < MIN_SPAN_CHANGE_MS):
+                continue
+            change = 100.0 * (after - before) / before
+            if abs(change) < threshold:
+                continue
+            worse = change < 0 if higher else change > 0
+            regressions += worse
+            print(f"  {key[0]:14s} {key[1]:7s} {name:24s} {before:9.2f} -> {after:9.2f} "
+                  f"{change:+6.1f}% {'REGRESSION' if worse else 'better'}")
+    for key in sorted(old_cases.keys() ^ new_cases.keys()):
+        print(f"  {key[0]:14s} {key[1]:7s} only in {'baseline' if key in old_cases else 'current'}")
+    print(f"{regressions} regression(s)")
+    return regressions
+
+
+def bench_compare(args):
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.current, encoding="utf-8") as handle:
+        current = json.load(handle)
+    if compare_results(baseline, current, args.threshold):
+        sys.exit(1)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Point-cloud pipeline benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    voxel = subparsers.add_parser("voxel", help="NumPy voxel grid vs Open3D voxel_down_sample")
+    voxel.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD2K")
+    voxel.add_argument("--points", type=int, default=0, help="Number of points (default: full frame at --resolution)")
+    voxel.add_argument("--voxel_size", type=float, default=0.01)
+    voxel.add_argument("--repeat", type=int, default=5)
+    voxel.add_argument("--tolerance", type=float, default=1e-5)
+    voxel.set_defaults(func=bench_voxel)
+
+    decode = subparsers.add_parser("decode", help="decode_xyzrgba vs the legacy copy/shift decode")
+    decode.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD2K")
+    decode.add_argument("--repeat", type=int, default=5)
+    decode.set_defaults(func=bench_decode)
+
+    depth = subparsers.add_parser("depth", help="DepthColorizer vs the legacy per-frame normalize")
+    depth.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD2K")
+    depth.add_argument("--repeat", type=int, default=20)
+    depth.set_defaults(func=bench_depth)
+
+    alloc = subparsers.add_parser("alloc", help="Per-frame allocations of the pooled stages vs the legacy path")
+    alloc.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD720")
+    alloc.add_argument("--frames", type=int, default=10)
+    alloc.add_argument("--display_size", type=int, nargs=2, default=(640, 360))
+    alloc.set_defaults(func=bench_alloc)
+
+    lod = subparsers.add_parser("lod", help="Budgeted level-of-detail batches vs the full-cloud upload")
+    lod.add_argument("--points", type=int, default=1_000_000)
+    lod.add_argument("--budgets", type=int, nargs="+", default=(50_000, 150_000, 300_000))
+    lod.add_argument("--repeat", type=int, default=10)
+    lod.set_defaults(func=bench_lod)
+
+    scene = subparsers.add_parser("map", help="Incremental SceneMap vs re-voxelizing every accumulated frame")
+    scene.add_argument("--points", type=int, default=300_000)
+    scene.add_argument("--frames", type=int, default=30)
+    scene.add_argument("--voxel_size", type=float, default=0.02)
+    scene.add_argument("--repeat", type=int, default=3)
+    scene.set_defaults(func=bench_map)
+
+    pick = subparsers.add_parser("pick", help="Organized pixel lookup and normals vs flatten-and-search picking")
+    pick.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD720")
+    pick.add_argument("--clicks", type=int, default=20)
+    pick.add_argument("--repeat", type=int, default=3)
+    pick.set_defaults(func=bench_pick)
+
+    procpool = subparsers.add_parser("procpool", help="Point-cloud stage in-thread vs in a shared-memory process pool")
+    procpool.add_argument("--resolutions", type=str, nargs="+", choices=["HD2K", "HD1080", "HD720", "VGA"],
+                          default=["VGA", "HD720", "HD1080", "HD2K"])
+    procpool.add_argument("--workers", type=int, nargs="+", default=(2, 4))
+    procpool.add_argument("--delivery", type=str, choices=["ordered", "latest"], default="ordered")
+    procpool.add_argument("--frames", type=int, default=20)
+    procpool.add_argument("--voxel_size", type=float, default=0.01)
+    procpool.set_defaults(func=bench_procpool)
+
+    stream = subparsers.add_parser("stream", help="Streaming server throughput with local TCP, slow and MJPEG clients")
+    stream.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD720")
+    stream.add_argument("--fps", type=int, default=30)
+    stream.add_argument("--clients", type=int, default=3)
+    stream.add_argument("--cloud_fps", type=float, default=5)
+    stream.add_argument("--cloud_points", type=int, default=50_000)
+    stream.add_argument("--seconds", type=float, default=5)
+    stream.set_defaults(func=bench_stream)
+
+    depthcodec = subparsers.add_parser("depthcodec", help="Depth codec ratio and MB/s vs 16-bit PNG")
+    depthcodec.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD2K")
+    depthcodec.add_argument("--capture", type=str, default=None, help="Use the depth of a .zcap recording instead")
+    depthcodec.add_argument("--frames", type=int, default=30)
+    depthcodec.add_argument("--compressors", type=str, nargs="+", choices=["zlib", "lzma", "none"], default=("zlib", "lzma"))
+    depthcodec.add_argument("--keyframe_intervals", type=int, nargs="+", default=(1, 30))
+    depthcodec.add_argument("--level", type=int, default=1, help="zlib level")
+    depthcodec.set_defaults(func=bench_depthcodec)
+
+    stereo = subparsers.add_parser("stereo", help="Strip-parallel CPU stereo depth: pairs/s and accuracy per worker count")
+    stereo.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD720")
+    stereo.add_argument("--algorithm", type=str, choices=["sgbm", "bm"], default="sgbm")
+    stereo.add_argument("--workers", type=int, nargs="+", default=(1, 2, 4))
+    stereo.add_argument("--repeat", type=int, default=3)
+    stereo.set_defaults(func=bench_stereo)
+
+    quality = subparsers.add_parser("quality", help="Adaptive quality controller converging under a stepped synthetic load")
+    quality.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD720")
+    quality.add_argument("--target_fps", type=float, default=10)
+    quality.add_argument("--levels", type=int, default=6)
+    quality.add_argument("--loads", type=float, nargs="+", default=(1.0, 3.0, 1.0), help="Load factor per phase")
+    quality.add_argument("--windows", type=int, default=15, help="Controller windows per phase")
+    quality.add_argument("--frames", type=int, default=4, help="Frames per window")
+    quality.set_defaults(func=bench_quality)
+
+    planes = subparsers.add_parser("planes", help="Batched RANSAC planes: time, accuracy, warm start vs sequential and Open3D")
+    planes.add_argument("--points", type=int, default=100000, help="Reduced-cloud size")
+    planes.add_argument("--noise", type=float, default=0.005)
+    planes.add_argument("--distance", type=float, default=0.02)
+    planes.add_argument("--hypotheses", type=int, default=256)
+    planes.add_argument("--sample", type=int, default=4096)
+    planes.add_argument("--budget_ms", type=float, default=10.0)
+    planes.add_argument("--repeat", type=int, default=10)
+    planes.set_defaults(func=bench_planes)
+
+    filters = subparsers.add_parser("filters", help="Early grid filters: removed points per filter and decode + voxelize time saved")
+    filters.add_argument("--resolution", type=str, choices=["HD2K", "HD1080", "HD720", "VGA"], default="HD720")
+    filters.add_argument("--voxel_size", type=float, default=0.01)
+    filters.add_argument("--flying_threshold", type=float, default=0.05)
+    filters.add_argument("--radius", type=float, default=0.05)
+    filters.add_argument("--std_ratio", type=float, default=3.0)
+    filters.add_argument("--repeat", type=int, default=5)
+    filters.set_defaults(func=bench_filters)
+
+    startup = subparsers.add_parser("startup", help="Cold import cost per heavy module and GUI time-to-window")
+    startup.add_argument("--repeat", type=int, default=3)
+    startup.add_argument("--camera", action="store_true", help="Also connect and wait for the first frame")
+    startup.add_argument("--timeout", type=float, default=30.0)
+    startup.add_argument("--offscreen", action="store_true", help="Use Qt's offscreen platform (no display)")
+    startup.set_defaults(func=bench_startup)
+
+    pipeline = subparsers.add_parser("pipeline", help="Full pipelines headless on synthetic or replayed frames, saved to JSON")
+    pipeline.add_argument("--pipelines", type=str, nargs="+", choices=PIPELINES, default=list(PIPELINES))
+    pipeline.add_argument("--resolutions", type=str, nargs="+", choices=list(RESOLUTIONS),
+                          default=["VGA", "HD720", "HD1080", "HD2K"])
+    pipeline.add_argument("--frames", type=int, default=120, help="Frames grabbed per run")
+    pipeline.add_argument("--capture", type=str, default=None, help="Replay this .zcap instead of synthetic frames")
+    pipeline.add_argument("--paced", action="store_true", help="Deliver frames in real time instead of as fast as possible")
+    pipeline.add_argument("--fps", type=int, default=30, help="Synthetic frame rate (timestamps, and pacing with --paced)")
+    pipeline.add_argument("--variants", type=int, default=2,
+                          help="Synthetic scenes cycled through; 1 is a still scene (default: 2, a moving box)")
+    pipeline.add_argument("--static_scene", action="store_true", help="Turn on static-scene gating in the GUI pipeline")
+    pipeline.add_argument("--planes", type=str, choices=["off", "mark", "remove"], default="off",
+                          help="Plane segmentation mode in the GUI pipeline")
+    pipeline.add_argument("--seed", type=int, default=0)
+    pipeline.add_argument("--output", type=str, default=None,
+                          help="Result file (default: benchmarks/pipeline-<time>-<commit>.json)")
+    pipeline.add_argument("--baseline", type=str, default=None, help="Compare with this earlier result file")
+    pipeline.add_argument("--threshold", type=float, default=10.0, help="Percent change reported by the comparison")
+    pipeline.add_argument("--case", type=str, choices=PIPELINES, default=None, help=argparse.SUPPRESS)
+    pipeline.set_defaults(func=bench_pipeline)
+
+    compare = subparsers.add_parser("compare", help="Compare two pipeline result files; exit status 1 on regressions")
+    compare.add_argument("baseline", type=str)
+    compare.add_argument("current", type=str)
+    compare.add_argument("--threshold", type=float, default=10.0)
+    compare.set_defaults(func=bench_compare)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    args.func(args)
@@ -0,0 +1,114 @@
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+LARGE_ALLOCATION = 1 << 20
+
+
+def pooled_empty(pool, name, shape, dtype):
+    """pool.get(...) when a pool is given, otherwise a fresh np.empty."""
+    if pool is None:
+        return np.empty(shape, dtype=dtype)
+    return pool.get(name, shape, dtype)
+
+
+class BufferPool:
+    """Reusable arrays for hot loops, keyed by buffer name and dtype.
+
+    get() returns a view of the requested shape into a backing array that only
+    grows, so sizes that change every frame (e.g. the number of valid points)
+    stop allocating once the largest size has been seen. A returned array is
+    valid until the next get() with the same name; a pool belongs to a single
+    stage thread.
+    """
+
+    def __init__(self, growth=1.25):
+        self.growth = growth
+        self._backing = {}
+        self._arange = np.arange(0, dtype=np.int64)
+        self.allocations = 0
+        self.requests = 0
+
+    def get(self, name, shape, dtype=np.float32):
+        dtype = np.dtype(dtype)
+        shape = tuple(shape) if np.ndim(shape) else (int(shape),)
+        size = int(np.prod(shape, dtype=np.int64))
+        key = (name, dtype)
+        self.requests += 1
+
+        backing = self._backing.get(key)
+        if backing is None or backing.size < size:
+            capacity = size if backing is None else max(size, int(backing.size * self.growth))
+            backing = self._backing[key] = np.empty(capacity, dtype=dtype)
+            self.allocations += 1
+        return backing[:size].reshape(shape)
+
+    def arange(self, size):
+        """0..size-1 as int64 without building a new array every call."""
+        if len(self._arange) < size:
+            self._arange = np.arange(max(size, int(len(self._arange) * self.growth)), dtype=np.int64)
+            self.allocations += 1
+        return self._arange[:size]
+
+    @property
+    def nbytes(self):
+        return sum(backing.nbytes for backing in self._backing.values()) + self._arange.nbytes
+
+    def stats(self):
+        return {
+            "buffers": len(self._backing),
+            "megabytes": self.nbytes / 1e6,
+            "allocations": self.allocations,
+            "requests": self.requests,
+        }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class AllocationMonitor:
+    """Per-frame transient allocation tracking with tracemalloc (NumPy reports its buffers to it).
+
+    For each frame it records how far traced memory rose above the level at
+    frame start; a frame whose rise stays under `large_threshold` made no
+    large allocation. Tracing is costly, so this is meant for benchmarks.
+    """
+
+    def __init__(self, large_threshold=LARGE_ALLOCATION):
+        self.large_threshold = large_threshold
+        self.frame_peaks = []
+        self.frame_times = []
+
+    def __enter__(self):
+        tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        tracemalloc.stop()
+
+    @contextmanager
+    def frame(self):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        self.frame_times.append(time.perf_counter() - start)
+        self.frame_peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+
+    def large_frames(self, skip=0):
+        """Number of frames (after the first `skip` warm-up frames) with a large allocation."""
+        return sum(peak >= self.large_threshold for peak in self.frame_peaks[skip:])
+
+    def summary(self, skip=1):
+        peaks = self.frame_peaks[skip:] or [0]
+        return {
+            "frames": len(self.frame_peaks),
+            "large_allocation_frames": self.large_frames(skip),
+            "max_transient_mb": max(peaks) / 1e6,
+            "peak_rss_mb": peak_rss_mb(),
+        }
@@ -1,4 +1,3 @@
-import pyzed.sl as sl
 import os
 import cv2
 
@@ -6,23 +5,14 @@ from datetime import datetime
 import time
 import numpy as np
 
-def get_zed_resolution(resolution_str):
-    resolution_map = {
-        "HD2K": sl.RESOLUTION.HD2K,
-        "HD1080": sl.RESOLUTION.HD1080,
-        "HD720": sl.RESOLUTION.HD720,
-        "VGA": sl.RESOLUTION.VGA
-    }
-    return resolution_map.get(resolution_str, sl.RESOLUTION.HD2K)
+from capture_file import CaptureWriter
+from depth_codec import DepthRecordingWriter
+from frame_source import RESOLUTIONS, ZEDFrameSource
+from instrumentation import JsonLinesLog, Profiler, format_summary
+from recorder import ImageSequenceWriter, Recorder, SequentialNamer, VideoFileWriter
 
 def get_resolution_dimensions(resolution_str):
-    resolution_dimensions = {
-        "HD2K": (2208, 1242),
-        "HD1080": (1920, 1080),
-        "HD720": (1280, 720),
-        "VGA": (672, 376)
-    }
-    return resolution_dimensions[resolution_str]
+    return RESOLUTIONS[resolution_str]
 
 class Camera:
     current_date = datetime.now()
@@ -32,75 +22,168 @@ class Camera:
 
     record_start_time = time.time()
 
-    def __init__(self,args):
+    def __init__(self,args,source=None):
+        # frame_source.FrameSource; None açılışta ZED kamerayı kullanır
+        self.source = source
         self.fps = args.frame_rate
         self.resolution = args.video_resolution
         self.saveVideo = args.video_save
         self.saveFrame = args.frame_save
+        self.saveRaw = args.raw_save
         self.saveTime = args.save_time
         self.frameTime = args.frame_time
         self.show = args.show
-        self.videoSize = get_resolution_dimensions(self.resolution)
+        self.queueSize = args.queue_size
+        self.dropWhenFull = args.drop_when_full
+        self.imageFormat = args.image_format
+        self.pngCompression = args.png_compression
+        self.jpegQuality = args.jpeg_quality
+        self.depthCodec = args.depth_codec
+        self.keyframeInterval = args.keyframe_interval
+        # Çözünürlük bilgisi olmayan kaynaklarda (ör. eski kayıtlar) boyut kaynak açılınca alınır
+        self.videoSize = get_resolution_dimensions(self.resolution) if self.resolution else None
+        # Kapalıyken her ölçüm noktası boş bir işlem, kayıt döngüsü yavaşlamaz
+        self.profiler = Profiler(enabled=args.profile or bool(args.profile_log))
+        self.profileLog = JsonLinesLog(args.profile_log) if args.profile_log else None
 
         self.folderCreate()
         self.cameraRead()
         self.videoSave()
         
     def cameraRead(self):
-        self.zed = sl.Camera()
-        init_params = sl.InitParameters()
-        init_params.camera_resolution = get_zed_resolution(self.resolution)
-        init_params.camera_fps = self.fps
-
-        err = self.zed.open(init_params)
-        if err != sl.ERROR_CODE.SUCCESS:
+        if self.source is None:
+            self.source = ZEDFrameSource(self.resolution, self.fps)
+        try:
+            self.source.open()
+        except RuntimeError as err:
             print(f"Kamerayı başlatma hatası: {err}")
             exit(-1)
+        if self.videoSize is None:
+            self.videoSize = self.source.size
         
-    def videoSave(self):
+    def recorderCreate(self):
+        folder = f"images/{self.day}-{self.month}-{self.year}"
+        options = dict(queue_size=self.queueSize, drop_when_full=self.dropWhenFull)
+        self.recorder = Recorder()
+
         if self.saveVideo:
-            path = f"images/{self.day}-{self.month}-{self.year}/video/leftCamera_{int(len(os.listdir(f'images/{self.day}-{self.month}-{self.year}/video'))/2)}.avi"
-            leftCap = cv2.VideoWriter(path,
-                cv2.VideoWriter_fourcc(*'XVID'),30,self.videoSize)
-            path = f"images/{self.day}-{self.month}-{self.year}/video/rightCamera_{int(len(os.listdir(f'images/{self.day}-{self.month}-{self.year}/video'))/2)}.avi"
-            rightCap = cv2.VideoWriter(path,
-                cv2.VideoWriter_fourcc(*'XVID'),30,self.videoSize)
-        
-        left_image = sl.Mat()
-        right_image = sl.Mat()
+            left_path = SequentialNamer(f"{folder}/video", "leftCamera", ".avi").next_path()
+            right_path = SequentialNamer(f"{folder}/video", "rightCamera", ".avi").next_path()
+            self.recorder.add("leftVideo", VideoFileWriter(left_path, self.fps, self.videoSize, **options))
+            self.recorder.add("rightVideo", VideoFileWriter(right_path, self.fps, self.videoSize, **options))
+
+        if self.saveFrame:
+            image_options = dict(
+                extension=f".{self.imageFormat}",
+                png_compression=self.pngCompression,
+                jpeg_quality=self.jpegQuality,
+                **options,
+            )
+            self.recorder.add("leftFrames", ImageSequenceWriter(f"{folder}/left", "Left", **image_options))
+            self.recorder.add("rightFrames", ImageSequenceWriter(f"{folder}/right", "Right", **image_options))
+
+        if self.saveRaw:
+            raw_path = SequentialNamer(f"{folder}/raw", "capture", ".zcap").next_path()
+            metadata = {"fps": self.fps, "resolution": self.resolution, "depth_unit": self.source.depth_unit}
+            # Sıkıştırılmış derinlik aynı adla ayrı bir .zdepth dosyasına yazılır
+            fields = ("left", "right", "depth") if self.depthCodec == "raw" else ("left", "right")
+            self.recorder.add("raw", CaptureWriter(
+                raw_path, *self.videoSize, fields=fields,
+                queue_size=max(1, self.queueSize // 8),
+                drop_when_full=self.dropWhenFull,
+                metadata=metadata,
+            ))
+            if self.depthCodec != "raw":
+                # Kodek milimetre saklar: scale, kaynağın derinlik biriminden milimetreye çarpan
+                depth_scale = 1.0 if self.source.depth_unit == "MILLIMETER" else 1000.0
+                self.recorder.add("depth", DepthRecordingWriter(
+                    os.path.splitext(raw_path)[0] + ".zdepth", compressor=self.depthCodec,
+                    keyframe_interval=self.keyframeInterval, scale=depth_scale, metadata=metadata, **options,
+                ))
+
+    def videoSave(self):
+        self.recorderCreate()
+
+        source = self.source
+        left_image = source.new_mat()
+        right_image = source.new_mat()
+        depth = source.new_mat()
         self.startTime = time.time()
+        profiler = self.profiler
+        lastProfileTime = time.monotonic()
+        frameId = 0
 
         while True:
-            if self.zed.grab() == sl.ERROR_CODE.SUCCESS:
-                self.zed.retrieve_image(left_image, sl.VIEW.LEFT)
-                self.zed.retrieve_image(right_image, sl.VIEW.RIGHT)
+            try:
+                with profiler.span("grab"):
+                    status = source.grab(depth=self.saveRaw)
+            except EOFError:
+                print("Kaynakta kare kalmadı, kayıt durduruluyor....")
+                break
+            if status:
+                frameId += 1
+                with profiler.span("retrieve.images"):
+                    source.retrieve_image(left_image, "left")
+                    source.retrieve_image(right_image, "right")
                 left_frame = left_image.get_data()
                 right_frame = right_image.get_data()
 
                 if self.saveFrame:
                     currentTime = time.time()
-                    self.frameSave(left_frame,right_frame,currentTime)
+                    with profiler.span("submit.frames"):
+                        self.frameSave(left_frame,right_frame,currentTime)
+
+                if self.saveRaw:
+                    with profiler.span("retrieve.depth"):
+                        source.retrieve_depth(depth)
+                    timestamp = source.timestamp()
+                    with profiler.span("submit.raw"):
+                        if self.depthCodec == "raw":
+                            self.recorder.writers["raw"].append(
+                                timestamp, left=left_frame, right=right_frame, depth=depth.get_data()
+                            )
+                        else:
+                            self.recorder.writers["raw"].append(timestamp, left=left_frame, right=right_frame)
+                            self.recorder.writers["depth"].append(timestamp, depth.get_data())
 
                 if self.saveVideo:
-                    leftCap.write(left_frame[:, :, :3])
-                    rightCap.write(right_frame[:, :, :3])
+                    # Kodlama ve disk yazımı arka plan iş parçacıklarında yapılır
+                    with profiler.span("submit.video"):
+                        self.recorder.submit("leftVideo", left_frame[:, :, :3])
+                        self.recorder.submit("rightVideo", right_frame[:, :, :3])
+
+                if self.profileLog is not None and time.monotonic() - lastProfileTime >= 1.0:
+                    self.profileLog.log({"time": time.time(), "frame_id": frameId, "spans": profiler.snapshot()})
+                    lastProfileTime = time.monotonic()
 
+                if self.saveVideo or self.saveRaw:
                     if self.record_start_time and (time.time() - self.record_start_time >= self.saveTime):
                         print(f"{self.saveTime} saniye doldu, kayıt durduruluyor....")
                         break
             
                 if self.show:
-                    mergeImage = np.hstack((left_frame,right_frame))
-                    cv2.imshow("image",cv2.resize(mergeImage,(1920,1080)))
+                    with profiler.span("show"):
+                        mergeImage = np.hstack((left_frame,right_frame))
+                        cv2.imshow("image",cv2.resize(mergeImage,(1920,1080)))
+                        key = cv2.waitKey(1)
 
-                    if cv2.waitKey(1) == ord("q"):
+                    if key == ord("q"):
                         break
-        cv2.destroyAllWindows()
+        if self.show:
+            cv2.destroyAllWindows()
+        source.close()
+        self.recorder.close()
+        if profiler.enabled:
+            print("aşama (ms)            p50     p95     p99     max")
+            for line in format_summary(profiler.snapshot()):
+                print(line)
+        if self.profileLog is not None:
+            self.profileLog.close()
 
     def frameSave(self,leftImage,rightImage,currentTime):
         if (currentTime - self.startTime) > self.frameTime:
-            cv2.imwrite(f"images/{self.day}-{self.month}-{self.year}/left/Left_{len(os.listdir(f'images/{self.day}-{self.month}-{self.year}/left'))}.png",leftImage)
-            cv2.imwrite(f"images/{self.day}-{self.month}-{self.year}/right/Right_{len(os.listdir(f'images/{self.day}-{self.month}-{self.year}/right'))}.png",rightImage)
+            self.recorder.submit("leftFrames", leftImage)
+            self.recorder.submit("rightFrames", rightImage)
             self.startTime = currentTime
             
     def folderCreate(self):
@@ -111,6 +194,8 @@ class Camera:
             os.mkdir(f"images/{self.day}-{self.month}-{self.year}/left")
             os.mkdir(f"images/{self.day}-{self.month}-{self.year}/right")
             os.mkdir(f"images/{self.day}-{self.month}-{self.year}/video")
+        if not(os.path.exists(f"images/{self.day}-{self.month}-{self.year}/raw")):
+            os.mkdir(f"images/{self.day}-{self.month}-{self.year}/raw")
 
         
         
@@ -0,0 +1,276 @@
+"""Append-only raw capture container for lossless stereo + depth recording.
+
+Layout:
+    [magic][uint32 header length][JSON header] ... padding to DATA_ALIGNMENT
+    [record 0][record 1] ...                      fixed-size records
+    [int64 timestamps * frame_count]              index
+    [trailer: magic, index offset, frame count]
+
+Every record is one numpy structured value (timestamp, frame id, left,
+right, depth), so the reader can memory-map the data section and return
+frame N as zero-copy views. If the trailer is missing (the recording was
+interrupted) the frame count is recovered from the file size.
+
+Depth recorded with a codec lives next to the capture in a .zdepth file
+(see depth_codec); the reader then serves it as the "depth" field.
+"""
+import argparse
+import json
+import os
+import queue
+import struct
+
+import cv2
+import numpy as np
+
+from depth_codec import DepthRecordingReader
+from recorder import AsyncWriter
+
+MAGIC = b"ZEDCAP1\0"
+INDEX_MAGIC = b"ZEDCIDX\0"
+TRAILER = struct.Struct("<8sQQ")
+DATA_ALIGNMENT = 4096
+FORMAT_VERSION = 1
+
+FIELD_SHAPES = {
+    "left": lambda width, height: ("u1", (height, width, 4)),
+    "right": lambda width, height: ("u1", (height, width, 4)),
+    "depth": lambda width, height: ("<f4", (height, width)),
+}
+
+
+def record_dtype(width, height, fields):
+    """Structured dtype of one frame record."""
+    layout = [("timestamp", "<i8"), ("frame_id", "<i8")]
+    for name in fields:
+        dtype, shape = FIELD_SHAPES[name](width, height)
+        layout.append((name, dtype, shape))
+    return np.dtype(layout)
+
+
+class _ChunkFileWriter(AsyncWriter):
+    """Writes filled chunks to disk and hands the buffers back to the free pool."""
+
+    def __init__(self, handle, free_chunks, queue_size):
+        self.handle = handle
+        self.free_chunks = free_chunks
+        super().__init__("raw-capture", queue_size)
+
+    def write(self, item):
+        chunk, count = item
+        try:
+            self.handle.write(chunk[:count].view(np.uint8).data)
+        finally:
+            # Yazma başarısız olsa da tampon havuza döner, append() beklemede kalmaz
+            self.free_chunks.put(chunk)
+
+
+class CaptureWriter:
+    """Records frames into a capture file, writing `chunk_frames` records at a time.
+
+    Frames are copied once, straight into a preallocated chunk; full chunks are
+    written by a background thread. When every chunk is busy, append either
+    blocks or drops the frame (drop_when_full).
+    """
+
+    def __init__(self, path, width, height, fields=("left", "right", "depth"),
+                 chunk_frames=8, queue_size=4, drop_when_full=False, metadata=None):
+        self.path = path
+        self.fields = tuple(fields)
+        self.dtype = record_dtype(width, height, self.fields)
+        self.drop_when_full = drop_when_full
+        self.timestamps = []
+        self.dropped = 0
+
+        header = {
+            "version": FORMAT_VERSION,
+            "width": width,
+            "height": height,
+            "fields": list(self.fields),
+            "record_size": self.dtype.itemsize,
+            "metadata": metadata or {},
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        prefix = len(MAGIC) + 4 + len(header_bytes)
+        self.data_offset = -(-prefix // DATA_ALIGNMENT) * DATA_ALIGNMENT
+
+        self._handle = open(path, "wb")
+        self._handle.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        self._handle.write(b"\0" * (self.data_offset - prefix))
+
+        self._free_chunks = queue.Queue()
+        for _ in range(queue_size + 1):
+            self._free_chunks.put(np.empty(chunk_frames, dtype=self.dtype))
+        self._writer = _ChunkFileWriter(self._handle, self._free_chunks, queue_size + 1)
+        self._chunk = self._free_chunks.get()
+        self._filled = 0
+
+    def append(self, timestamp, **frames):
+        """Copy one frame (left=..., right=..., depth=... arrays) into the capture."""
+        if self._chunk is None:
+            try:
+                self._chunk = self._free_chunks.get(block=not self.drop_when_full)
+            except queue.Empty:
+                self.dropped += 1
+                return False
+
+        record = self._chunk[self._filled]
+        record["timestamp"] = timestamp
+        record["frame_id"] = len(self.timestamps)
+        for name in self.fields:
+            np.copyto(record[name], frames[name])
+        self.timestamps.append(timestamp)
+        self._filled += 1
+
+        if self._filled == len(self._chunk):
+            self._flush_chunk()
+        return True
+
+    def _flush_chunk(self):
+        self._writer.submit((self._chunk, self._filled), copy=False)
+        self._chunk = None
+        self._filled = 0
+
+    def close(self):
+        if self._chunk is not None and self._filled:
+            self._flush_chunk()
+        self._writer.close()
+
+        index = np.asarray(self.timestamps, dtype="<i8")
+        index_offset = self._handle.tell()
+        self._handle.write(index.tobytes())
+        self._handle.write(TRAILER.pack(INDEX_MAGIC, index_offset, len(index)))
+        self._handle.close()
+
+    def stats(self):
+        return {
+            "written": len(self.timestamps),
+            "dropped": self.dropped,
+            "errors": self._writer.errors,
+            "high_water": self._writer.high_water,
+        }
+
+
+class CaptureReader:
+    """Memory-mapped random access to the frames of a capture file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as handle:
+            if handle.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a ZED capture file")
+            (header_length,) = struct.unpack("<I", handle.read(4))
+            self.header = json.loads(handle.read(header_length).decode("utf-8"))
+            prefix = len(MAGIC) + 4 + header_length
+            self.data_offset = -(-prefix // DATA_ALIGNMENT) * DATA_ALIGNMENT
+
+            self.width = self.header["width"]
+            self.height = self.header["height"]
+            self.fields = tuple(self.header["fields"])
+            self.dtype = record_dtype(self.width, self.height, self.fields)
+
+            file_size = os.fstat(handle.fileno()).st_size
+            frame_count = None
+            if file_size >= self.data_offset + TRAILER.size:
+                handle.seek(file_size - TRAILER.size)
+                magic, index_offset, count = TRAILER.unpack(handle.read(TRAILER.size))
+                if magic == INDEX_MAGIC:
+                    frame_count = count
+            if frame_count is None:
+                # Interrupted recording: keep every complete record.
+                frame_count = (file_size - self.data_offset) // self.dtype.itemsize
+
+        self.records = np.memmap(
+            path, dtype=self.dtype, mode="r", offset=self.data_offset, shape=(frame_count,)
+        ) if frame_count else np.empty(0, dtype=self.dtype)
+        self.timestamps = self.records["timestamp"]
+
+        depth_path = os.path.splitext(path)[0] + ".zdepth"
+        self.depth = None
+        if "depth" not in self.fields and os.path.exists(depth_path):
+            self.depth = DepthRecordingReader(depth_path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        """Frame `index` as a dict of zero-copy views (plus timestamp / frame_id)."""
+        record = self.records[index]
+        frame = {name: record[name] for name in self.fields}
+        frame["timestamp"] = int(record["timestamp"])
+        frame["frame_id"] = int(record["frame_id"])
+        if self.depth is not None:
+            # Matched by timestamp: either writer may have dropped frames the other kept
+            position = int(np.searchsorted(self.depth.timestamps, frame["timestamp"]))
+            if position < len(self.depth) and self.depth.timestamps[position] == frame["timestamp"]:
+                frame["depth"] = self.depth[position]
+        return frame
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def find(self, timestamp):
+        """Index of the first frame captured at or after `timestamp`."""
+        return int(np.searchsorted(self.timestamps, timestamp))
+
+    def close(self):
+        # The mapping is released once no view into it is referenced any more.
+        self.records = self.records[:0]
+        self.timestamps = self.timestamps[:0]
+        if self.depth is not None:
+            self.depth.close()
+
+
+def convert_capture(path, output_dir, fps=None, video=True, images=False):
+    """Export a capture back to AVI files and/or PNG images for sharing.
+
+    fps defaults to the rate recorded in the capture header (30 if missing).
+    """
+    reader = CaptureReader(path)
+    if fps is None:
+        fps = reader.header.get("metadata", {}).get("fps") or 30
+    os.makedirs(output_dir, exist_ok=True)
+    size = (reader.width, reader.height)
+    videos = {}
+    if video:
+        for name in ("left", "right"):
+            if name in reader.fields:
+                videos[name] = cv2.VideoWriter(
+                    os.path.join(output_dir, f"{name}Camera.avi"),
+                    cv2.VideoWriter_fourcc(*"XVID"), fps, size,
+                )
+
+    for index, frame in enumerate(reader):
+        for name, capture in videos.items():
+            capture.write(np.ascontiguousarray(frame[name][:, :, :3]))
+        if images:
+            for name in ("left", "right"):
+                if name in reader.fields:
+                    cv2.imwrite(os.path.join(output_dir, f"{name.capitalize()}_{index}.png"), frame[name])
+            if "depth" in frame:
+                # 16-bit PNG in the recorded depth unit, invalid pixels stored as 0.
+                depth = np.nan_to_num(frame["depth"], nan=0.0, posinf=0.0, neginf=0.0)
+                depth = np.clip(depth, 0, 65535).astype(np.uint16)
+                cv2.imwrite(os.path.join(output_dir, f"Depth_{index}.png"), depth)
+
+    for capture in videos.values():
+        capture.release()
+    print(f"{len(reader)} kare dönüştürüldü: {output_dir}")
+    reader.close()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Raw capture dosyasını AVI/PNG biçimine dönüştür")
+    parser.add_argument("capture", type=str, help="Dönüştürülecek .zcap dosyası")
+    parser.add_argument("output_dir", type=str, help="Çıktı klasörü")
+    parser.add_argument("--fps", type=int, default=None,
+                        help="AVI çıktısının FPS değeri. (Varsayılan: kayıttaki FPS, yoksa 30)")
+    parser.add_argument("--no_video", action="store_true", help="AVI dosyalarını oluşturma")
+    parser.add_argument("--images", action="store_true", help="Her kareyi PNG olarak da kaydet")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    convert_capture(args.capture, args.output_dir, fps=args.fps, video=not args.no_video, images=args.images)
@@ -0,0 +1,247 @@
+"""Static-scene gating: recompute only the parts of a frame that changed.
+
+A strided sample of the frame (about 96x54 points) is compared with the
+sample kept from the last recompute, cell by cell over a grid on the image.
+A depth sample changed when it moved by more than `threshold` relative to
+the reference or turned valid / invalid; a luma sample when it moved by
+more than `luma_threshold` levels. A cell changed when more than
+`cell_fraction` of its samples inside the region of interest did, so
+flickering holes and sensor noise do not count.
+
+check() decides per frame:
+
+- "full": no reference yet, a forced refresh (`refresh_every` frames since
+  the last full one, or the caller's settings changed), or more than
+  `partial_limit` of the cells changed;
+- "partial": recompute the returned cells only;
+- "unchanged": reuse the cached result.
+
+The reference is updated for exactly the cells the caller is told to
+recompute, so slow drift still adds up until it crosses the threshold.
+"""
+import threading
+
+import numpy as np
+
+from point_cloud import COLOR_CHANNELS
+
+FULL = "full"
+PARTIAL = "partial"
+UNCHANGED = "unchanged"
+
+# Strided sample size (columns, rows) compared per frame
+SAMPLE_SIZE = (96, 54)
+
+
+def sample_luma(color):
+    """Approximate luma (R + 2G + B) / 4 of a sampled BGR(A) image or packed XYZRGBA cloud."""
+    if color.dtype == np.float32:
+        rgba = np.ascontiguousarray(color[..., 3]).view(np.uint8).reshape(color.shape[:2] + (4,))
+        r, g, b = (rgba[..., COLOR_CHANNELS[name]] for name in "rgb")
+    else:
+        b, g, r = color[..., 0], color[..., 1], color[..., 2]
+    return (r.astype(np.float32) + 2 * g.astype(np.float32) + b.astype(np.float32)) * 0.25
+
+
+class ChangeDetector:
+    """Per-cell change test against the last recomputed frame, plus skip / saved-time counters.
+
+    roi is (left, top, right, bottom) in 0-1 image fractions; changes outside
+    it never trigger a recompute (those cells refresh with the forced refresh).
+    Settings are plain attributes the GUI may change at any time; the stage
+    thread picks them up with its next frame.
+    """
+
+    def __init__(self, enabled=False, threshold=0.03, luma_threshold=12.0, grid=(4, 4), roi=None,
+                 cell_fraction=0.02, partial_limit=0.5, refresh_every=30):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.luma_threshold = luma_threshold
+        self.grid = tuple(grid)
+        self.roi = roi
+        self.cell_fraction = cell_fraction
+        self.partial_limit = partial_limit
+        self.refresh_every = refresh_every
+        self.counts = {FULL: 0, PARTIAL: 0, UNCHANGED: 0}
+        self.forced = 0
+        self.cells_recomputed = 0
+        self.saved_ms = 0.0
+        self.full_ms = None
+        self._window = {"frames": 0, UNCHANGED: 0, "saved_ms": 0.0}
+        self.recent = {}
+        self._lock = threading.Lock()
+        # Only the stage thread touches the reference; reset() just drops the layout
+        self._layout = None
+        self._reference = None
+        self._reference_luma = None
+        self._since_full = 0
+
+    def reset(self):
+        """Forget the reference; the next frame is computed in full."""
+        self._layout = None
+
+    def set_roi(self, roi):
+        self.roi = roi
+        self._layout = None
+
+    def _build_layout(self, shape):
+        height, width = shape
+        step_y = max(1, height // SAMPLE_SIZE[1])
+        step_x = max(1, width // SAMPLE_SIZE[0])
+        rows = np.arange(0, height, step_y)
+        cols = np.arange(0, width, step_x)
+        grid_rows, grid_cols = self.grid
+        cells = (rows * grid_rows // height)[:, None] * grid_cols + (cols * grid_cols // width)[None, :]
+        inside = np.ones(cells.shape, bool)
+        if self.roi is not None:
+            left, top, right, bottom = self.roi
+            inside &= ((rows >= top * height) & (rows < bottom * height))[:, None]
+            inside &= ((cols >= left * width) & (cols < right * width))[None, :]
+        cell_count = grid_rows * grid_cols
+        self._layout = {
+            "shape": shape,
+            "grid": self.grid,
+            "steps": (step_y, step_x),
+            "cells": cells,
+            "inside": inside,
+            "samples": np.bincount(cells[inside], minlength=cell_count),
+        }
+        self._reference = None
+        return self._layout
+
+    def cell_slices(self, cell, height, width):
+        """(rows, cols) slices of the full-resolution frame covered by grid cell `cell`."""
+        grid_rows, grid_cols = self.grid
+        row, col = divmod(int(cell), grid_cols)
+        return (slice(row * height // grid_rows, (row + 1) * height // grid_rows),
+                slice(col * width // grid_cols, (col + 1) * width // grid_cols))
+
+    def check(self, depth, color=None, force=False):
+        """(mode, cells to recompute) for this frame; depth and color are full-resolution (views are fine)."""
+        layout = self._layout
+        if layout is None or layout["shape"] != depth.shape[:2] or layout["grid"] != self.grid:
+            layout = self._build_layout(depth.shape[:2])
+        step_y, step_x = layout["steps"]
+        sample = depth[::step_y, ::step_x]
+        luma = None if color is None else sample_luma(color[::step_y, ::step_x])
+        cell_count = len(layout["samples"])
+        all_cells = np.arange(cell_count)
+
+        self._since_full += 1
+        forced = self._reference is None or force or (self.refresh_every and self._since_full >= self.refresh_every)
+        if forced:
+            self.forced += 1
+            return self._recompute(layout, FULL, all_cells, sample, luma)
+
+        reference = self._reference
+        finite = np.isfinite(sample)
+        was_finite = np.isfinite(reference)
+        with np.errstate(invalid="ignore"):
+            changed = np.abs(sample - reference) > self.threshold * np.abs(reference)
+        changed &= finite & was_finite
+        changed |= finite != was_finite
+        if luma is not None and self._reference_luma is not None:
+            changed |= np.abs(luma - self._reference_luma) > self.luma_threshold
+        changed &= layout["inside"]
+        changed_count = np.bincount(layout["cells"][changed], minlength=cell_count)
+        dirty = np.flatnonzero(changed_count > self.cell_fraction * np.maximum(layout["samples"], 1))
+
+        if len(dirty) == 0:
+            return self._recompute(layout, UNCHANGED, dirty, sample, luma)
+        if len(dirty) > self.partial_limit * cell_count:
+            return self._recompute(layout, FULL, all_cells, sample, luma)
+        return self._recompute(layout, PARTIAL, dirty, sample, luma)
+
+    def _recompute(self, layout, mode, cells, sample, luma):
+        self.counts[mode] += 1
+        self.cells_recomputed += len(cells)
+        if mode == FULL:
+            self._since_full = 0
+            self._reference = sample.copy()
+            self._reference_luma = None if luma is None else luma.copy()
+        elif mode == PARTIAL:
+            # Only the recomputed cells take the new values
+            update = np.isin(layout["cells"], cells)
+            self._reference[update] = sample[update]
+            if luma is not None and self._reference_luma is not None:
+                self._reference_luma[update] = luma[update]
+        return mode, cells
+
+    def record(self, mode, ms):
+        """Stage time of a gated frame; full frames set the cost the savings are measured against."""
+        with self._lock:
+            self._window["frames"] += 1
+            if mode == FULL:
+                self.full_ms = ms if self.full_ms is None else 0.8 * self.full_ms + 0.2 * ms
+                return
+            if mode == UNCHANGED:
+                self._window[UNCHANGED] += 1
+            if self.full_ms is not None:
+                saved = max(0.0, self.full_ms - ms)
+                self.saved_ms += saved
+                self._window["saved_ms"] += saved
+
+    def next_window(self, seconds):
+        """Skip rate and saved ms per second since the previous call (stats thread, once per window)."""
+        with self._lock:
+            window, self._window = self._window, {"frames": 0, UNCHANGED: 0, "saved_ms": 0.0}
+        self.recent = {
+            "skip_rate": window[UNCHANGED] / window["frames"] if window["frames"] else 0.0,
+            "saved_ms_per_s": window["saved_ms"] / seconds if seconds > 0 else 0.0,
+        }
+        return self.recent
+
+    def stats(self):
+        frames = sum(self.counts.values())
+        stats = {
+            "enabled": self.enabled,
+            "frames": frames,
+            "unchanged": self.counts[UNCHANGED],
+            "partial": self.counts[PARTIAL],
+            "full": self.counts[FULL],
+            "forced": self.forced,
+            "skip_rate": self.counts[UNCHANGED] / frames if frames else 0.0,
+            "cells_recomputed": self.cells_recomputed,
+            "saved_ms": self.saved_ms,
+            "full_ms": self.full_ms,
+        }
+        stats.update(self.recent)
+        return stats
+
+
+class RegionCache:
+    """Per-cell arrays of the last recompute, joined into one set for the consumer.
+
+    `key` holds the settings the cells were computed with; matches() is
+    False once they change, and reset(key) starts over.
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self.key = None
+        self.info = None
+        self.joined = None
+
+    def matches(self, key):
+        return self.key == key and bool(self.cells)
+
+    def reset(self, key=None):
+        self.cells = {}
+        self.key = key
+        self.joined = None
+
+    def put(self, cell, *arrays):
+        # Stage outputs are pool views overwritten by the next call: keep copies
+        self.cells[int(cell)] = tuple(np.array(array, copy=True) for array in arrays)
+
+    def join(self, pool, name):
+        """Concatenation of every cell's arrays, in pool buffers `name.0`, `name.1`, ..."""
+        parts = [self.cells[cell] for cell in sorted(self.cells)]
+        joined = []
+        for index in range(len(parts[0])):
+            pieces = [part[index] for part in parts]
+            total = sum(len(piece) for piece in pieces)
+            out = pool.get(f"{name}.{index}", (total,) + pieces[0].shape[1:], pieces[0].dtype)
+            np.concatenate(pieces, out=out)
+            joined.append(out)
+        return tuple(joined)
@@ -0,0 +1,214 @@
+"""Early outlier removal and cropping on the HxW XYZRGBA grid, before decode and voxelization.
+
+Every filter works on whole image arrays (slices, box filters), never per
+point, and only narrows the validity mask that decode_xyzrgba then uses,
+so a rejected point costs nothing downstream. Each is off at 0:
+
+- crop: `min_depth` / `max_depth` on Z and an axis-aligned `bounds` box
+  ([[x0, y0, z0], [x1, y1, z1]]), in the cloud's units;
+- flying pixels: a point whose depth jumps by more than `flying_threshold`
+  (a fraction of its depth) to *both* its left and right, or both its upper
+  and lower, neighbour floats between a foreground and a background edge;
+  a real edge is continuous on one side and kept;
+- radius: fewer than `min_neighbors` points of the `radius_window` x
+  `radius_window` image window within `radius` in depth. Neighbouring
+  pixels are millimeters apart sideways, so the depth difference stands in
+  for the 3D distance a KD-tree search would use;
+- statistical: the distance to the mean depth of the other valid points of
+  its `statistical_window` window (box filters), relative to depth, more
+  than `std_ratio` standard deviations above its mean over the frame.
+  Leaving the point out of its own mean keeps a lone outlier from dragging
+  its clean neighbours over the limit with it.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from point_cloud import valid_point_mask
+
+FILTERS = ("crop", "flying", "radius", "statistical")
+
+
+class CloudFilter:
+    """Narrow a cloud's validity mask; counts removed points per filter and estimates the time saved.
+
+    Settings are plain attributes the GUI may change at any time; the stage
+    thread picks them up with its next frame.
+    """
+
+    def __init__(self, enabled=False, min_depth=0.0, max_depth=0.0, bounds=None, flying_threshold=0.0,
+                 radius=0.0, radius_window=3, min_neighbors=2, statistical_window=5, std_ratio=0.0):
+        self.enabled = enabled
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.bounds = bounds
+        self.flying_threshold = flying_threshold
+        self.radius = radius
+        self.radius_window = radius_window
+        self.min_neighbors = min_neighbors
+        self.statistical_window = statistical_window
+        self.std_ratio = std_ratio
+        self.frames = 0
+        self.removed = dict.fromkeys(FILTERS, 0)
+        self.last_removed = dict.fromkeys(FILTERS, 0)
+        self.filter_ms = 0.0
+        self.last_ms = 0.0
+        # Decode + voxelize cost per surviving point, to price the removed ones
+        self.point_ms = None
+        self.saved_ms = 0.0
+        self._lock = threading.Lock()
+
+    def settings(self):
+        """Constructor arguments reproducing this filter (e.g. in a worker process)."""
+        return {
+            "enabled": self.enabled, "min_depth": self.min_depth, "max_depth": self.max_depth,
+            "bounds": self.bounds, "flying_threshold": self.flying_threshold, "radius": self.radius,
+            "radius_window": self.radius_window, "min_neighbors": self.min_neighbors,
+            "statistical_window": self.statistical_window, "std_ratio": self.std_ratio,
+        }
+
+    def mask(self, cloud, pool):
+        """HxW mask of the valid points that pass every enabled filter, in pool buffer "filter.mask"."""
+        start = time.perf_counter()
+        height, width = cloud.shape[:2]
+        mask = valid_point_mask(cloud, out=pool.get("filter.mask", (height, width), bool))
+        # Bitişik kopya: XYZRGBA içindeki Z'ye 16 baytlık adımla erişmek her işlemde yavaşlatır
+        depth = pool.get("filter.depth", (height, width), np.float32)
+        np.copyto(depth, cloud[..., 2])
+        removed = dict.fromkeys(FILTERS, 0)
+        remaining = int(np.count_nonzero(mask))
+        for name, apply in (("crop", self._crop), ("flying", self._flying),
+                            ("radius", self._radius), ("statistical", self._statistical)):
+            if apply(cloud, depth, mask, pool):
+                count = int(np.count_nonzero(mask))
+                removed[name] = remaining - count
+                remaining = count
+        self.record(removed, 1000.0 * (time.perf_counter() - start))
+        return mask
+
+    def record(self, removed, ms):
+        """Count one filtered frame: points removed per filter and the filter time.
+
+        mask() calls it for its own frames; with a process pool the parent
+        calls it with what each worker's filter reported.
+        """
+        with self._lock:
+            self.frames += 1
+            self.last_removed = removed
+            for name, count in removed.items():
+                self.removed[name] += count
+            self.last_ms = ms
+            self.filter_ms += ms
+            if self.point_ms is not None:
+                self.saved_ms += sum(removed.values()) * self.point_ms
+
+    def record_downstream(self, points, ms):
+        """Decode + voxelize time of a filtered frame with `points` surviving points."""
+        if points:
+            cost = ms / points
+            self.point_ms = cost if self.point_ms is None else 0.8 * self.point_ms + 0.2 * cost
+
+    # Each filter narrows `mask` in place and returns whether it ran
+
+    def _crop(self, cloud, depth, mask, pool):
+        if self.min_depth <= 0 and self.max_depth <= 0 and self.bounds is None:
+            return False
+        inside = pool.get("filter.inside", mask.shape, bool)
+        if self.min_depth > 0:
+            mask &= np.greater_equal(depth, self.min_depth, out=inside)
+        if self.max_depth > 0:
+            mask &= np.less_equal(depth, self.max_depth, out=inside)
+        if self.bounds is not None:
+            low, high = self.bounds
+            for axis in range(3):
+                mask &= np.greater_equal(cloud[..., axis], low[axis], out=inside)
+                mask &= np.less_equal(cloud[..., axis], high[axis], out=inside)
+        return True
+
+    def _flying(self, cloud, depth, mask, pool):
+        if self.flying_threshold <= 0:
+            return False
+        height, width = depth.shape
+        jump = pool.get("filter.jump", (height, width), np.float32)
+        np.multiply(depth, self.flying_threshold, out=jump)
+        difference = pool.get("filter.difference", (height, width), np.float32)
+        first = pool.get("filter.first", (height, width), bool)
+        second = pool.get("filter.second", (height, width), bool)
+        # NaN komşular karşılaştırmada False döner: deliğe bakan kenar noktası atılmaz
+        for center, before, after in (
+            ((slice(None), slice(1, -1)), (slice(None), slice(None, -2)), (slice(None), slice(2, None))),
+            ((slice(1, -1), slice(None)), (slice(None, -2), slice(None)), (slice(2, None), slice(None))),
+        ):
+            d, threshold = difference[center], jump[center]
+            np.abs(np.subtract(depth[center], depth[before], out=d), out=d)
+            np.greater(d, threshold, out=first[center])
+            np.abs(np.subtract(depth[center], depth[after], out=d), out=d)
+            np.greater(d, threshold, out=second[center])
+            first[center] &= second[center]
+            mask[center] &= ~first[center]
+        return True
+
+    def _radius(self, cloud, depth, mask, pool):
+        if self.radius <= 0:
+            return False
+        height, width = depth.shape
+        count = pool.get("filter.count", (height, width), np.uint8)
+        count.fill(0)
+        difference = pool.get("filter.difference", (height, width), np.float32)
+        near = pool.get("filter.near", (height, width), bool)
+        reach = self.radius_window // 2
+        # Komşuluk simetrik: her çift bir kez karşılaştırılır, iki tarafın sayacına da eklenir
+        offsets = [(dy, dx) for dy in range(0, reach + 1) for dx in range(-reach, reach + 1) if dy > 0 or dx > 0]
+        for dy, dx in offsets:
+            center = (slice(0, height - dy), slice(max(-dx, 0), width - max(dx, 0)))
+            neighbour = (slice(dy, height), slice(max(dx, 0), width - max(-dx, 0)))
+            d = difference[center]
+            np.abs(np.subtract(depth[center], depth[neighbour], out=d), out=d)
+            np.less(d, self.radius, out=near[center])
+            count[center] += near[center]
+            count[neighbour] += near[center]
+        mask &= np.greater_equal(count, self.min_neighbors, out=near)
+        return True
+
+    def _statistical(self, cloud, depth, mask, pool):
+        if self.std_ratio <= 0:
+            return False
+        shape = depth.shape
+        size = (self.statistical_window, self.statistical_window)
+        values = pool.get("filter.values", shape, np.float32)
+        values.fill(0)
+        np.copyto(values, depth, where=mask)
+        weights = pool.get("filter.weights", shape, np.float32)
+        np.copyto(weights, mask)
+        # Pencere toplamları: geçerli nokta sayısı ve derinlik toplamı
+        count, total = pool.get("filter.box0", shape, np.float32), pool.get("filter.box1", shape, np.float32)
+        cv2.boxFilter(weights, -1, size, dst=count, normalize=False, borderType=cv2.BORDER_CONSTANT)
+        cv2.boxFilter(values, -1, size, dst=total, normalize=False, borderType=cv2.BORDER_CONSTANT)
+        # Noktanın kendisi hariç ortalama; komşusuz noktada 0'a bölünmez, sonuç 1 (en uzak) sayılır
+        total -= values
+        count -= weights
+        np.maximum(count, 1, out=count)
+        total /= count
+        spread = pool.get("filter.spread", shape, np.float32)
+        np.abs(np.subtract(values, total, out=spread), out=spread)
+        np.divide(spread, values, out=spread, where=mask)
+        scores = spread[mask]
+        if len(scores) < 2:
+            return True
+        limit = scores.mean() + self.std_ratio * scores.std()
+        mask &= np.less_equal(spread, limit, out=pool.get("filter.inside", shape, bool))
+        return True
+
+    def stats(self):
+        with self._lock:
+            frames = max(self.frames, 1)
+            return {
+                "enabled": self.enabled,
+                "frames": self.frames,
+                "removed": dict(self.removed),
+                "last_removed": dict(self.last_removed),
+                "filter_ms": self.filter_ms / frames,
+                "saved_ms": self.saved_ms / frames,
+            }
@@ -0,0 +1,324 @@
+"""Lossless (after quantization) depth compression for recordings and streaming.
+
+Depth is quantized to uint16 millimeters with 0 as the "no depth" sentinel
+(NaN, +/-inf, <= 0 and anything beyond 65.534 m), then predicted:
+
+- keyframes from the row above (vertical delta), so they decode on their own;
+- other frames from the previous frame (temporal delta).
+
+Residuals wrap modulo 2**16, so decoding reproduces the quantized frame
+bit for bit. The high and low residual bytes are split into two planes
+before the stdlib entropy coder (zlib or lzma): small residuals make the
+high-byte plane almost constant, which is where most of the gain comes from.
+
+A packet is PACKET followed by the compressed planes. Depth recordings
+(.zdepth) store length-prefixed packets plus an index, and seek to the
+nearest keyframe for random access.
+"""
+import json
+import lzma
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from buffer_pool import BufferPool
+from recorder import AsyncWriter
+
+INVALID = 0
+MAX_MILLIMETERS = 65535
+
+# magic, flags, compressor, width, height
+PACKET = struct.Struct("<4sBBHH")
+PACKET_MAGIC = b"ZDC1"
+KEYFRAME = 1
+
+COMPRESSORS = {"none": 0, "zlib": 1, "lzma": 2}
+COMPRESSOR_NAMES = {number: name for name, number in COMPRESSORS.items()}
+
+FILE_MAGIC = b"ZEDDPT1\0"
+INDEX_MAGIC = b"ZEDDIDX\0"
+# Before every packet in a recording: packet length, timestamp
+RECORD = struct.Struct("<Iq")
+# Index entry per frame: file offset of the packet, timestamp, keyframe flag
+INDEX_ENTRY = np.dtype([("offset", "<u8"), ("timestamp", "<i8"), ("keyframe", "u1")])
+TRAILER = struct.Struct("<8sQQ")
+
+
+def quantize_depth(depth, scale=1000.0, out=None, scratch=None):
+    """float depth -> uint16 millimeters (scale = millimeters per depth unit), INVALID where missing."""
+    scratch = np.empty(depth.shape, np.float32) if scratch is None else scratch
+    out = np.empty(depth.shape, np.uint16) if out is None else out
+    np.multiply(depth, scale, out=scratch)
+    np.rint(scratch, out=scratch)
+    # Comparisons with NaN are False, so NaN falls out together with the range check
+    scratch[~((scratch > 0) & (scratch < MAX_MILLIMETERS))] = INVALID
+    np.copyto(out, scratch, casting="unsafe")
+    return out
+
+
+def dequantize_depth(millimeters, scale=1000.0, out=None):
+    """uint16 millimeters -> float32 depth in the units of `scale`, NaN where INVALID."""
+    out = np.empty(millimeters.shape, np.float32) if out is None else out
+    np.multiply(millimeters, np.float32(1.0 / scale), out=out)
+    out[millimeters == INVALID] = np.nan
+    return out
+
+
+def _compress(data, compressor, level):
+    if compressor == "zlib":
+        return zlib.compress(data, level)
+    if compressor == "lzma":
+        return lzma.compress(data, preset=level)
+    return bytes(data)
+
+
+def _decompress(data, compressor):
+    if compressor == "zlib":
+        return zlib.decompress(data)
+    if compressor == "lzma":
+        return lzma.decompress(data)
+    return data
+
+
+def is_keyframe(packet):
+    return bool(packet[4] & KEYFRAME)
+
+
+class DepthEncoder:
+    """Encodes successive depth frames; a keyframe every `keyframe_interval` frames (1 = intra only).
+
+    The reference for temporal prediction is the quantized frame itself,
+    which is exactly what the decoder reconstructs, so errors never build up.
+    """
+
+    def __init__(self, compressor="zlib", level=1, keyframe_interval=30, scale=1000.0, pool=None):
+        if compressor not in COMPRESSORS:
+            raise ValueError(f"Unknown compressor: {compressor}")
+        self.compressor = compressor
+        self.level = level
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.scale = scale
+        self.pool = pool or BufferPool()
+        self._reference = None
+        self._since_keyframe = 0
+        self.frames = 0
+        self.keyframes = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def force_keyframe(self):
+        self._reference = None
+
+    def encode(self, depth):
+        """Quantize and encode one float depth frame."""
+        height, width = depth.shape
+        millimeters = quantize_depth(
+            depth, self.scale,
+            out=self.pool.get("codec.mm", (height, width), np.uint16),
+            scratch=self.pool.get("codec.scaled", (height, width), np.float32),
+        )
+        return self.encode_quantized(millimeters, depth.nbytes)
+
+    def encode_quantized(self, millimeters, source_bytes=None):
+        """Encode an already quantized uint16 frame."""
+        height, width = millimeters.shape
+        keyframe = (
+            self._reference is None
+            or self._reference.shape != millimeters.shape
+            or self._since_keyframe + 1 >= self.keyframe_interval
+        )
+        residual = self.pool.get("codec.residual", (height, width), np.uint16)
+        if keyframe:
+            residual[0] = millimeters[0]
+            np.subtract(millimeters[1:], millimeters[:-1], out=residual[1:])
+            self._since_keyframe = 0
+            self.keyframes += 1
+        else:
+            np.subtract(millimeters, self._reference, out=residual)
+            self._since_keyframe += 1
+
+        planes = self.pool.get("codec.planes", (2, height * width), np.uint8)
+        residual_bytes = residual.reshape(-1).view(np.uint8)
+        np.copyto(planes[0], residual_bytes[1::2])
+        np.copyto(planes[1], residual_bytes[0::2])
+        payload = _compress(planes.data, self.compressor, self.level)
+
+        if self._reference is None or self._reference.shape != millimeters.shape:
+            self._reference = np.empty_like(millimeters)
+        np.copyto(self._reference, millimeters)
+
+        packet = PACKET.pack(PACKET_MAGIC, KEYFRAME if keyframe else 0, COMPRESSORS[self.compressor],
+                             width, height) + payload
+        self.frames += 1
+        self.bytes_in += millimeters.nbytes * 2 if source_bytes is None else source_bytes
+        self.bytes_out += len(packet)
+        return packet
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "keyframes": self.keyframes,
+            "ratio": self.bytes_in / max(self.bytes_out, 1),
+            "mb_out": self.bytes_out / 1e6,
+        }
+
+
+class DepthDecoder:
+    """Decodes packets from DepthEncoder; delta packets need the previous frame decoded first."""
+
+    def __init__(self, scale=1000.0):
+        self.scale = scale
+        self._reference = None
+
+    def decode_quantized(self, packet):
+        """Packet -> uint16 millimeters. The array is reused by the next call."""
+        magic, flags, compressor, width, height = PACKET.unpack_from(packet)
+        if magic != PACKET_MAGIC:
+            raise ValueError("Not a depth codec packet")
+        data = _decompress(memoryview(packet)[PACKET.size:], COMPRESSOR_NAMES[compressor])
+        planes = np.frombuffer(data, dtype=np.uint8).reshape(2, height * width)
+        residual = np.empty((height, width), np.uint16)
+        residual_bytes = residual.reshape(-1).view(np.uint8)
+        residual_bytes[1::2] = planes[0]
+        residual_bytes[0::2] = planes[1]
+
+        if flags & KEYFRAME:
+            # Running sum down the columns, wrapping like the encoder's subtraction
+            np.cumsum(residual, axis=0, dtype=np.uint16, out=residual)
+            self._reference = residual
+        else:
+            if self._reference is None or self._reference.shape != residual.shape:
+                raise ValueError("Delta frame without a decoded reference frame")
+            np.add(self._reference, residual, out=self._reference)
+        return self._reference
+
+    def decode(self, packet, out=None):
+        """Packet -> float32 depth (NaN where missing)."""
+        return dequantize_depth(self.decode_quantized(packet), self.scale, out)
+
+
+class DepthRecordingWriter(AsyncWriter):
+    """Records depth into a .zdepth file; quantization happens in submit, encoding on the writer thread.
+
+    The quantized uint16 copy is half the size of the float frame, so queued
+    frames also take half the memory of a plain copy.
+    """
+
+    def __init__(self, path, compressor="zlib", level=1, keyframe_interval=30, scale=1000.0,
+                 queue_size=32, drop_when_full=False, metadata=None):
+        self.path = path
+        self.encoder = DepthEncoder(compressor, level, keyframe_interval, scale)
+        self.index = []
+        header = {
+            "compressor": compressor,
+            "keyframe_interval": self.encoder.keyframe_interval,
+            "scale": scale,
+            "metadata": metadata or {},
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        self._handle = open(path, "wb")
+        self._handle.write(FILE_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        super().__init__(os.path.basename(path), queue_size, drop_when_full)
+
+    def append(self, timestamp, depth):
+        if not self.accepting():
+            self.dropped += 1
+            return False
+        return self.submit((timestamp, quantize_depth(depth, self.encoder.scale)), copy=False)
+
+    def write(self, item):
+        timestamp, millimeters = item
+        packet = self.encoder.encode_quantized(millimeters)
+        offset = self._handle.tell()
+        self._handle.write(RECORD.pack(len(packet), timestamp))
+        self._handle.write(packet)
+        self.index.append((offset, timestamp, is_keyframe(packet)))
+
+    def finish(self):
+        index = np.array(self.index, dtype=INDEX_ENTRY)
+        index_offset = self._handle.tell()
+        self._handle.write(index.tobytes())
+        self._handle.write(TRAILER.pack(INDEX_MAGIC, index_offset, len(index)))
+        self._handle.close()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(self.encoder.stats())
+        return stats
+
+
+class DepthRecordingReader:
+    """Random access to a .zdepth file: frame N is decoded from the keyframe at or before it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._handle = open(path, "rb")
+        if self._handle.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a depth recording")
+        (header_length,) = struct.unpack("<I", self._handle.read(4))
+        self.header = json.loads(self._handle.read(header_length).decode("utf-8"))
+        self.data_offset = self._handle.tell()
+        self.decoder = DepthDecoder(self.header["scale"])
+        self.index = self._read_index()
+        self.timestamps = self.index["timestamp"]
+        self._position = None
+        self._last = None
+
+    def _read_index(self):
+        file_size = os.fstat(self._handle.fileno()).st_size
+        if file_size >= self.data_offset + TRAILER.size:
+            self._handle.seek(file_size - TRAILER.size)
+            magic, index_offset, count = TRAILER.unpack(self._handle.read(TRAILER.size))
+            if magic == INDEX_MAGIC:
+                self._handle.seek(index_offset)
+                return np.frombuffer(self._handle.read(count * INDEX_ENTRY.itemsize), dtype=INDEX_ENTRY)
+        # Interrupted recording: walk the length-prefixed packets
+        entries = []
+        offset = self.data_offset
+        while offset + RECORD.size + PACKET.size <= file_size:
+            self._handle.seek(offset)
+            length, timestamp = RECORD.unpack(self._handle.read(RECORD.size))
+            if offset + RECORD.size + length > file_size:
+                break
+            entries.append((offset, timestamp, is_keyframe(self._handle.read(PACKET.size))))
+            offset += RECORD.size + length
+        return np.array(entries, dtype=INDEX_ENTRY)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _packet(self, index):
+        self._handle.seek(int(self.index[index]["offset"]))
+        length, _ = RECORD.unpack(self._handle.read(RECORD.size))
+        return self._handle.read(length)
+
+    def read_quantized(self, index):
+        """uint16 millimeters of frame `index`; sequential reads decode one packet each."""
+        if index < 0:
+            index += len(self)
+        if index == self._position:
+            return self._last
+        if self._position is None or self._position > index:
+            keyframes = np.flatnonzero(self.index["keyframe"][:index + 1])
+            if len(keyframes) == 0:
+                raise ValueError(f"No keyframe at or before frame {index}")
+            start = keyframes[-1]
+        else:
+            start = self._position + 1
+            # Jumping far ahead: restart from a later keyframe if there is one
+            keyframes = np.flatnonzero(self.index["keyframe"][start:index + 1])
+            if len(keyframes):
+                start += keyframes[-1]
+        for position in range(start, index + 1):
+            millimeters = self.decoder.decode_quantized(self._packet(position))
+        self._position = index
+        self._last = millimeters
+        return millimeters
+
+    def __getitem__(self, index):
+        return dequantize_depth(self.read_quantized(index), self.decoder.scale)
+
+    def close(self):
+        self._handle.close()
@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+
+# name -> (OpenCV colormap or None for grayscale, reverse so that near is the high end)
+COLORMAPS = {
+    "Grayscale": (None, False),
+    "Colormap": (cv2.COLORMAP_JET, True),
+    "Turbo": (cv2.COLORMAP_TURBO, True),
+    "Inferno": (cv2.COLORMAP_INFERNO, False),
+    "Viridis": (cv2.COLORMAP_VIRIDIS, False),
+    "Magma": (cv2.COLORMAP_MAGMA, False),
+    "Plasma": (cv2.COLORMAP_PLASMA, False),
+}
+
+# Table layout: 0 and 255 = invalid (NaN, +-inf), 1..254 = min..max depth
+DEPTH_LEVELS = 254
+
+
+def build_lut(colormap, invalid_color=(0, 0, 0)):
+    """256x1 RGB table for cv2.applyColorMap with invalid entries at both ends."""
+    cv_colormap, reverse = COLORMAPS[colormap]
+    ramp = np.linspace(0, 255, DEPTH_LEVELS).astype(np.uint8)
+    if reverse:
+        ramp = 255 - ramp
+    if cv_colormap is None:
+        colors = np.repeat(ramp[:, None], 3, axis=1)
+    else:
+        colors = cv2.applyColorMap(ramp[:, None], cv_colormap)[:, 0, ::-1]
+
+    lut = np.empty((256, 1, 3), dtype=np.uint8)
+    lut[0, 0] = invalid_color
+    lut[1:-1, 0] = colors
+    lut[-1, 0] = invalid_color
+    return lut
+
+
+class DepthColorizer:
+    """Maps float depth to RGB through a precomputed table over a fixed depth range.
+
+    The depth is scaled to the table index and clamped to 1..254, so finite
+    depth outside [min_depth, max_depth] takes the nearest end colour of the
+    range. Non-finite values skip the clamp and the saturating conversion
+    puts them on one of the invalid end entries, so invalid pixels need no
+    separate masking pass. The scaled, index and output buffers are reused
+    between frames.
+
+    With auto_range_interval > 0 the range follows the scene, re-estimated from
+    a subsampled frame only every `auto_range_interval` frames.
+    """
+
+    def __init__(self, min_depth, max_depth, colormap="Grayscale",
+                 invalid_color=(0, 0, 0), auto_range_interval=0):
+        self.invalid_color = invalid_color
+        self.auto_range_interval = auto_range_interval
+        self.frame_count = 0
+        self._shape = None
+        self.set_colormap(colormap)
+        self.set_range(min_depth, max_depth)
+
+    def set_colormap(self, colormap):
+        if colormap not in COLORMAPS:
+            raise ValueError(f"Unknown colormap: {colormap}")
+        self.colormap = colormap
+        self.lut = build_lut(colormap, self.invalid_color)
+
+    def set_range(self, min_depth, max_depth):
+        self.min_depth = float(min_depth)
+        self.max_depth = float(max_depth)
+        self._alpha = (DEPTH_LEVELS - 1) / (self.max_depth - self.min_depth)
+        self._beta = 1.0 - self.min_depth * self._alpha
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self._scaled = np.empty(shape, dtype=np.float32)
+        self._finite = np.empty(shape, dtype=bool)
+        self._index = np.empty(shape, dtype=np.uint8)
+        self._output = np.empty(shape + (3,), dtype=np.uint8)
+
+    def _update_range(self, depth):
+        sample = depth[::8, ::8]
+        sample = sample[np.isfinite(sample)]
+        if len(sample) > 16:
+            low, high = np.percentile(sample, (1, 99))
+            if high > low:
+                self.set_range(low, high)
+
+    def colorize(self, depth, out=None):
+        """Return an HxWx3 RGB image of `depth`, written into `out` or a reused buffer."""
+        if depth.shape != self._shape:
+            self._allocate(depth.shape)
+
+        if self.auto_range_interval and self.frame_count % self.auto_range_interval == 0:
+            self._update_range(depth)
+        self.frame_count += 1
+
+        if out is None:
+            out = self._output
+        scaled = self._scaled
+        np.multiply(depth, self._alpha, out=scaled)
+        scaled += self._beta
+        # convertScaleAbs mutlak değer alır: aralık dışı derinlik kırpılmazsa geçerli renklere geri sarar
+        np.isfinite(scaled, out=self._finite)
+        np.clip(scaled, 1, DEPTH_LEVELS, out=scaled, where=self._finite)
+        cv2.convertScaleAbs(scaled, self._index)
+        cv2.applyColorMap(self._index, self.lut, dst=out)
+        return out
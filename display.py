@@ -0,0 +1,95 @@
+import threading
+
+import cv2
+import numpy as np
+from PyQt5.QtGui import QImage
+
+INTERPOLATIONS = {
+    "Nearest": cv2.INTER_NEAREST,
+    "Linear": cv2.INTER_LINEAR,
+    "Area": cv2.INTER_AREA,
+    "Cubic": cv2.INTER_CUBIC,
+}
+
+
+def fit_size(width, height, max_width, max_height):
+    """Largest size with the aspect ratio of (width, height) that fits the target.
+
+    A zero target keeps the source size.
+    """
+    if max_width <= 0 or max_height <= 0:
+        return width, height
+    scale = min(max_width / width, max_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def resize_into(src, dst, interpolation):
+    """Resize `src` straight into the preallocated `dst` (a plain copy when sizes match)."""
+    if src.shape[:2] == dst.shape[:2]:
+        np.copyto(dst, src)
+    else:
+        cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=interpolation)
+
+
+class DisplayImage:
+    """A QImage that borrows a ring buffer; the GUI calls release() once it has painted it."""
+
+    __slots__ = ("qimage", "info", "array", "_ring", "_index")
+
+    def __init__(self, ring, index, array):
+        self._ring = ring
+        self._index = index
+        self.array = array
+        self.qimage = None
+        self.info = None
+
+    def wrap(self, image_format, info):
+        height, width = self.array.shape[:2]
+        self.qimage = QImage(self.array.data, width, height, self.array.strides[0], image_format)
+        self.info = info
+        return self
+
+    def release(self):
+        if self._ring is not None:
+            self._ring.release(self._index)
+            self._ring = None
+
+
+class ImageRing:
+    """Small set of reusable image buffers handed to the GUI thread without copying.
+
+    A buffer stays busy until the GUI releases it, so the worker never
+    overwrites pixels that are still queued for painting; when every buffer
+    is busy the frame is skipped instead. acquire() wraps the buffer in
+    `item` (DisplayImage by default), built as item(ring, index, array).
+    """
+
+    def __init__(self, size=3, item=DisplayImage):
+        self._item = item
+        self._buffers = [None] * size
+        self._busy = [False] * size
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        with self._lock:
+            for index, busy in enumerate(self._busy):
+                if not busy:
+                    self._busy[index] = True
+                    break
+            else:
+                self.skipped += 1
+                return None
+        buffer = self._buffers[index]
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self._buffers[index] = np.empty(shape, dtype=dtype)
+        return self._item(self, index, buffer)
+
+    def release(self, index):
+        with self._lock:
+            self._busy[index] = False
+
+    def reset(self):
+        """Forget images the GUI never released (e.g. after the camera was restarted)."""
+        with self._lock:
+            self._busy = [False] * len(self._busy)
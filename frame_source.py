@@ -0,0 +1,431 @@
+"""Where frames come from: a live ZED, a deterministic synthetic scene or a .zcap replay.
+
+Every processing path grabs through the same small interface, shaped after
+the parts of sl.Camera it used:
+
+    source.load()                     # slow imports (the ZED SDK), optional
+    source.open()                     # RuntimeError when the device does not open
+    while source.grab(depth=True):    # False: no new frame this time, try again
+        source.timestamp()            # ns
+        source.retrieve_image(mat, "left")
+        source.retrieve_depth(mat, size)   # float32 HxW in source.depth_unit, NaN where unknown
+        source.retrieve_cloud(mat, size)   # float32 HxWx4 XYZRGBA, like MEASURE.XYZRGBA
+    source.close()
+
+`mat` comes from source.new_mat(): an sl.Mat for the ZED, an ArrayMat
+otherwise; stages read both with get_data(). `size` is (width, height),
+None for the full resolution. A finite source (a replay without loop, a
+synthetic source with `frames`) raises EOFError from grab() when it runs out.
+
+Without pacing, synthetic and replay sources hand out frames as fast as
+they are grabbed, so a benchmark measures the pipeline and not the clock.
+
+FrameGrabber wraps a source for consumers that take pipeline Frames
+(multi_camera, the stream server): each grab is retrieved into a slot of a
+small ring and the slot returns to the ring when the Frame is released.
+"""
+import time
+
+import cv2
+import numpy as np
+
+from capture_file import CaptureReader
+from pipeline import Frame, FrameInfo, SlotRing
+from stereo_depth import StereoCalibration, xyzrgba_from_depth
+
+RESOLUTIONS = {"HD2K": (2208, 1242), "HD1080": (1920, 1080), "HD720": (1280, 720), "VGA": (672, 376)}
+VIEWS = ("left", "right")
+
+# Rough ZED intrinsics relative to the image width, for sources without a calibration
+NOMINAL_FOCAL = 0.63
+NOMINAL_BASELINE = 0.12
+
+
+def zed_sdk():
+    """pyzed.sl, imported on first use: loading the SDK takes long enough to hold up the window."""
+    import pyzed.sl as sl
+    return sl
+
+
+def nominal_calibration(width, height):
+    return StereoCalibration(NOMINAL_FOCAL * width, NOMINAL_FOCAL * width, width / 2, height / 2,
+                             NOMINAL_BASELINE, width, height)
+
+
+class ArrayMat:
+    """NumPy stand-in for sl.Mat; retrieve_* reuse its buffer while the shape stays the same."""
+
+    __slots__ = ("data",)
+
+    def __init__(self):
+        self.data = None
+
+    def get_data(self):
+        return self.data
+
+    def buffer(self, shape, dtype):
+        if self.data is None or self.data.shape != shape or self.data.dtype != dtype:
+            self.data = np.empty(shape, dtype)
+        return self.data
+
+
+def copy_into(mat, source, size=None):
+    """Copy (nearest-neighbour resized when `size` differs) into the mat's buffer, like an SDK retrieve."""
+    height, width = source.shape[:2]
+    if size is None or tuple(size) == (width, height) or 0 in size:
+        np.copyto(mat.buffer(source.shape, source.dtype), source)
+    else:
+        width, height = size
+        # Nearest: NaN / inf stay where they are instead of bleeding into neighbours
+        cv2.resize(source, (width, height), dst=mat.buffer((height, width) + source.shape[2:], source.dtype),
+                   interpolation=cv2.INTER_NEAREST)
+    return mat.data
+
+
+class FrameSource:
+    """Base class: resolution name, size (width, height) once open, and the grab / retrieve interface."""
+
+    def __init__(self, resolution="HD720", fps=30, name=None):
+        self.resolution = resolution
+        self.fps = fps
+        self.name = name or type(self).__name__
+        self.size = RESOLUTIONS.get(resolution)
+        self.depth_unit = "METER"
+        self.frame_id = 0
+
+    def load(self):
+        pass
+
+    def open(self):
+        raise NotImplementedError
+
+    def new_mat(self):
+        return ArrayMat()
+
+    def grab(self, depth=True):
+        raise NotImplementedError
+
+    def timestamp(self):
+        raise NotImplementedError
+
+    def retrieve_image(self, mat, view="left"):
+        raise NotImplementedError
+
+    def retrieve_depth(self, mat, size=None):
+        raise NotImplementedError
+
+    def retrieve_cloud(self, mat, size=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ZEDFrameSource(FrameSource):
+    """Live ZED camera. None for resolution, fps, depth_mode or units keeps the SDK default."""
+
+    def __init__(self, resolution=None, fps=None, depth_mode=None, units=None, minimum_distance=None,
+                 maximum_distance=None, serial_number=None, name=None):
+        super().__init__(resolution, fps, name or (str(serial_number) if serial_number else "zed"))
+        self.depth_mode = depth_mode
+        self.units = units
+        self.minimum_distance = minimum_distance
+        self.maximum_distance = maximum_distance
+        self.serial_number = serial_number
+        # The SDK's default coordinate unit is the millimeter
+        self.depth_unit = units or "MILLIMETER"
+        self.sl = None
+        self.zed = None
+
+    def load(self):
+        if self.sl is None:
+            self.sl = zed_sdk()
+
+    def open(self):
+        self.load()
+        sl = self.sl
+        init_params = sl.InitParameters()
+        if self.resolution is not None:
+            init_params.camera_resolution = getattr(sl.RESOLUTION, self.resolution)
+        if self.fps is not None:
+            init_params.camera_fps = self.fps
+        if self.depth_mode is not None:
+            init_params.depth_mode = getattr(sl.DEPTH_MODE, self.depth_mode)
+        if self.units is not None:
+            init_params.coordinate_units = getattr(sl.UNIT, self.units)
+        if self.minimum_distance is not None:
+            init_params.depth_minimum_distance = self.minimum_distance
+        if self.maximum_distance is not None:
+            init_params.depth_maximum_distance = self.maximum_distance
+        if self.serial_number is not None:
+            init_params.set_from_serial_number(self.serial_number)
+        self.zed = sl.Camera()
+        status = self.zed.open(init_params)
+        if status != sl.ERROR_CODE.SUCCESS:
+            raise RuntimeError("Kamera Açılmadı: " + repr(status))
+        resolution = self.zed.get_camera_information().camera_configuration.resolution
+        self.size = (resolution.width, resolution.height)
+        self.runtime_parameters = sl.RuntimeParameters()
+
+    def new_mat(self):
+        return self.sl.Mat()
+
+    def grab(self, depth=True):
+        # Derinlik istenmiyorsa SDK derinliği hiç hesaplamaz
+        self.runtime_parameters.enable_depth = depth
+        if self.zed.grab(self.runtime_parameters) != self.sl.ERROR_CODE.SUCCESS:
+            return False
+        self.frame_id += 1
+        return True
+
+    def timestamp(self):
+        return self.zed.get_timestamp(self.sl.TIME_REFERENCE.IMAGE).get_nanoseconds()
+
+    def _resolution(self, size):
+        return self.sl.Resolution(*(size or (0, 0)))
+
+    def retrieve_image(self, mat, view="left"):
+        self.zed.retrieve_image(mat, self.sl.VIEW.LEFT if view == "left" else self.sl.VIEW.RIGHT)
+        return mat.get_data()
+
+    def retrieve_depth(self, mat, size=None):
+        sl = self.sl
+        self.zed.retrieve_measure(mat, sl.MEASURE.DEPTH, sl.MEM.CPU, self._resolution(size))
+        return mat.get_data()
+
+    def retrieve_cloud(self, mat, size=None):
+        sl = self.sl
+        self.zed.retrieve_measure(mat, sl.MEASURE.XYZRGBA, sl.MEM.CPU, self._resolution(size))
+        return mat.get_data()
+
+    def close(self):
+        if self.zed is not None and self.zed.is_opened():
+            self.zed.close()
+
+
+def synthetic_scene(width, height, variant=0, hole_ratio=0.1, seed=0):
+    """Left / right BGRA images, depth (m) and XYZRGBA cloud of a textured floor with a box on it.
+
+    The box moves with `variant`; the same arguments always give the same bytes.
+    """
+    rng = np.random.default_rng(seed * 1009 + variant)
+    calibration = nominal_calibration(width, height)
+    # Eğik zemin: üst satırlar uzak, alt satırlar yakın
+    depth = np.linspace(4.5, 0.8, height, dtype=np.float32)[:, None].repeat(width, axis=1)
+    box_width, box_height = width // 5, height // 3
+    left_edge = (width // 8 + variant * width // 10) % (width - box_width)
+    top = height // 3
+    depth[top:top + box_height, left_edge:left_edge + box_width] = 1.5
+    depth += rng.normal(0, 0.005, (height, width)).astype(np.float32)
+
+    texture = rng.integers(0, 256, (height, width), dtype=np.uint8)
+    shade = (255 * (depth - 0.8) / 3.7).clip(0, 255).astype(np.uint8)
+    left = np.empty((height, width, 4), np.uint8)
+    left[..., 0] = texture // 2 + shade // 2
+    left[..., 1] = texture // 3 + 80
+    left[..., 2] = 255 - shade
+    left[..., 3] = 255
+    # Sağ görüntü: ortalama paralaks kadar kaydırılmış sol görüntü
+    shift = int(round(calibration.fx * calibration.baseline / float(np.median(depth))))
+    right = np.roll(left, -shift, axis=1)
+
+    depth[rng.random((height, width)) < hole_ratio] = np.nan
+    cloud = xyzrgba_from_depth(depth, left, calibration)
+    return {"left": left, "right": right, "depth": depth, "cloud": cloud}
+
+
+class SyntheticFrameSource(FrameSource):
+    """Deterministic synthetic camera cycling through `variants` precomputed scenes.
+
+    paced=True delivers frames at `fps` on a grid of the monotonic clock
+    shared by every paced synthetic source, like cameras with a common
+    trigger, and stamps each with its tick; otherwise as fast as they are
+    grabbed, with timestamps still spaced one frame period apart.
+    clock_offset_ms and jitter_ms shift each timestamp, to exercise pairing
+    of devices whose clocks or exposures do not line up exactly. frames > 0
+    ends the stream (EOFError) after that many frames.
+    """
+
+    def __init__(self, resolution="HD720", fps=30, paced=False, frames=0, variants=2, hole_ratio=0.1,
+                 seed=0, clock_offset_ms=0.0, jitter_ms=0.0, name=None):
+        super().__init__(resolution, fps, name or f"synthetic-{resolution}")
+        self.period = 1.0 / fps
+        self.paced = paced
+        self.frames = frames
+        self.variants = max(1, variants)
+        self.hole_ratio = hole_ratio
+        self.seed = seed
+        self.clock_offset_ns = int(clock_offset_ms * 1e6)
+        self.jitter_ns = jitter_ms * 1e6
+        self.scenes = []
+
+    def open(self):
+        # Sahneler bir kez üretilir; yeniden açmak yalnızca sayaçları sıfırlar
+        if not self.scenes:
+            width, height = self.size
+            self.scenes = [synthetic_scene(width, height, variant, self.hole_ratio, self.seed)
+                           for variant in range(self.variants)]
+        self.frame_id = 0
+        self.rng = np.random.default_rng(self.seed)
+        self.deadline = np.ceil(time.monotonic() / self.period) * self.period
+
+    def grab(self, depth=True):
+        if self.frames and self.frame_id >= self.frames:
+            raise EOFError(self.name)
+        if self.paced:
+            self.deadline += self.period
+            delay = self.deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Geç kalındı: kaçan vuruşlar atlanır ama ızgarada kalınır
+                self.deadline = np.ceil(time.monotonic() / self.period) * self.period
+        self.frame_id += 1
+        self.scene = self.scenes[self.frame_id % self.variants]
+        # Pozlama anı: uyanılan an değil, vuruşun kendisi
+        tick = self.deadline if self.paced else self.frame_id * self.period
+        self.stamp = int(tick * 1e9) + self.clock_offset_ns
+        if self.jitter_ns:
+            self.stamp += int(self.rng.normal(0, self.jitter_ns))
+        return True
+
+    def timestamp(self):
+        return self.stamp
+
+    def retrieve_image(self, mat, view="left"):
+        return copy_into(mat, self.scene[view])
+
+    def retrieve_depth(self, mat, size=None):
+        return copy_into(mat, self.scene["depth"], size)
+
+    def retrieve_cloud(self, mat, size=None):
+        return copy_into(mat, self.scene["cloud"], size)
+
+    def close(self):
+        self.scenes = []
+
+
+class ReplayFrameSource(FrameSource):
+    """Plays a .zcap recording back as a camera.
+
+    paced=True reproduces the recorded frame intervals, otherwise frames come
+    as fast as they are read. The cloud is rebuilt from depth and the left
+    image with `calibration` (nominal ZED intrinsics when None). Depth
+    recorded in millimeters (metadata depth_unit) is returned in meters.
+    frames > 0 ends the stream after that many frames, loops included.
+    """
+
+    def __init__(self, path, paced=False, loop=False, frames=0, calibration=None, name=None):
+        super().__init__(None, 30, name or path)
+        self.path = path
+        self.paced = paced
+        self.loop = loop
+        self.frames = frames
+        self.calibration = calibration
+
+    def open(self):
+        self.reader = CaptureReader(self.path)
+        if len(self.reader) == 0:
+            raise RuntimeError(f"{self.path}: kayıtta kare yok")
+        metadata = self.reader.header.get("metadata", {})
+        self.resolution = metadata.get("resolution")
+        self.fps = metadata.get("fps", self.fps)
+        self.size = (self.reader.width, self.reader.height)
+        self.depth_scale = 0.001 if metadata.get("depth_unit") == "MILLIMETER" else 1.0
+        calibration = self.calibration or nominal_calibration(*self.size)
+        self.calibration = calibration.scaled(*self.size)
+        timestamps = self.reader.timestamps
+        self.duration = int(1e9 / self.fps)
+        if len(timestamps) > 1:
+            self.duration += int(timestamps[-1] - timestamps[0])
+        self.index = 0
+        self.loops = 0
+        self.frame_id = 0
+        self.start = time.monotonic_ns()
+
+    def grab(self, depth=True):
+        if self.frames and self.frame_id >= self.frames:
+            raise EOFError(self.path)
+        if self.index == len(self.reader):
+            if not self.loop:
+                raise EOFError(self.path)
+            self.index = 0
+            self.loops += 1
+        self.frame = self.reader[self.index]
+        self.index += 1
+        self.frame_id += 1
+        self.depth = None
+        self.cloud = None
+        if self.paced:
+            due = self.start + self.timestamp() - int(self.reader.timestamps[0])
+            delay = (due - time.monotonic_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+        return True
+
+    def timestamp(self):
+        return self.frame["timestamp"] + self.loops * self.duration
+
+    def retrieve_image(self, mat, view="left"):
+        return copy_into(mat, self.frame[view])
+
+    def _depth_meters(self):
+        if self.depth is None:
+            depth = self.frame.get("depth")
+            if depth is None:
+                raise RuntimeError(f"{self.path}: kayıtta derinlik yok")
+            self.depth = np.multiply(depth, np.float32(self.depth_scale), dtype=np.float32)
+        return self.depth
+
+    def retrieve_depth(self, mat, size=None):
+        return copy_into(mat, self._depth_meters(), size)
+
+    def retrieve_cloud(self, mat, size=None):
+        if self.cloud is None:
+            self.cloud = xyzrgba_from_depth(self._depth_meters(), self.frame["left"], self.calibration)
+        return copy_into(mat, self.cloud, size)
+
+    def close(self):
+        self.reader.close()
+
+
+class FrameGrabber:
+    """Grabs a FrameSource into a ring of mat slots and hands each frame out as a pipeline Frame.
+
+    Frame data holds "left" (BGRA), "depth" (in the source's depth_unit) and,
+    when asked for, "cloud" (XYZRGBA). grab() returns None when the source
+    has no new frame or every slot is still held (counted in `skipped`); an
+    EOFError from a finite source passes through.
+    """
+
+    def __init__(self, source, slots=4, cloud=False):
+        self.source = source
+        self.name = source.name
+        self.slots = slots
+        self.cloud = cloud
+        self.skipped = 0
+        self.ring = None
+
+    def open(self):
+        source = self.source
+        source.open()
+        self.ring = SlotRing(lambda: {"left": source.new_mat(), "depth": source.new_mat(),
+                                      "cloud": source.new_mat()}, self.slots)
+
+    def grab(self, cloud=None):
+        """Next frame, with the cloud when `cloud` (default: the constructor's setting)."""
+        source = self.source
+        if not source.grab(depth=True):
+            return None
+        slot = self.ring.acquire()
+        if slot is None:
+            self.skipped += 1
+            return None
+        data = {"left": source.retrieve_image(slot["left"]), "depth": source.retrieve_depth(slot["depth"])}
+        if self.cloud if cloud is None else cloud:
+            data["cloud"] = source.retrieve_cloud(slot["cloud"])
+        ring = self.ring
+        return Frame(FrameInfo(source.frame_id, source.timestamp()), data, lambda: ring.release(slot))
+
+    def close(self):
+        self.source.close()
@@ -0,0 +1,167 @@
+"""Low-overhead timing spans, rolling percentiles and grab-to-screen latency.
+
+    with profiler.span("depth.colorize"):
+        depth_colorizer.colorize(depth, out=display.array)
+
+Every span name keeps its last `window` durations (time.perf_counter, so
+monotonic) in a ring buffer; snapshot() turns them into count, mean, p50,
+p95, p99 and max in milliseconds. Percentiles are only computed there, about
+once a second, never on the hot path.
+
+End-to-end latency: the grab loop calls frame_grabbed(frame_id), the GUI
+calls frame_shown(pane, frame_id) once it has put that frame on screen, and
+the difference is recorded as "latency.<pane>".
+
+A disabled Profiler hands out one shared no-op span and ignores frame marks,
+so instrumented code costs a method call and a flag test per span.
+"""
+import json
+import threading
+import time
+
+import numpy as np
+
+from recorder import AsyncWriter
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_series", "_start")
+
+    def __init__(self, series):
+        self._series = series
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._series.add(1000.0 * (time.perf_counter() - self._start))
+        return False
+
+
+class RollingSeries:
+    """The last `window` samples (ms) of one span; order does not matter for percentiles."""
+
+    def __init__(self, window):
+        self.samples = np.zeros(window)
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    def summary(self):
+        values = self.samples[:min(self.count, len(self.samples))]
+        if len(values) == 0:
+            return None
+        p50, p95, p99 = np.percentile(values, (50, 95, 99))
+        return {
+            "count": self.count,
+            "mean": float(values.mean()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(values.max()),
+        }
+
+
+class Profiler:
+    """Named spans with rolling percentiles, plus per-frame grab-to-screen latency.
+
+    One series is written by one thread at a time (each stage times its own
+    spans), so adding a sample takes no lock; only creating a series does.
+    """
+
+    def __init__(self, enabled=True, window=1024, frames=256):
+        self.enabled = enabled
+        self.window = window
+        self._series = {}
+        self._lock = threading.Lock()
+        # Grab time of recent frame ids, indexed by frame_id % frames
+        self._grab_ids = np.full(frames, -1, np.int64)
+        self._grab_times = np.zeros(frames)
+
+    def _get(self, name):
+        series = self._series.get(name)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(name, RollingSeries(self.window))
+        return series
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self._get(name))
+
+    def record(self, name, ms):
+        if self.enabled:
+            self._get(name).add(ms)
+
+    def frame_grabbed(self, frame_id):
+        if self.enabled:
+            slot = frame_id % len(self._grab_ids)
+            self._grab_times[slot] = time.perf_counter()
+            self._grab_ids[slot] = frame_id
+
+    def frame_shown(self, pane, frame_id):
+        """Record grab-to-screen latency of a frame; None when its grab mark was already overwritten."""
+        if not self.enabled:
+            return None
+        slot = frame_id % len(self._grab_ids)
+        if self._grab_ids[slot] != frame_id:
+            return None
+        latency = 1000.0 * (time.perf_counter() - self._grab_times[slot])
+        self._get(f"latency.{pane}").add(latency)
+        return latency
+
+    def snapshot(self):
+        with self._lock:
+            series = list(self._series.items())
+        return {name: summary for name, summary in
+                ((name, values.summary()) for name, values in sorted(series)) if summary is not None}
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+        self._grab_ids[:] = -1
+
+
+def format_summary(snapshot):
+    """One aligned line per span: p50 / p95 / p99 / max in ms."""
+    width = max((len(name) for name in snapshot), default=0)
+    return [
+        f"{name:<{width}}  {values['p50']:7.2f} {values['p95']:7.2f} {values['p99']:7.2f} {values['max']:7.2f}"
+        for name, values in snapshot.items()
+    ]
+
+
+class JsonLinesLog(AsyncWriter):
+    """Appends one JSON object per submitted record to `path`, flushed line by line."""
+
+    def __init__(self, path, queue_size=16):
+        self.path = path
+        self._handle = open(path, "a", encoding="utf-8")
+        super().__init__("profile-log", queue_size, drop_when_full=True)
+
+    def log(self, record):
+        return self.submit(record, copy=False)
+
+    def write(self, record):
+        self._handle.write(json.dumps(record) + "\n")
+        self._handle.flush()
+
+    def finish(self):
+        self._handle.close()
@@ -8,9 +8,19 @@ def parse_arguments():
     parser.add_argument("--frame_rate", type=int, default=30, help="Kaydedilecek videonun saniyedeki kare sayısını (FPS) belirtin. (Varsayılan: 30 FPS)")
     parser.add_argument("--video_save", type=bool, default=False, help="Videoyu kaydetmek istiyorsanız True olarak ayarlayın. (Varsayılan: False)")
     parser.add_argument("--frame_save", type=bool, default=False, help="Her bir kareyi ayrı görüntü olarak kaydetmek istiyorsanız True olarak ayarlayın. (Varsayılan: False)")
+    parser.add_argument("--raw_save", type=bool, default=False, help="Sol, sağ ve derinlik karelerini kayıpsız .zcap dosyasına kaydetmek için True olarak ayarlayın. (Varsayılan: False)")
+    parser.add_argument("--depth_codec", type=str, choices=["raw", "zlib", "lzma"], default="raw", help="Kayıpsız kayıtta derinliğin saklanma biçimi: raw = .zcap içinde float32, zlib/lzma = mm cinsinden sıkıştırılmış ayrı .zdepth dosyası. (Varsayılan: raw)")
+    parser.add_argument("--keyframe_interval", type=int, default=30, help="Sıkıştırılmış derinlikte kaç karede bir anahtar kare yazılacağı; rastgele erişim en fazla bu kadar kare çözer. (Varsayılan: 30)")
     parser.add_argument("--save_time", type=int, default=5, help="Videonun kaç saniye boyunca kaydedileceğini belirtin. (Varsayılan: 5 saniye)")
     parser.add_argument("--frame_time", type=int, default=1, help="Her bir kareyi kaç saniye arayla kaydetmek istediğinizi belirtin. (Varsayılan: 1 saniye)")
     parser.add_argument("--show", type=bool, default=False, help="Görüntüler ekranda bastırılması.")
+    parser.add_argument("--queue_size", type=int, default=32, help="Her kayıt yazıcısının kuyruğunda bekleyebilecek en fazla kare sayısı. (Varsayılan: 32)")
+    parser.add_argument("--drop_when_full", type=bool, default=False, help="Kuyruk dolduğunda beklemek yerine kareyi atlamak için True olarak ayarlayın. (Varsayılan: False)")
+    parser.add_argument("--image_format", type=str, choices=["png", "jpg"], default="png", help="Kaydedilen karelerin dosya biçimi. (Varsayılan: png)")
+    parser.add_argument("--png_compression", type=int, default=3, choices=range(10), help="PNG sıkıştırma seviyesi, 0-9. (Varsayılan: 3)")
+    parser.add_argument("--profile", type=bool, default=False, help="Kayıt döngüsünün aşama sürelerini ölçüp sonda p50/p95/p99 özetini yazdırmak için True olarak ayarlayın. (Varsayılan: False)")
+    parser.add_argument("--profile_log", type=str, default=None, help="Aşama sürelerinin her saniye ekleneceği JSON-lines dosyası. (Varsayılan: yok)")
+    parser.add_argument("--jpeg_quality", type=int, default=95, help="JPEG kalitesi, 0-100. (Varsayılan: 95)")
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -0,0 +1,304 @@
+"""Several cameras grabbing in their own threads, processed by one shared worker pool.
+
+Each source (a frame_source live ZED, synthetic stand-in or .zcap replay)
+runs its grab loop in a thread and posts frames to a single bounded queue
+served by a fixed number of workers, so adding cameras does not add
+processing threads.
+A full queue drops the frame instead of stalling the grab loop. Processed
+frames are grouped across cameras by nearest timestamp within a tolerance.
+
+    python multi_camera.py --synthetic 8 --seconds 10
+    python multi_camera.py --serials 12345678 23456789
+    python multi_camera.py --captures rig_a.zcap rig_b.zcap
+"""
+import argparse
+import bisect
+import queue
+import threading
+import time
+
+import numpy as np
+
+from depth_colorizer import DepthColorizer
+from frame_source import RESOLUTIONS, FrameGrabber, ReplayFrameSource, SyntheticFrameSource, ZEDFrameSource
+
+
+class SharedWorkerPool:
+    """Fixed worker threads behind one bounded queue shared by every camera.
+
+    submit() never blocks: when the queue is full the frame is released and
+    counted as dropped for its camera. on_result(name, info, result) is
+    called on the worker thread after each frame.
+    """
+
+    def __init__(self, process, workers=4, queue_size=8, on_result=None):
+        self.process = process
+        self.on_result = on_result
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = [
+            threading.Thread(target=self._run, name=f"worker-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        self._lock = threading.Lock()
+        self.processed = {}
+        self.dropped = {}
+        self.busy_seconds = 0.0
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, name, frame):
+        try:
+            self._queue.put_nowait((name, frame))
+            return True
+        except queue.Full:
+            frame.release()
+            with self._lock:
+                self.dropped[name] = self.dropped.get(name, 0) + 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            name, frame = item
+            start = time.perf_counter()
+            try:
+                result = self.process(name, frame)
+            finally:
+                frame.release()
+            with self._lock:
+                self.processed[name] = self.processed.get(name, 0) + 1
+                self.busy_seconds += time.perf_counter() - start
+            if self.on_result is not None:
+                self.on_result(name, frame.info, result)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+class TimestampPairer:
+    """Groups one result per camera whose timestamps lie within `tolerance_ns`.
+
+    Results may arrive out of order from the pool, so each camera keeps a
+    short timestamp-sorted backlog. Whenever every camera has one, the
+    oldest heads form a set if they are close enough; otherwise the oldest
+    head cannot match anything newer and is dropped as unpaired.
+    """
+
+    def __init__(self, names, tolerance_ns, max_pending=8):
+        self.names = list(names)
+        self.tolerance_ns = tolerance_ns
+        self.max_pending = max_pending
+        self._pending = {name: [] for name in self.names}
+        self._lock = threading.Lock()
+        self.unpaired = dict.fromkeys(self.names, 0)
+        self.pairs = 0
+        self.skew_sum_ns = 0
+        self.max_skew_ns = 0
+
+    def add(self, name, timestamp, item):
+        """Add one result; returns the completed sets as dicts of name -> (timestamp, item)."""
+        completed = []
+        with self._lock:
+            pending = self._pending[name]
+            bisect.insort(pending, (timestamp, id(item), item))
+            if len(pending) > self.max_pending:
+                pending.pop(0)
+                self.unpaired[name] += 1
+
+            while all(self._pending.values()):
+                heads = {camera: backlog[0] for camera, backlog in self._pending.items()}
+                oldest = min(heads, key=lambda camera: heads[camera][0])
+                newest = max(head[0] for head in heads.values())
+                skew = newest - heads[oldest][0]
+                if skew > self.tolerance_ns:
+                    self._pending[oldest].pop(0)
+                    self.unpaired[oldest] += 1
+                    continue
+                for backlog in self._pending.values():
+                    backlog.pop(0)
+                completed.append({camera: (head[0], head[2]) for camera, head in heads.items()})
+                self.pairs += 1
+                self.skew_sum_ns += skew
+                self.max_skew_ns = max(self.max_skew_ns, skew)
+        return completed
+
+
+class CameraManager:
+    """Opens N frame sources, grabs each in its own thread and processes all of them in one pool.
+
+    process(name, frame) runs on a pool worker and must not keep references
+    to frame.data (the slot is reused once it returns). on_pair(set) receives
+    each timestamp-aligned set of results as {name: (timestamp, result)}.
+    Each frame is retrieved into one of `slots` slots per camera; a grab
+    with every slot still queued or in process counts as dropped. A source
+    whose grab() raises EOFError stops its camera; finished() tells when
+    every camera has stopped.
+    """
+
+    def __init__(self, sources, process, workers=4, queue_size=None, tolerance_ms=15.0, on_pair=None, slots=4):
+        self.sources = {source.name: FrameGrabber(source, slots) for source in sources}
+        if len(self.sources) != len(sources):
+            raise ValueError("Camera names must be unique")
+        self.pool = SharedWorkerPool(
+            process, workers, queue_size or 2 * len(sources), on_result=self._on_result
+        )
+        self.pairer = TimestampPairer(self.sources, int(tolerance_ms * 1e6))
+        self.on_pair = on_pair
+        self.grabbed = dict.fromkeys(self.sources, 0)
+        self.ended = set()
+        self._threads = []
+        self._running = False
+        self._last_stats = (time.monotonic(), dict(self.grabbed))
+
+    def start(self):
+        for source in self.sources.values():
+            source.open()
+        self._running = True
+        self.pool.start()
+        for name, source in self.sources.items():
+            thread = threading.Thread(target=self._grab_loop, args=(name, source), name=f"grab-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._last_stats = (time.monotonic(), dict(self.grabbed))
+
+    def _grab_loop(self, name, source):
+        while self._running:
+            try:
+                frame = source.grab()
+            except EOFError:
+                # Kayıt bitti: bu kameranın döngüsü sona erer, diğerleri sürer
+                self.ended.add(name)
+                return
+            if frame is None:
+                continue
+            self.grabbed[name] += 1
+            self.pool.submit(name, frame)
+
+    def finished(self):
+        return len(self.ended) == len(self.sources)
+
+    def _on_result(self, name, info, result):
+        for matched in self.pairer.add(name, info.timestamp, result):
+            if self.on_pair is not None:
+                self.on_pair(matched)
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join()
+        self.pool.stop()
+        for source in self.sources.values():
+            source.close()
+
+    def stats(self):
+        """Per-camera grab FPS (since the previous call), processed, dropped and unpaired counts."""
+        now = time.monotonic()
+        last_time, last_grabbed = self._last_stats
+        elapsed = max(now - last_time, 1e-9)
+        grabbed = dict(self.grabbed)
+        self._last_stats = (now, grabbed)
+        cameras = {
+            name: {
+                "fps": (grabbed[name] - last_grabbed[name]) / elapsed,
+                "grabbed": grabbed[name],
+                "processed": self.pool.processed.get(name, 0),
+                "dropped": self.pool.dropped.get(name, 0) + self.sources[name].skipped,
+                "unpaired": self.pairer.unpaired[name],
+            }
+            for name in self.sources
+        }
+        pairs = self.pairer.pairs
+        return {
+            "cameras": cameras,
+            "pairs": pairs,
+            "mean_skew_ms": self.pairer.skew_sum_ns / pairs / 1e6 if pairs else 0.0,
+            "max_skew_ms": self.pairer.max_skew_ns / 1e6,
+            "pool_busy_s": self.pool.busy_seconds,
+        }
+
+
+def colorize_process():
+    """Default per-frame work: colorize depth and take the median distance, with one colorizer per worker."""
+    local = threading.local()
+
+    def process(name, frame):
+        if not hasattr(local, "colorizer"):
+            local.colorizer = DepthColorizer(0.4, 5.0, colormap="Colormap")
+        depth = frame.data["depth"]
+        local.colorizer.colorize(depth)
+        center = depth[::8, ::8]
+        return float(np.nanmedian(center)) if np.isfinite(center).any() else None
+
+    return process
+
+
+def print_stats(stats):
+    for name, camera in stats["cameras"].items():
+        print(
+            f"{name:>12}: {camera['fps']:5.1f} FPS, {camera['processed']} işlendi, "
+            f"{camera['dropped']} atlandı, {camera['unpaired']} eşleşmedi"
+        )
+    print(
+        f"{'eşleşme':>12}: {stats['pairs']}, ortalama fark {stats['mean_skew_ms']:.2f} ms, "
+        f"en çok {stats['max_skew_ms']:.2f} ms"
+    )
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Çoklu kamera yakalama, ortak işçi havuzu ve zaman damgası eşleştirme")
+    sources = parser.add_mutually_exclusive_group(required=True)
+    sources.add_argument("--serials", type=int, nargs="+", help="Açılacak ZED kameraların seri numaraları")
+    sources.add_argument("--captures", type=str, nargs="+", help="Kamera yerine oynatılacak .zcap kayıtları")
+    sources.add_argument("--synthetic", type=int, help="Sentetik kamera sayısı")
+    parser.add_argument("--resolution", type=str, choices=list(RESOLUTIONS), default="VGA",
+                        help="Canlı/sentetik kameraların çözünürlüğü. (Varsayılan: VGA)")
+    parser.add_argument("--fps", type=int, default=30, help="Canlı/sentetik kameraların FPS değeri. (Varsayılan: 30)")
+    parser.add_argument("--workers", type=int, default=4, help="Ortak havuzdaki işçi sayısı. (Varsayılan: 4)")
+    parser.add_argument("--queue_size", type=int, default=0,
+                        help="Ortak kuyruk boyutu, 0 = kamera sayısının iki katı. (Varsayılan: 0)")
+    parser.add_argument("--tolerance_ms", type=float, default=15.0,
+                        help="Aynı ana ait sayılan karelerin en büyük zaman farkı. (Varsayılan: 15 ms)")
+    parser.add_argument("--jitter_ms", type=float, default=2.0,
+                        help="Sentetik kameraların zaman damgası sapması. (Varsayılan: 2 ms)")
+    parser.add_argument("--unpaced", action="store_true", help="Kayıtları kaydedilen hızda değil, olabildiğince hızlı oynat")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Çalışma süresi. (Varsayılan: 10 s)")
+    return parser.parse_args()
+
+
+def build_sources(args):
+    if args.serials:
+        return [ZEDFrameSource(args.resolution, args.fps, depth_mode="NEURAL", units="METER", serial_number=serial)
+                for serial in args.serials]
+    if args.captures:
+        return [ReplayFrameSource(path, paced=not args.unpaced, loop=True) for path in args.captures]
+    return [
+        SyntheticFrameSource(args.resolution, args.fps, paced=True, seed=index, clock_offset_ms=index * 0.5,
+                             jitter_ms=args.jitter_ms, name=f"synthetic-{index}")
+        for index in range(args.synthetic)
+    ]
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    manager = CameraManager(
+        build_sources(args), colorize_process(), workers=args.workers,
+        queue_size=args.queue_size or None, tolerance_ms=args.tolerance_ms,
+    )
+    manager.start()
+    manager.stats()
+    try:
+        end = time.monotonic() + args.seconds
+        while time.monotonic() < end and not manager.finished():
+            time.sleep(1.0)
+            print_stats(manager.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
@@ -0,0 +1,138 @@
+import numpy as np
+
+from buffer_pool import pooled_empty
+from point_cloud import valid_point_mask
+
+
+class OrganizedCloud:
+    """XYZRGBA cloud that keeps its HxW image layout instead of being flattened.
+
+    Pixel (row, col) of the left image is element (row, col) of the cloud, so
+    "what is under this pixel" is a single index, and image-grid neighbours
+    give normals without a KD-tree. `stride` decimates by plain slicing; all
+    arrays are views of the SDK buffer, valid while that buffer is. The
+    validity mask is only built when first used, so single-pixel lookups
+    stay O(1).
+    """
+
+    def __init__(self, cloud, stride=1, mask=None):
+        if cloud.dtype != np.float32 or cloud.ndim != 3 or cloud.shape[2] != 4:
+            raise ValueError("Expected an HxWx4 float32 XYZRGBA point cloud")
+        self.source_shape = cloud.shape[:2]
+        self.stride = stride
+        self.cloud = cloud[::stride, ::stride]
+        self.xyz = self.cloud[..., :3]
+        self._valid = mask
+
+    @property
+    def valid(self):
+        """HxW mask of points with depth."""
+        if self._valid is None:
+            self._valid = valid_point_mask(self.cloud)
+        return self._valid
+
+    @property
+    def shape(self):
+        return self.cloud.shape[:2]
+
+    def decimate(self, stride):
+        """Every `stride`-th row and column, sharing memory with this cloud."""
+        mask = None if self._valid is None else self._valid[::stride, ::stride]
+        decimated = OrganizedCloud(self.cloud, stride, mask)
+        decimated.source_shape = self.source_shape
+        decimated.stride = self.stride * stride
+        return decimated
+
+    def grid_index(self, row, col):
+        """Full-resolution pixel -> (row, col) in this (possibly decimated) grid."""
+        height, width = self.shape
+        return min(row // self.stride, height - 1), min(col // self.stride, width - 1)
+
+    def point_at(self, row, col):
+        """(x, y, z, distance) under a full-resolution pixel, or None where depth is missing."""
+        row, col = self.grid_index(row, col)
+        x, y, z = (float(v) for v in self.xyz[row, col])
+        if not np.isfinite(x):
+            return None
+        return x, y, z, float(np.sqrt(x * x + y * y + z * z))
+
+    def normal_at(self, row, col):
+        """Unit normal at one pixel from its four grid neighbours, or None at edges and holes."""
+        row, col = self.grid_index(row, col)
+        height, width = self.shape
+        if not (0 < row < height - 1 and 0 < col < width - 1):
+            return None
+        xyz = self.xyz
+        normal = np.cross(xyz[row, col + 1] - xyz[row, col - 1], xyz[row + 1, col] - xyz[row - 1, col])
+        length = np.linalg.norm(normal)
+        if not np.isfinite(length) or length == 0:
+            return None
+        if np.dot(normal, xyz[row, col]) > 0:
+            normal = -normal
+        return tuple(float(v) for v in normal / length)
+
+    def normals(self, max_edge=None, pool=None):
+        """HxWx3 unit normals from central differences on the image grid.
+
+        Border pixels and pixels next to a hole are NaN (NaN propagates through
+        the differences), as are pixels whose neighbours are farther than
+        `max_edge` apart, i.e. across a depth discontinuity. Normals point
+        towards the camera. With a pool the result is a pooled view.
+        """
+        height, width = self.shape
+        xyz = self.xyz
+        normals = pooled_empty(pool, "organized.normals", (height, width, 3), np.float32)
+        normals[0] = normals[-1] = np.nan
+        normals[:, 0] = normals[:, -1] = np.nan
+        if height < 3 or width < 3:
+            return normals
+
+        # Work on contiguous X/Y/Z planes: interleaved XYZ slices are several times slower.
+        planes = pooled_empty(pool, "organized.planes", (3, height, width), np.float32)
+        np.copyto(planes, np.moveaxis(xyz, 2, 0))
+        inner = (3, height - 2, width - 2)
+        du = pooled_empty(pool, "organized.du", inner, np.float32)
+        dv = pooled_empty(pool, "organized.dv", inner, np.float32)
+        np.subtract(planes[:, 1:-1, 2:], planes[:, 1:-1, :-2], out=du)
+        np.subtract(planes[:, 2:, 1:-1], planes[:, :-2, 1:-1], out=dv)
+
+        # n = du x dv
+        cross = pooled_empty(pool, "organized.cross", inner, np.float32)
+        scratch = pooled_empty(pool, "organized.scratch", inner[1:], np.float32)
+        for axis, (a, b) in enumerate(((1, 2), (2, 0), (0, 1))):
+            np.multiply(du[a], dv[b], out=cross[axis])
+            np.multiply(du[b], dv[a], out=scratch)
+            np.subtract(cross[axis], scratch, out=cross[axis])
+
+        # scale = +-1 / |n|, NaN across depth discontinuities
+        scale = pooled_empty(pool, "organized.scale", inner[1:], np.float32)
+        _squared_norm(cross, scale, scratch)
+        np.sqrt(scale, out=scale)
+        np.reciprocal(scale, out=scale)
+        if max_edge is not None:
+            limit = np.float32(max_edge * max_edge)
+            for diff in (du, dv):
+                _squared_norm(diff, scratch, scratch)
+                scale[scratch > limit] = np.nan
+        # Flip towards the camera (the origin): n . p must be negative
+        center = planes[:, 1:-1, 1:-1]
+        np.multiply(cross[0], center[0], out=scratch)
+        for axis in (1, 2):
+            np.add(scratch, cross[axis] * center[axis], out=scratch)
+        np.negative(scale, out=scale, where=scratch > 0)
+
+        out = normals[1:-1, 1:-1]
+        for axis in range(3):
+            np.multiply(cross[axis], scale, out=out[..., axis])
+        return normals
+
+
+def _squared_norm(planes, out, scratch):
+    """Sum of squares of three planes into `out` (which may alias `scratch`)."""
+    np.multiply(planes[0], planes[0], out=out)
+    for axis in (1, 2):
+        if scratch is out:
+            out += planes[axis] * planes[axis]
+        else:
+            np.multiply(planes[axis], planes[axis], out=scratch)
+            out += scratch
@@ -0,0 +1,212 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+FrameInfo = namedtuple("FrameInfo", ["frame_id", "timestamp"])
+
+
+class Frame:
+    """One grabbed capture handed to a stage: its grab id/timestamp plus stage data.
+
+    `release` is called exactly once, either after the stage processed the
+    frame or when a mailbox drops it, so the data slot can be reused.
+    """
+
+    __slots__ = ("info", "data", "_release")
+
+    def __init__(self, info, data, release=None):
+        self.info = info
+        self.data = data
+        self._release = release
+
+    def release(self):
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+
+class SlotRing:
+    """Fixed set of reusable data slots (e.g. sl.Mat objects) with a free list."""
+
+    def __init__(self, factory, size):
+        self._free = deque(factory() for _ in range(size))
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+
+class LatestMailbox:
+    """Bounded queue that drops the oldest frame when full (latest frame wins)."""
+
+    def __init__(self, capacity=1):
+        self.capacity = capacity
+        self.dropped = 0
+        self._frames = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, frame):
+        with self._cond:
+            if self._closed:
+                frame.release()
+                return
+            while len(self._frames) >= self.capacity:
+                self._frames.popleft().release()
+                self.dropped += 1
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def count_drop(self):
+        with self._cond:
+            self.dropped += 1
+
+    def get(self, timeout=None):
+        """Return the oldest pending frame, or None on timeout / after close."""
+        with self._cond:
+            if not self._frames and not self._closed:
+                self._cond.wait(timeout)
+            if self._frames:
+                return self._frames.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._frames:
+                self._frames.popleft().release()
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class StageWorker(threading.Thread):
+    """Runs `process(frame)` for every frame posted to its mailbox."""
+
+    def __init__(self, name, process, capacity=1):
+        super().__init__(name=f"{name}-stage", daemon=True)
+        self.stage_name = name
+        self.process = process
+        self.mailbox = LatestMailbox(capacity)
+        self.processed = 0
+        self.busy_time = 0.0
+
+    def submit(self, frame):
+        self.mailbox.put(frame)
+
+    def skip(self):
+        """Count a capture this stage never received (no free data slot)."""
+        self.mailbox.count_drop()
+
+    def run(self):
+        while not self.mailbox.closed:
+            frame = self.mailbox.get(timeout=0.1)
+            if frame is None:
+                continue
+            start = time.perf_counter()
+            try:
+                self.process(frame)
+            finally:
+                frame.release()
+            self.busy_time += time.perf_counter() - start
+            self.processed += 1
+
+    def stop(self, timeout=1.0):
+        self.mailbox.close()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self):
+        return {
+            "processed": self.processed,
+            "dropped": self.mailbox.dropped,
+            "busy_ms": self.busy_time * 1000.0,
+        }
+
+
+class OutputSubscriptions:
+    """Which outputs have consumers, and how often each of them is needed.
+
+    A consumer subscribes to an output with a target rate in Hz (0 = every
+    frame). An output runs at the highest rate any of its consumers asked
+    for, and is not retrieved or computed at all while nobody subscribes.
+    """
+
+    def __init__(self, outputs):
+        self.outputs = tuple(outputs)
+        self._rates = {output: {} for output in self.outputs}
+        self._scheduled = {}
+        self._lock = threading.Lock()
+        self.due_count = dict.fromkeys(self.outputs, 0)
+
+    def subscribe(self, output, consumer, rate=0.0):
+        if output not in self._rates:
+            raise ValueError(f"Unknown output: {output}")
+        with self._lock:
+            self._rates[output][consumer] = max(0.0, float(rate))
+
+    def unsubscribe(self, consumer, output=None):
+        """Drop one subscription of `consumer`, or all of them when output is None."""
+        with self._lock:
+            for name, consumers in self._rates.items():
+                if output is None or name == output:
+                    consumers.pop(consumer, None)
+                    if not consumers:
+                        self._scheduled.pop(name, None)
+
+    def _rate(self, output):
+        rates = self._rates[output].values()
+        if not rates:
+            return None
+        return 0.0 if min(rates) == 0.0 else max(rates)
+
+    def rate(self, output):
+        """Target rate of an output: 0 for every frame, None while nobody is subscribed."""
+        with self._lock:
+            return self._rate(output)
+
+    def active(self):
+        with self._lock:
+            return {output for output, consumers in self._rates.items() if consumers}
+
+    def due(self, now):
+        """Outputs to compute for a frame grabbed at `now` (time.monotonic seconds)."""
+        due = set()
+        with self._lock:
+            for output in self.outputs:
+                rate = self._rate(output)
+                if rate is None:
+                    continue
+                if rate > 0:
+                    interval = 1.0 / rate
+                    scheduled = self._scheduled.get(output, now)
+                    if now < scheduled:
+                        continue
+                    # Stay on schedule, but don't try to catch up after a stall
+                    self._scheduled[output] = (scheduled if now - scheduled < interval else now) + interval
+                due.add(output)
+                self.due_count[output] += 1
+        return due
+
+    def reset(self):
+        with self._lock:
+            self._scheduled.clear()
+            self.due_count = dict.fromkeys(self.outputs, 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                output: {
+                    "consumers": len(self._rates[output]),
+                    "rate": self._rate(output),
+                    "due": self.due_count[output],
+                }
+                for output in self.outputs
+            }
@@ -0,0 +1,246 @@
+"""Batched RANSAC plane segmentation (floors, tables) fast enough to run every frame.
+
+Instead of testing one plane hypothesis at a time, each round draws
+`hypotheses` point triples at once, builds all their planes with one cross
+product and scores them together as a (sample x hypotheses) distance matrix
+on a random subsample of the cloud. The winner is refined by a least-squares
+fit (smallest eigenvector of the inlier covariance, on at most
+REFINE_POINTS of them) and its inliers recomputed over every remaining
+point; they are removed and the next plane is searched for.
+
+- `normal` / `max_angle`: only planes whose normal is within max_angle
+  degrees of the given direction count (e.g. a floor with a level camera);
+- warm start: the planes of the previous frame are scored first; one that
+  still holds about the share of points it had is taken without drawing
+  random hypotheses, otherwise it competes with them;
+- `budget_ms`: no new plane is started once the frame's budget is spent,
+  and the hypothesis count shrinks / grows so a frame fits the budget.
+
+The result labels every input point with its plane (or -1); inliers and
+outliers are boolean masks over the same points.
+"""
+import time
+
+import numpy as np
+
+# Hypotheses scored per matrix product, to bound the (sample x hypotheses) temporary
+HYPOTHESIS_CHUNK = 128
+MIN_HYPOTHESES = 32
+# Inliers used for the least-squares refit; the inlier test itself always covers every point
+REFINE_POINTS = 20000
+# A previous-frame plane is reused outright when it keeps this fraction of its former share of points
+WARM_ACCEPT = 0.9
+# RGB tint per plane index for mark mode
+PLANE_COLORS = np.array([[255, 64, 64], [64, 160, 255], [255, 200, 0], [160, 64, 255]], np.uint8)
+
+
+class PlaneResult:
+    """Planes found in one cloud: (normal, offset, inlier count) each, and per-point labels."""
+
+    def __init__(self, labels, planes, elapsed_ms, budget_hit):
+        self.labels = labels
+        self.planes = planes
+        self.elapsed_ms = elapsed_ms
+        self.budget_hit = budget_hit
+
+    @property
+    def inliers(self):
+        return self.labels >= 0
+
+    @property
+    def outliers(self):
+        return self.labels < 0
+
+    def summary(self):
+        """Plain values for a signal or a log line."""
+        total = len(self.labels)
+        return {
+            "planes": [
+                {"normal": [float(v) for v in normal], "offset": float(offset), "inliers": int(count)}
+                for normal, offset, count in self.planes
+            ],
+            "points": total,
+            "inlier_ratio": float(np.count_nonzero(self.labels >= 0)) / total if total else 0.0,
+            "ms": self.elapsed_ms,
+            "budget_hit": self.budget_hit,
+        }
+
+
+def mark_planes(colors, labels):
+    """Copy of the uint8 RGB colors with each plane's points blended halfway into its tint."""
+    marked = colors.copy()
+    inliers = labels >= 0
+    tint = PLANE_COLORS[labels[inliers] % len(PLANE_COLORS)]
+    marked[inliers] = (marked[inliers] >> 1) + (tint >> 1)
+    return marked
+
+
+def fit_plane(points):
+    """Least-squares plane through `points`: unit normal n and offset d with n . p + d = 0."""
+    centroid = points.mean(axis=0, dtype=np.float64)
+    centered = points - centroid
+    _, vectors = np.linalg.eigh(centered.T @ centered)
+    normal = vectors[:, 0]
+    return normal.astype(np.float32), np.float32(-normal @ centroid)
+
+
+class PlaneSegmenter:
+    """Up to `max_planes` planes per frame with batched hypotheses and a per-frame time budget.
+
+    distance is the inlier distance in meters; min_inliers the smallest
+    plane worth keeping, as a fraction of the input points.
+    """
+
+    def __init__(self, distance=0.02, hypotheses=256, sample=4096, max_planes=1, min_inliers=0.05,
+                 normal=None, max_angle=25.0, refine_iterations=2, budget_ms=10.0, warm_start=True, seed=0):
+        self.distance = distance
+        self.max_hypotheses = hypotheses
+        self.hypotheses = hypotheses
+        self.sample = sample
+        self.max_planes = max_planes
+        self.min_inliers = min_inliers
+        self.set_normal(normal, max_angle)
+        self.refine_iterations = refine_iterations
+        self.budget_ms = budget_ms
+        self.warm_start = warm_start
+        self.rng = np.random.default_rng(seed)
+        self.previous = []
+        self.frames = 0
+        self.budget_hits = 0
+
+    def set_normal(self, normal, max_angle=25.0):
+        """Accept only planes whose normal is within max_angle degrees of `normal` (None: any)."""
+        self.max_angle = max_angle
+        if normal is None:
+            self.normal = None
+        else:
+            normal = np.asarray(normal, dtype=np.float32)
+            self.normal = normal / np.linalg.norm(normal)
+        self._min_cos = np.float32(np.cos(np.radians(max_angle)))
+
+    def reset(self):
+        self.previous = []
+
+    def _hypotheses(self, sample):
+        """Unit normals (H, 3) and offsets (H,) of planes through random triples of `sample`."""
+        triples = sample[self.rng.integers(0, len(sample), (self.hypotheses, 3))]
+        normals = np.cross(triples[:, 1] - triples[:, 0], triples[:, 2] - triples[:, 0])
+        lengths = np.linalg.norm(normals, axis=1)
+        keep = lengths > 1e-9
+        normals = normals[keep] / lengths[keep, None]
+        offsets = -np.einsum("ij,ij->i", normals, triples[keep, 0])
+        return normals, offsets
+
+    def _constrain(self, normals, offsets):
+        """Orient towards the constraint direction and drop planes too far from it."""
+        if self.normal is None:
+            return normals, offsets
+        cosines = normals @ self.normal
+        flip = cosines < 0
+        normals[flip] *= -1
+        offsets[flip] *= -1
+        keep = np.abs(cosines) >= self._min_cos
+        return normals[keep], offsets[keep]
+
+    def _best(self, sample, normals, offsets):
+        """Index of the hypothesis with the most sample inliers, and that count."""
+        best, best_count = -1, 0
+        for start in range(0, len(normals), HYPOTHESIS_CHUNK):
+            chunk = slice(start, start + HYPOTHESIS_CHUNK)
+            distances = np.abs(sample @ normals[chunk].T + offsets[chunk])
+            counts = np.count_nonzero(distances < self.distance, axis=0)
+            index = int(np.argmax(counts))
+            if counts[index] > best_count:
+                best, best_count = start + index, int(counts[index])
+        return best, best_count
+
+    def _refine(self, xyz, candidates, normal, offset):
+        """Refit on the candidate points within `distance`; returns the plane and its inlier mask."""
+        points = xyz if len(candidates) == len(xyz) else xyz[candidates]
+        inliers = np.abs(points @ normal + offset) < self.distance
+        for _ in range(self.refine_iterations):
+            fit = np.flatnonzero(inliers)
+            if len(fit) < 3:
+                break
+            refined_normal, refined_offset = fit_plane(points[fit[::max(1, len(fit) // REFINE_POINTS)]])
+            if refined_normal @ normal < 0:
+                refined_normal, refined_offset = -refined_normal, -refined_offset
+            if self.normal is not None and refined_normal @ self.normal < self._min_cos:
+                break
+            normal, offset = refined_normal, refined_offset
+            inliers = np.abs(points @ normal + offset) < self.distance
+        return normal, offset, inliers
+
+    def segment(self, xyz):
+        """Label each point of the (N, 3) float32 cloud with its plane index, -1 for none."""
+        start = time.perf_counter()
+        count = len(xyz)
+        labels = np.full(count, -1, np.int8)
+        planes = []
+        budget_hit = False
+        remaining = np.arange(count)
+        min_inliers = max(3, int(self.min_inliers * count))
+        warm = list(self.previous) if self.warm_start else []
+
+        while len(planes) < self.max_planes and len(remaining) >= min_inliers:
+            if planes and 1000.0 * (time.perf_counter() - start) > self.budget_ms:
+                budget_hit = True
+                break
+            sample = xyz[remaining[self.rng.integers(0, len(remaining), min(self.sample, len(remaining)))]]
+            candidate, accepted = None, False
+            if warm:
+                # Önce geçen karenin düzlemleri: durağan bir zemin rastgele aday üretmeden yeniden bulunur
+                normals = np.array([plane[0] for plane in warm], np.float32)
+                offsets = np.array([plane[1] for plane in warm], np.float32)
+                best, best_count = self._best(sample, normals, offsets)
+                if best >= 0:
+                    candidate = (normals[best], offsets[best], best_count)
+                    accepted = best_count >= WARM_ACCEPT * warm[best][2] * len(sample)
+            if not accepted:
+                normals, offsets = self._constrain(*self._hypotheses(sample))
+                best, best_count = self._best(sample, normals, offsets)
+                if best >= 0 and (candidate is None or best_count > candidate[2]):
+                    candidate = (normals[best], offsets[best], best_count)
+            if candidate is None or candidate[2] * len(remaining) < min_inliers * len(sample):
+                break
+            normal, offset, inliers = self._refine(xyz, remaining, candidate[0], candidate[1])
+            plane_count = int(np.count_nonzero(inliers))
+            if plane_count < min_inliers:
+                break
+            labels[remaining[inliers]] = len(planes)
+            planes.append((normal, float(offset), plane_count, plane_count / len(remaining)))
+            remaining = remaining[~inliers]
+            # Bu düzleme karşılık gelen eski düzlem sonraki turlarda aday olmaz
+            warm = [plane for plane in warm if not (
+                abs(plane[0] @ normal) > 0.99 and abs(np.sign(plane[0] @ normal) * plane[1] - offset) < self.distance
+            )]
+
+        elapsed_ms = 1000.0 * (time.perf_counter() - start)
+        self._adapt(elapsed_ms, budget_hit)
+        self.previous = [(normal, offset, share) for normal, offset, _, share in planes]
+        planes = [plane[:3] for plane in planes]
+        self.frames += 1
+        return PlaneResult(labels, planes, elapsed_ms, budget_hit)
+
+    def _adapt(self, elapsed_ms, budget_hit):
+        """Fewer hypotheses after a frame over budget, more (up to the configured count) with clear headroom."""
+        if budget_hit or elapsed_ms > self.budget_ms:
+            self.budget_hits += 1
+            self.hypotheses = max(MIN_HYPOTHESES, self.hypotheses // 2)
+        elif elapsed_ms < 0.5 * self.budget_ms:
+            self.hypotheses = min(self.max_hypotheses, int(self.hypotheses * 1.25) + 1)
+
+    def inlier_mask(self, xyz, planes):
+        """Points of another cloud (e.g. the full-resolution one for an export) within `distance` of `planes`."""
+        mask = np.zeros(len(xyz), bool)
+        for normal, offset, _ in planes:
+            mask |= np.abs(xyz @ normal + np.float32(offset)) < self.distance
+        return mask
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "hypotheses": self.hypotheses,
+            "budget_hits": self.budget_hits,
+            "planes": len(self.previous),
+        }
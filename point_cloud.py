@@ -0,0 +1,108 @@
+import numpy as np
+
+from buffer_pool import BufferPool
+from voxel_grid import voxel_downsample
+
+# Byte position of each channel inside the packed float of an XYZRGBA point.
+# The ZED SDK stores the color as little-endian RGBA bytes reinterpreted as float32.
+COLOR_CHANNELS = {"r": 0, "g": 1, "b": 2, "a": 3}
+
+# Points compacted per np.compress call; keeps its internal index arrays small.
+DECODE_CHUNK_POINTS = 1 << 15
+
+
+def valid_point_mask(cloud, out=None):
+    """HxW mask of points with a finite X coordinate (NaN/inf mark missing depth)."""
+    return np.isfinite(cloud[:, :, 0], out=out)
+
+
+def packed_colors(cloud):
+    """Reinterpret the 4th channel of an XYZRGBA cloud as uint32 without copying."""
+    return cloud[..., 3].view(np.uint32)
+
+
+def _output_buffer(out, rows, cols, dtype, name):
+    if out is None:
+        return np.empty((rows, cols), dtype=dtype)
+    if out.dtype != dtype or out.ndim != 2 or out.shape[1] != cols or out.shape[0] < rows:
+        raise ValueError(f"{name} must be at least ({rows}, {cols}) {np.dtype(dtype).name}")
+    return out[:rows]
+
+
+def decode_xyzrgba(cloud, mask=None, color_order="rgb", color_dtype=np.uint8,
+                   out_xyz=None, out_colors=None):
+    """Split an HxWx4 XYZRGBA cloud into float32 XYZ and per-channel colors.
+
+    The packed color channel is read through a byte view of the cloud, so the
+    full frame is never copied; only the valid points are written, directly
+    into `out_xyz` / `out_colors` when given (they may be larger than needed,
+    the filled leading rows are returned).
+
+    color_order: any combination of "r", "g", "b", "a" (e.g. "rgb", "bgra").
+    color_dtype: np.uint8 (0-255) or np.float32 (0-1).
+    """
+    if cloud.dtype != np.float32 or cloud.ndim != 3 or cloud.shape[2] != 4:
+        raise ValueError("Expected an HxWx4 float32 XYZRGBA point cloud")
+    color_dtype = np.dtype(color_dtype)
+    if color_dtype not in (np.uint8, np.float32):
+        raise ValueError("color_dtype must be uint8 or float32")
+    channels = [COLOR_CHANNELS[c] for c in color_order.lower()]
+
+    flat = np.ascontiguousarray(cloud).reshape(-1, 4)
+    if mask is None:
+        mask = valid_point_mask(cloud)
+    mask = mask.reshape(-1)
+    count = int(np.count_nonzero(mask))
+
+    xyz = _output_buffer(out_xyz, count, 3, np.float32, "out_xyz")
+    colors = _output_buffer(out_colors, count, len(channels), color_dtype, "out_colors")
+
+    color_bytes = flat.view(np.uint8)[:, 12:16]
+    scratch = None if color_dtype == np.uint8 else np.empty(DECODE_CHUNK_POINTS, dtype=np.uint8)
+    filled = 0
+    for start in range(0, len(flat), DECODE_CHUNK_POINTS):
+        chunk = slice(start, start + DECODE_CHUNK_POINTS)
+        chunk_mask = mask[chunk]
+        chunk_count = int(np.count_nonzero(chunk_mask))
+        if chunk_count == 0:
+            continue
+        rows = slice(filled, filled + chunk_count)
+        np.compress(chunk_mask, flat[chunk, :3], axis=0, out=xyz[rows])
+        for dst, src in enumerate(channels):
+            if scratch is None:
+                np.compress(chunk_mask, color_bytes[chunk, src], out=colors[rows, dst])
+            else:
+                np.compress(chunk_mask, color_bytes[chunk, src], out=scratch[:chunk_count])
+                np.multiply(scratch[:chunk_count], np.float32(1.0 / 255.0), out=colors[rows, dst])
+        filled += chunk_count
+
+    return xyz, colors
+
+
+class PointCloudProcessor:
+    """Decode + voxelize step of the point-cloud stage, backed by a BufferPool.
+
+    The returned arrays are views into the pool and are overwritten by the
+    next frame, so copy anything that must outlive it.
+    """
+
+    def __init__(self, voxel_size=0.01, voxel_mode="centroid", pool=None):
+        self.voxel_size = voxel_size
+        self.voxel_mode = voxel_mode
+        self.pool = pool or BufferPool()
+
+    def decode(self, cloud, mask=None):
+        """Valid points of `cloud`, or those of `mask` (e.g. a cloud_filters.CloudFilter mask) when given."""
+        height, width = cloud.shape[:2]
+        if mask is None:
+            mask = valid_point_mask(cloud, out=self.pool.get("cloud.mask", (height, width), bool))
+        count = int(np.count_nonzero(mask))
+        return decode_xyzrgba(
+            cloud,
+            mask=mask,
+            out_xyz=self.pool.get("cloud.xyz", (count, 3), np.float32),
+            out_colors=self.pool.get("cloud.colors", (count, 3), np.uint8),
+        )
+
+    def downsample(self, xyz, colors):
+        return voxel_downsample(xyz, colors, self.voxel_size, mode=self.voxel_mode, pool=self.pool)
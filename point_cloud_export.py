@@ -0,0 +1,136 @@
+import os
+import time
+
+import numpy as np
+
+from recorder import AsyncWriter, SequentialNamer
+
+# Points serialized per write() call; bounds the temporary interleave buffer.
+EXPORT_CHUNK_POINTS = 1 << 16
+
+
+def _color_bytes(colors):
+    """uint8 RGB for a chunk of colors given as uint8 0-255 or float 0-1."""
+    if colors.dtype == np.uint8:
+        return colors
+    return np.clip(np.rint(colors * 255.0), 0, 255).astype(np.uint8)
+
+
+def _write_chunked(file, xyz, colors, record, fill):
+    """Interleave points into `record` rows chunk by chunk and stream them to `file`."""
+    chunk = np.empty(min(len(xyz), EXPORT_CHUNK_POINTS), dtype=record)
+    for start in range(0, len(xyz), EXPORT_CHUNK_POINTS):
+        stop = min(start + EXPORT_CHUNK_POINTS, len(xyz))
+        rows = chunk[:stop - start]
+        rows["xyz"] = xyz[start:stop]
+        if colors is not None:
+            fill(rows, _color_bytes(colors[start:stop]))
+        file.write(rows.data)
+
+
+def write_ply(path, xyz, colors=None):
+    """Binary little-endian PLY with float x/y/z and uchar red/green/blue."""
+    fields = [("xyz", "<f4", 3)]
+    properties = ["property float x", "property float y", "property float z"]
+    if colors is not None:
+        fields.append(("rgb", "u1", 3))
+        properties += ["property uchar red", "property uchar green", "property uchar blue"]
+    header = "\n".join(
+        ["ply", "format binary_little_endian 1.0", f"element vertex {len(xyz)}"]
+        + properties + ["end_header", ""]
+    )
+
+    def fill(rows, rgb):
+        rows["rgb"] = rgb
+
+    with open(path, "wb") as file:
+        file.write(header.encode("ascii"))
+        _write_chunked(file, xyz, colors, np.dtype(fields), fill)
+
+
+def write_pcd(path, xyz, colors=None):
+    """Binary PCD v0.7; colors go in the usual packed 0x00RRGGBB `rgb` field."""
+    fields = [("xyz", "<f4", 3)]
+    names, sizes, types, counts = "x y z", "4 4 4", "F F F", "1 1 1"
+    if colors is not None:
+        fields.append(("rgb", "<u4"))
+        names, sizes, types, counts = names + " rgb", sizes + " 4", types + " U", counts + " 1"
+    header = "\n".join([
+        "# .PCD v0.7 - Point Cloud Data file format",
+        "VERSION 0.7",
+        f"FIELDS {names}",
+        f"SIZE {sizes}",
+        f"TYPE {types}",
+        f"COUNT {counts}",
+        f"WIDTH {len(xyz)}",
+        "HEIGHT 1",
+        "VIEWPOINT 0 0 0 1 0 0 0",
+        f"POINTS {len(xyz)}",
+        "DATA binary",
+        "",
+    ])
+
+    def fill(rows, rgb):
+        packed = rows["rgb"]
+        packed[:] = rgb[:, 0]
+        packed <<= 8
+        packed |= rgb[:, 1]
+        packed <<= 8
+        packed |= rgb[:, 2]
+
+    with open(path, "wb") as file:
+        file.write(header.encode("ascii"))
+        _write_chunked(file, xyz, colors, np.dtype(fields), fill)
+
+
+def write_npz(path, xyz, colors=None):
+    """Compressed NPZ with `xyz` (float32) and `colors` (uint8 RGB); numpy streams each array into the zip."""
+    arrays = {"xyz": xyz}
+    if colors is not None:
+        arrays["colors"] = _color_bytes(colors)
+    np.savez_compressed(path, **arrays)
+
+
+EXPORT_FORMATS = {".ply": write_ply, ".pcd": write_pcd, ".npz": write_npz}
+
+
+class SnapshotExporter(AsyncWriter):
+    """Saves point-cloud snapshots on a background thread, in the format given by `extension`.
+
+    Snapshots are (xyz, colors) pairs the caller already owns, so they are
+    queued without another copy. With drop_when_full (the default) a slow
+    disk drops snapshots instead of stalling the camera; `every_n` > 0 asks
+    the caller to submit every Nth frame (see due()).
+    """
+
+    def __init__(self, directory, prefix="cloud", extension=".ply", every_n=0,
+                 queue_size=4, drop_when_full=True):
+        if extension not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown point cloud format: {extension}")
+        os.makedirs(directory, exist_ok=True)
+        self.namer = SequentialNamer(directory, prefix, extension)
+        self.write_cloud = EXPORT_FORMATS[extension]
+        self.every_n = every_n
+        self.frames_seen = 0
+        super().__init__(f"{prefix}-snapshots", queue_size, drop_when_full)
+
+    def due(self):
+        """Count a frame; True when continuous capture wants this one."""
+        self.frames_seen += 1
+        return self.every_n > 0 and self.frames_seen % self.every_n == 0
+
+    def snapshot(self, xyz, colors=None):
+        """Queue a cloud that nothing else will modify (copy pooled views before calling)."""
+        return self.submit((xyz, colors), copy=False)
+
+    def write(self, snapshot):
+        xyz, colors = snapshot
+        path = self.namer.next_path()
+        start = time.perf_counter()
+        self.write_cloud(path, xyz, colors)
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        megabytes = os.path.getsize(path) / 1e6
+        print(
+            f"{os.path.basename(path)}: {len(xyz)} nokta, {megabytes:.1f} MB, "
+            f"{len(xyz) / elapsed / 1e6:.2f} M nokta/s, {megabytes / elapsed:.1f} MB/s"
+        )
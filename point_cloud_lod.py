@@ -0,0 +1,147 @@
+import numpy as np
+
+from buffer_pool import BufferPool, pooled_empty
+from display import ImageRing
+
+DEFAULT_POINT_BUDGET = 150_000
+
+# Eye movements smaller than this (meters) count as the same view.
+VIEW_TOLERANCE = 0.05
+
+# 2^32 / golden ratio: (i * FIBONACCI_HASH) mod 2^32 spreads indices evenly over [0, 2^32).
+FIBONACCI_HASH = 2654435769
+
+SELECT_CHUNK = 1 << 15
+
+# Floats per point in a RenderBatch buffer: XYZ followed by RGBA.
+FLOATS_PER_POINT = 7
+
+
+def lod_select(xyz, budget, eye=(0.0, 0.0, 0.0), near=1.0, pool=None):
+    """Indices of at most `budget` points, dense close to `eye` and sparse far away.
+
+    A point's chance of being kept falls with its squared distance to the eye
+    (the rate its footprint on screen shrinks); everything inside `near` is
+    treated alike. Each point gets the key u_i * d_i^2 and the `budget`
+    smallest keys win, found with an in-place partition. u_i is a Fibonacci
+    hash of the point index, so a still scene keeps picking the same
+    points from frame to frame instead of flickering.
+    """
+    count = len(xyz)
+    indices = np.arange(count) if pool is None else pool.arange(count)
+    if count <= budget:
+        return indices
+
+    # Column by column: broadcasting over the short XYZ axis is several times slower.
+    keys = pooled_empty(pool, "lod.keys", count, np.float32)
+    axis_diff = pooled_empty(pool, "lod.axis_diff", count, np.float32)
+    for axis in range(3):
+        target = keys if axis == 0 else axis_diff
+        np.subtract(xyz[:, axis], np.float32(eye[axis]), out=target)
+        np.multiply(target, target, out=target)
+        if axis:
+            np.add(keys, axis_diff, out=keys)
+    np.maximum(keys, np.float32(near * near), out=keys)
+
+    jitter = pooled_empty(pool, "lod.jitter", count, np.int64)
+    np.multiply(indices, FIBONACCI_HASH, out=jitter)
+    np.bitwise_and(jitter, 0xFFFFFFFF, out=jitter)
+    np.multiply(keys, jitter, out=keys, casting="same_kind")
+
+    ranked = pooled_empty(pool, "lod.ranked", count, np.float32)
+    np.copyto(ranked, keys)
+    ranked.partition(budget - 1)
+    mask = pooled_empty(pool, "lod.mask", count, bool)
+    np.less_equal(keys, ranked[budget - 1], out=mask)
+
+    # Ties on the threshold may select a few extra points; they are cut below.
+    selected = pooled_empty(pool, "lod.selected", int(np.count_nonzero(mask)), np.int64)
+    filled = 0
+    for start in range(0, count, SELECT_CHUNK):
+        part = mask[start:start + SELECT_CHUNK]
+        found = int(np.count_nonzero(part))
+        np.compress(part, indices[start:start + SELECT_CHUNK], out=selected[filled:filled + found])
+        filled += found
+    return selected[:budget]
+
+
+class RenderBatch:
+    """Float32 positions and RGBA colors for one GLScatterPlotItem upload.
+
+    Both are contiguous views into a single ring buffer (positions first, then
+    colors), so OpenGL takes them without a conversion copy. The GUI releases
+    the batch once it stops displaying it.
+    """
+
+    __slots__ = ("pos", "color", "info", "key", "array", "_ring", "_index")
+
+    def __init__(self, ring, index, array):
+        self._ring = ring
+        self._index = index
+        self.array = array
+        self.pos = None
+        self.color = None
+        self.info = None
+        self.key = None
+
+    def fill(self, count, info, key):
+        self.pos = self.array[:count * 3].reshape(count, 3)
+        self.color = self.array[count * 3:count * FLOATS_PER_POINT].reshape(count, 4)
+        self.info = info
+        self.key = key
+        return self
+
+    def release(self):
+        if self._ring is not None:
+            self._ring.release(self._index)
+            self._ring = None
+
+
+class PointCloudLOD:
+    """Point-cloud stage side of the 3D view: budgeted selection into RenderBatch buffers.
+
+    The eye position comes from the GUI (set_eye); a frame is prepared again
+    only when its id, the budget or the quantized eye changed.
+    """
+
+    def __init__(self, budget=DEFAULT_POINT_BUDGET, near=1.0, ring_size=3, pool=None):
+        self.budget = budget
+        self.near = near
+        self.eye = np.zeros(3, dtype=np.float32)
+        self.ring = ImageRing(ring_size, item=RenderBatch)
+        self.pool = pool or BufferPool()
+        self.unchanged = 0
+        self._last_key = None
+
+    def set_eye(self, x, y, z):
+        # Swapped as a whole so the stage thread never sees a half-updated eye.
+        self.eye = np.array((x, y, z), dtype=np.float32)
+
+    @staticmethod
+    def view_key(eye):
+        return tuple(int(v) for v in np.round(eye / VIEW_TOLERANCE))
+
+    def prepare(self, xyz, colors, info):
+        """RenderBatch for this frame, or None if nothing changed or every buffer is on screen."""
+        eye = self.eye
+        key = (info.frame_id, self.budget, self.view_key(eye))
+        if key == self._last_key:
+            self.unchanged += 1
+            return None
+        batch = self.ring.acquire((self.budget * FLOATS_PER_POINT,), np.float32)
+        if batch is None:
+            return None
+
+        selected = lod_select(xyz, self.budget, eye, self.near, self.pool)
+        batch.fill(len(selected), info, key)
+        np.take(xyz, selected, axis=0, out=batch.pos, mode="clip")
+        if colors is None:
+            batch.color[:, :3] = 1.0
+        else:
+            picked = self.pool.get("lod.colors", (len(selected), 3), colors.dtype)
+            np.take(colors, selected, axis=0, out=picked, mode="clip")
+            scale = 1.0 / 255.0 if colors.dtype == np.uint8 else 1.0
+            np.multiply(picked, np.float32(scale), out=batch.color[:, :3])
+        batch.color[:, 3] = 1.0
+        self._last_key = key
+        return batch
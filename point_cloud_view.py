@@ -0,0 +1,77 @@
+import time
+
+import pyqtgraph.opengl as gl
+from PyQt5.QtCore import pyqtSignal
+
+from instrumentation import Profiler
+from point_cloud_lod import VIEW_TOLERANCE
+
+
+class PointCloudView(gl.GLViewWidget):
+    """3D view that displays RenderBatch uploads and reports how fast it redraws.
+
+    view_moved carries the eye position whenever the orbit camera moved more
+    than VIEW_TOLERANCE, so the point-cloud stage can refocus its level of
+    detail; render_stats is emitted about once per second. Uploads and paints
+    are timed on `profiler` (the camera thread's, set by the window), and a
+    newly uploaded frame's grab-to-screen latency is recorded once painted.
+    """
+
+    view_moved = pyqtSignal(float, float, float)
+    render_stats = pyqtSignal(dict)
+
+    def __init__(self, point_size=2, parent=None):
+        super().__init__(parent)
+        self.scatter = gl.GLScatterPlotItem(size=point_size, pxMode=True)
+        self.addItem(self.scatter)
+        self._shown = None
+        self._eye = None
+        self._paints = 0
+        self._uploads = 0
+        self._skipped = 0
+        self._window_start = time.monotonic()
+        self.profiler = Profiler(enabled=False)
+        self._unpainted_frame = None
+
+    def show_batch(self, batch):
+        """Upload a batch unless it matches the one on screen (same frame, budget and view)."""
+        if self._shown is not None and batch.key == self._shown.key:
+            self._skipped += 1
+            batch.release()
+            return
+        with self.profiler.span("gui.upload.cloud"):
+            self.scatter.setData(pos=batch.pos, color=batch.color)
+        if batch.info is not None:
+            self._unpainted_frame = batch.info.frame_id
+        # The scatter item keeps drawing from the previous buffer until now.
+        previous, self._shown = self._shown, batch
+        if previous is not None:
+            previous.release()
+        self._uploads += 1
+
+    def paintGL(self, *args, **kwargs):
+        with self.profiler.span("gui.paint.cloud"):
+            super().paintGL(*args, **kwargs)
+        self._paints += 1
+        if self._unpainted_frame is not None:
+            self.profiler.frame_shown("cloud", self._unpainted_frame)
+            self._unpainted_frame = None
+
+        eye = self.cameraPosition()
+        eye = (eye.x(), eye.y(), eye.z())
+        if self._eye is None or max(abs(a - b) for a, b in zip(eye, self._eye)) > VIEW_TOLERANCE:
+            self._eye = eye
+            self.view_moved.emit(*eye)
+
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.render_stats.emit({
+                "render_fps": self._paints / elapsed,
+                "uploads_per_s": self._uploads / elapsed,
+                "skipped_uploads": self._skipped,
+                "points": 0 if self._shown is None else len(self._shown.pos),
+            })
+            self._paints = 0
+            self._uploads = 0
+            self._window_start = now
@@ -0,0 +1,365 @@
+"""Point-cloud decode + voxelize in worker processes, with frames passed through shared memory.
+
+The point-cloud stage competes with the Qt GUI thread for the GIL; worker
+processes do not. Frames and results live in two `multiprocessing.shared_memory`
+blocks split into slots, so the queues only carry slot numbers and a few
+integers and no array is ever pickled:
+
+- submit() copies an XYZRGBA frame into a free input slot and queues its number
+  with the frame's size and voxel size;
+- a worker decodes (and voxelizes, or decimates in organized mode) the slot and
+  writes xyz / colors into the output slot with the same number;
+- a collector thread hands the output views to on_result(info, xyz, colors)
+  and frees the slot once the callback returns.
+
+With a cloud filter, each result also carries what the worker's filter
+removed and how long filtering and the rest of the frame took, so the
+parent can keep the filter statistics (on_filtered).
+
+delivery="ordered" delivers every processed frame in submission order;
+delivery="latest" only delivers frames newer than the last delivered one, and
+workers skip queued frames that are already stale.
+
+Each worker publishes the sequence number it is working on. A worker that
+dies mid-frame would otherwise stall ordered delivery forever, so the
+collector watches the processes, resolves the lost frame as SKIPPED and
+starts a replacement worker.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DELIVERY_MODES = ("ordered", "latest")
+
+# Result counts below zero mark frames that have no output.
+SKIPPED = -1
+FAILED = -2
+
+IDLE = -1
+# How often the collector checks that every worker is still alive
+WATCH_INTERVAL = 0.5
+
+
+class SlotLayout:
+    """Byte layout of the input (HxWx4 float32) and output (xyz float32, colors uint8) slots.
+
+    Slots are sized for the largest frame, height x width; a smaller frame
+    (a reduced depth resolution) fills the start of its slot. An output slot
+    holds one point per pixel, the most a frame can produce. Plain
+    attributes only, so it can be sent to the worker processes.
+    """
+
+    def __init__(self, slots, height, width):
+        self.slots = slots
+        self.height = height
+        self.width = width
+        self.points = height * width
+        self.input_bytes = self.points * 4 * 4
+        self.xyz_bytes = self.points * 3 * 4
+        self.output_bytes = self.xyz_bytes + self.points * 3
+
+    def input_view(self, buffer, slot, height=None, width=None):
+        shape = (height or self.height, width or self.width, 4)
+        return np.ndarray(shape, np.float32, buffer, slot * self.input_bytes)
+
+    def output_views(self, buffer, slot, count=None):
+        count = self.points if count is None else count
+        offset = slot * self.output_bytes
+        xyz = np.ndarray((count, 3), np.float32, buffer, offset)
+        colors = np.ndarray((count, 3), np.uint8, buffer, offset + self.xyz_bytes)
+        return xyz, colors
+
+
+def _worker_main(layout, input_name, output_name, tasks, results, latest, current, index,
+                 voxel_size, voxel_mode, cloud_filter):
+    # Imported here so that only the workers pay for them when the pool is used from a bare script
+    from cloud_filters import CloudFilter
+    from organized_cloud import OrganizedCloud
+    from point_cloud import PointCloudProcessor
+
+    def decode(cloud):
+        mask = cloud_filter.mask(cloud, processor.pool) if cloud_filter is not None else None
+        return processor.decode(cloud, mask)
+
+    def process(slot, stride, height, width):
+        start = time.perf_counter()
+        cloud = layout.input_view(inputs.buf, slot, height, width)
+        if stride:
+            xyz, colors = decode(OrganizedCloud(cloud, stride).cloud)
+            points = len(xyz)
+        else:
+            xyz, colors = decode(cloud)
+            points = len(xyz)
+            xyz, colors = processor.downsample(xyz, colors)
+        ms = 1000.0 * (time.perf_counter() - start)
+        out_xyz, out_colors = layout.output_views(outputs.buf, slot, len(xyz))
+        np.copyto(out_xyz, xyz)
+        np.copyto(out_colors, colors)
+        filtered = None
+        if cloud_filter is not None:
+            # (removed per filter, filter ms, surviving points, decode + reduce ms)
+            filtered = (cloud_filter.last_removed, cloud_filter.last_ms, points, ms - cloud_filter.last_ms)
+        return len(xyz), filtered
+
+    # Spawned workers share the parent's resource tracker, so attaching does not take ownership
+    inputs = shared_memory.SharedMemory(name=input_name)
+    outputs = shared_memory.SharedMemory(name=output_name)
+    processor = PointCloudProcessor(voxel_size, voxel_mode)
+    cloud_filter = CloudFilter(**cloud_filter) if cloud_filter else None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, seq, stride, height, width, voxel_size = task
+            current[index] = seq
+            if latest is not None and seq < latest.value:
+                results.put((slot, seq, SKIPPED, 0.0, None))
+                current[index] = IDLE
+                continue
+            start = time.perf_counter()
+            processor.voxel_size = voxel_size
+            try:
+                count, filtered = process(slot, stride, height, width)
+            except Exception as error:
+                print(f"point-cloud worker: kare {seq} işlenemedi: {error!r}")
+                count, filtered = FAILED, None
+            results.put((slot, seq, count, time.perf_counter() - start, filtered))
+            current[index] = IDLE
+    finally:
+        inputs.close()
+        outputs.close()
+
+
+class ProcessPointCloudPool:
+    """Worker processes that decode and voxelize HxW XYZRGBA frames from shared-memory slots.
+
+    submit() never blocks: with every slot in use the frame is dropped and
+    counted. on_result(info, xyz, colors) runs on the collector thread; the
+    arrays are views into shared memory that are only valid until it returns.
+    height x width is the largest frame size; smaller frames and a voxel
+    size per frame (voxel_size is the default) need no new workers.
+    cloud_filter: cloud_filters.CloudFilter settings each worker filters with
+    before decoding (None: valid points only). on_filtered(removed, filter_ms,
+    points, downstream_ms) then runs on the collector thread for every
+    processed frame, removed being the points each filter removed by name.
+    """
+
+    def __init__(self, height, width, workers=2, slots=None, delivery="ordered",
+                 voxel_size=0.01, voxel_mode="centroid", on_result=None, cloud_filter=None,
+                 on_filtered=None):
+        if delivery not in DELIVERY_MODES:
+            raise ValueError(f"Unknown delivery mode: {delivery}")
+        self.workers = workers
+        # One slot per worker, one queued behind them and one being filled
+        self.layout = SlotLayout(slots or workers + 2, height, width)
+        self.delivery = delivery
+        self.voxel_size = voxel_size
+        self.voxel_mode = voxel_mode
+        self.cloud_filter = cloud_filter
+        self.on_result = on_result
+        self.on_filtered = on_filtered
+        self._lock = threading.Lock()
+        self._free = deque(range(self.layout.slots))
+        self._infos = {}
+        self._slots = {}
+        self._ready = {}
+        self._seq = 0
+        self._next_seq = 0
+        self._processes = []
+        self._collector = None
+        self._stopping = False
+        self.submitted = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.stale = 0
+        self.failed = 0
+        self.lost = 0
+        self.restarts = 0
+        # Frames a worker actually processed and the time spent on them; skipped stale frames count in neither
+        self.processed = 0
+        self.worker_seconds = 0.0
+
+    def start(self):
+        layout = self.layout
+        self._context = context = multiprocessing.get_context("spawn")
+        self._inputs = shared_memory.SharedMemory(create=True, size=layout.slots * layout.input_bytes)
+        self._outputs = shared_memory.SharedMemory(create=True, size=layout.slots * layout.output_bytes)
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._latest = context.RawValue("q", 0) if self.delivery == "latest" else None
+        self._current = context.RawArray("q", [IDLE] * self.workers)
+        self._stopping = False
+        self._processes = [self._start_worker(index) for index in range(self.workers)]
+        self._collector = threading.Thread(target=self._collect, name="point-cloud-collector", daemon=True)
+        self._collector.start()
+        return self
+
+    def _start_worker(self, index):
+        process = self._context.Process(
+            target=_worker_main, name=f"point-cloud-{index}", daemon=True,
+            args=(self.layout, self._inputs.name, self._outputs.name, self._tasks, self._results,
+                  self._latest, self._current, index, self.voxel_size, self.voxel_mode, self.cloud_filter),
+        )
+        process.start()
+        return process
+
+    def submit(self, info, cloud, stride=0, voxel_size=None):
+        """Copy a frame into a free slot and queue it; stride > 0 decimates instead of voxelizing."""
+        height, width = cloud.shape[:2]
+        if cloud.shape[2:] != (4,) or height > self.layout.height or width > self.layout.width:
+            raise ValueError(f"Expected at most a {self.layout.height}x{self.layout.width}x4 point cloud")
+        with self._lock:
+            if not self._free:
+                self.dropped += 1
+                return False
+            slot = self._free.popleft()
+            seq = self._seq
+            self._seq += 1
+            self._infos[seq] = info
+            self._slots[seq] = slot
+            self.submitted += 1
+        np.copyto(self.layout.input_view(self._inputs.buf, slot, height, width), cloud)
+        self._tasks.put((slot, seq, stride, height, width, voxel_size or self.voxel_size))
+        return True
+
+    def _collect(self):
+        watched = time.monotonic()
+        while True:
+            try:
+                result = self._results.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                result = ()
+            if result is None:
+                break
+            if result:
+                self._handle(*result)
+            if time.monotonic() - watched >= WATCH_INTERVAL:
+                self._watch_workers()
+                watched = time.monotonic()
+
+    def _watch_workers(self):
+        """Replace dead workers; the frame a dead worker held is resolved as SKIPPED."""
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            with self._lock:
+                if self._stopping:
+                    return
+                seq = self._current[index]
+                self._current[index] = IDLE
+                print(f"point-cloud worker {index} durdu (çıkış kodu {process.exitcode}), yeniden başlatılıyor")
+                self.restarts += 1
+                self._processes[index] = self._start_worker(index)
+                # The result may have been queued just before the worker died
+                lost = seq != IDLE and seq in self._slots and seq not in self._ready
+                if lost:
+                    self.lost += 1
+            if lost:
+                self._handle(self._slots[seq], seq, SKIPPED, 0.0, None, lost=True)
+
+    def _handle(self, slot, seq, count, seconds, filtered, lost=False):
+        with self._lock:
+            if seq not in self._slots or seq in self._ready:
+                # Already resolved as lost when its worker died
+                return
+            if count != SKIPPED:
+                self.processed += 1
+                self.worker_seconds += seconds
+            if count == FAILED:
+                self.failed += 1
+            if self.delivery == "latest":
+                ready = []
+                if count == FAILED or lost:
+                    self._release(slot, seq)
+                elif count == SKIPPED or seq < self._next_seq:
+                    # A newer frame was delivered first
+                    self.stale += 1
+                    self._release(slot, seq)
+                else:
+                    ready.append((seq, slot, count))
+                    self._next_seq = seq + 1
+                    self._latest.value = seq
+            else:
+                self._ready[seq] = (slot, count)
+                ready = []
+                while self._next_seq in self._ready:
+                    next_slot, next_count = self._ready.pop(self._next_seq)
+                    ready.append((self._next_seq, next_slot, next_count))
+                    self._next_seq += 1
+        if filtered is not None and self.on_filtered is not None:
+            self.on_filtered(*filtered)
+        for seq, slot, count in ready:
+            self._deliver(slot, seq, count)
+    def _deliver(self, slot, seq, count):
+        try:
+            if count >= 0 and self.on_result is not None:
+                xyz, colors = self.layout.output_views(self._outputs.buf, slot, count)
+                self.on_result(self._infos[seq], xyz, colors)
+        finally:
+            with self._lock:
+                if count >= 0:
+                    self.delivered += 1
+                self._release(slot, seq)
+
+    def _release(self, slot, seq):
+        self._infos.pop(seq, None)
+        self._slots.pop(seq, None)
+        self._free.append(slot)
+
+    def pending(self):
+        with self._lock:
+            return self.layout.slots - len(self._free)
+
+    def stop(self, timeout=5.0):
+        """Finish the queued frames, stop the workers and free the shared memory."""
+        if self._collector is None:
+            return
+        with self._lock:
+            # No restarts from here on: a worker that exits now is just finishing
+            self._stopping = True
+            processes = list(self._processes)
+        for _ in processes:
+            self._tasks.put(None)
+        for process in processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._collector.join()
+        self._collector = None
+        self._tasks.close()
+        self._results.close()
+        for block in (self._inputs, self._outputs):
+            block.unlink()
+            try:
+                block.close()
+            except BufferError:
+                # A consumer still holds a result view; the mapping goes with it
+                pass
+
+    def worker_totals(self):
+        """(worker seconds, processed frames) so far; callers difference two readings for a window."""
+        with self._lock:
+            return self.worker_seconds, self.processed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "delivery": self.delivery,
+                "submitted": self.submitted,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "stale": self.stale,
+                "failed": self.failed,
+                "lost": self.lost,
+                "restarts": self.restarts,
+                "processed": self.processed,
+                "worker_ms": 1000 * self.worker_seconds / max(self.processed, 1),
+            }
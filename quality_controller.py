@@ -0,0 +1,171 @@
+"""Feedback controller that trades quality for frame rate within user-set bounds.
+
+Every knob has a best and a worst value. Quality levels run from 0 (every
+knob at its best) to levels - 1 (every knob at its worst), spaced
+geometrically, so one step costs about the same at either end of the range.
+
+Once per stats window the caller reports the slowest stage's time per
+processed frame. The controller steps one level towards faster when that
+exceeds the frame budget (1000 / target_fps) and one level towards better
+when there is clear headroom. Hysteresis keeps it from oscillating:
+
+- a dead band between the degrade and improve thresholds;
+- several windows in a row must agree before a step;
+- after a step, `cooldown` windows are ignored while stages catch up;
+- a level that turns out too slow again soon after stepping up to it
+  needs twice as many calm windows before the next try.
+"""
+import time
+from collections import deque, namedtuple
+
+Knob = namedtuple("Knob", ["name", "best", "worst", "integer"])
+
+DEFAULT_KNOBS = (
+    Knob("voxel_size", 0.01, 0.04, False),
+    Knob("cloud_stride", 2, 6, True),
+    Knob("display_scale", 1.0, 0.5, False),
+    Knob("depth_scale", 1.0, 0.5, False),
+)
+
+# Level changes kept in QualityController.decisions
+DECISION_HISTORY = 64
+
+
+def knobs_from_bounds(bounds, defaults=DEFAULT_KNOBS):
+    """Override the (best, worst) pair of the default knobs from a {name: [best, worst]} mapping."""
+    return tuple(
+        knob._replace(best=bounds[knob.name][0], worst=bounds[knob.name][1]) if knob.name in bounds else knob
+        for knob in defaults
+    )
+
+
+class QualityController:
+    """Holds a target frame rate by moving every knob one quality level at a time.
+
+    target_fps = 0 disables the loop and keeps the current level; set_level()
+    pins a level by hand (None goes back to automatic).
+    """
+
+    def __init__(self, target_fps=0, knobs=DEFAULT_KNOBS, levels=6, degrade_above=1.0, improve_below=0.7,
+                 patience=2, improve_patience=3, cooldown=1, probe_windows=10, log=print):
+        if not 0 < improve_below < degrade_above:
+            raise ValueError("improve_below must be below degrade_above")
+        self.knobs = tuple(knobs)
+        self.levels = max(2, levels)
+        self.target_fps = target_fps
+        self.degrade_above = degrade_above
+        self.improve_below = improve_below
+        self.patience = patience
+        self.improve_patience = improve_patience
+        self.cooldown = cooldown
+        self.probe_windows = probe_windows
+        self.log = log
+        self.level = 0
+        self.pinned = None
+        # Only the recent decisions are kept; `changes` counts all of them
+        self.decisions = deque(maxlen=DECISION_HISTORY)
+        self.changes = 0
+        self._over = 0
+        self._under = 0
+        self._cooling = 0
+        # Calm windows needed to step up to a level, doubled each time it proved too slow
+        self._backoff = {}
+        self._windows_at_level = 0
+        self._stepped_up = False
+        self.last_load_ms = None
+
+    @property
+    def budget_ms(self):
+        return 1000.0 / self.target_fps if self.target_fps > 0 else None
+
+    def settings(self, level=None):
+        level = self.level if level is None else level
+        fraction = level / (self.levels - 1)
+        settings = {}
+        for knob in self.knobs:
+            value = knob.best * (knob.worst / knob.best) ** fraction
+            settings[knob.name] = int(round(value)) if knob.integer else value
+        return settings
+
+    def set_target(self, fps):
+        self.target_fps = max(0.0, fps)
+        self._reset_counters()
+
+    def set_level(self, level):
+        """Pin a quality level (0 = best); None hands control back to the loop."""
+        self.pinned = None if level is None else min(max(0, level), self.levels - 1)
+        if self.pinned is not None and self.pinned != self.level:
+            self._step(self.pinned, "pinned", self.last_load_ms)
+            return self.settings()
+        return None
+
+    def _reset_counters(self):
+        self._over = self._under = 0
+
+    def update(self, load_ms):
+        """Feed one window's slowest-stage ms per frame; returns the new settings after a step, else None."""
+        self.last_load_ms = load_ms
+        budget = self.budget_ms
+        if budget is None or self.pinned is not None or load_ms is None:
+            return None
+        self._windows_at_level += 1
+        if self._cooling > 0:
+            self._cooling -= 1
+            return None
+        if load_ms > budget * self.degrade_above:
+            self._over += 1
+            self._under = 0
+        elif load_ms < budget * self.improve_below:
+            self._under += 1
+            self._over = 0
+        else:
+            self._reset_counters()
+
+        if self._over >= self.patience and self.level < self.levels - 1:
+            if self._stepped_up and self._windows_at_level <= self.probe_windows:
+                # Just came up to this level and it is too slow again
+                self._backoff[self.level] = 2 * self._backoff.get(self.level, self.improve_patience)
+            self._step(self.level + 1, "over budget", load_ms)
+            return self.settings()
+        if self._under >= self._backoff.get(self.level - 1, self.improve_patience) and self.level > 0:
+            self._step(self.level - 1, "headroom", load_ms)
+            return self.settings()
+        return None
+
+    def _step(self, level, reason, load_ms):
+        decision = {
+            "time": time.time(),
+            "from": self.level,
+            "to": level,
+            "reason": reason,
+            "load_ms": load_ms,
+            "budget_ms": self.budget_ms,
+        }
+        self.decisions.append(decision)
+        self.changes += 1
+        self._stepped_up = level < self.level
+        self._windows_at_level = 0
+        self.level = level
+        self._reset_counters()
+        self._cooling = self.cooldown
+        if self.log is not None:
+            load = "-" if load_ms is None else f"{load_ms:.1f}"
+            budget = "-" if self.budget_ms is None else f"{self.budget_ms:.1f}"
+            self.log(f"kalite: seviye {decision['from']} -> {level} ({reason}, {load} ms / hedef {budget} ms) {self.describe()}")
+
+    def describe(self, settings=None):
+        settings = self.settings() if settings is None else settings
+        return (
+            f"voxel {100 * settings['voxel_size']:.1f} cm, stride {settings['cloud_stride']}, "
+            f"display {100 * settings['display_scale']:.0f}%, depth {100 * settings['depth_scale']:.0f}%"
+        )
+
+    def stats(self):
+        return {
+            "level": self.level,
+            "auto": self.pinned is None and self.target_fps > 0,
+            "target_fps": self.target_fps,
+            "load_ms": self.last_load_ms,
+            "changes": self.changes,
+            "settings": self.settings(),
+        }
@@ -0,0 +1,169 @@
+import os
+import queue
+import re
+import threading
+
+import cv2
+
+
+class SequentialNamer:
+    """Hands out `<prefix>_<n><ext>` paths from a counter instead of scanning the folder.
+
+    The directory is scanned once at start-up so an existing session is continued
+    without overwriting files.
+    """
+
+    def __init__(self, directory, prefix, extension):
+        self.directory = directory
+        self.prefix = prefix
+        self.extension = extension
+        self._next = self._first_free_index()
+
+    def _first_free_index(self):
+        pattern = re.compile(rf"^{re.escape(self.prefix)}_(\d+){re.escape(self.extension)}$")
+        indices = [
+            int(match.group(1))
+            for match in map(pattern.match, os.listdir(self.directory))
+            if match
+        ]
+        return max(indices) + 1 if indices else 0
+
+    def next_path(self):
+        path = os.path.join(self.directory, f"{self.prefix}_{self._next}{self.extension}")
+        self._next += 1
+        return path
+
+
+def image_write_params(extension, png_compression=3, jpeg_quality=95):
+    """cv2.imwrite parameters for the configured PNG compression / JPEG quality."""
+    if extension.lower() == ".png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+    if extension.lower() in (".jpg", ".jpeg"):
+        return [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+    return []
+
+
+class AsyncWriter(threading.Thread):
+    """Writes frames on a background thread behind a bounded queue.
+
+    When the queue is full, `submit` either blocks (drop_when_full=False) or
+    discards the frame and counts it as dropped. A frame whose write() raises
+    (disk full, bad path, encoder failure) is counted in `errors`, the last
+    exception kept in `error`, and the thread goes on draining the queue, so
+    a failing writer never leaves submit() or close() blocked.
+    """
+
+    def __init__(self, name, queue_size=32, drop_when_full=False):
+        super().__init__(name=name, daemon=True)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.drop_when_full = drop_when_full
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.error = None
+        self.high_water = 0
+        self.start()
+
+    def write(self, frame):
+        raise NotImplementedError
+
+    def finish(self):
+        """Called on the writer thread after the last frame."""
+
+    def accepting(self):
+        """False when submit() would drop the frame, so callers can skip preparing it."""
+        return not (self.drop_when_full and self._queue.full())
+
+    def submit(self, frame, copy=True):
+        """Queue a frame; the SDK reuses its buffers, so it is copied unless copy=False."""
+        if (self.drop_when_full and self._queue.full()) or not self.is_alive():
+            self.dropped += 1
+            return False
+        self._queue.put(frame.copy() if copy else frame)
+        self.high_water = max(self.high_water, self._queue.qsize())
+        return True
+
+    def run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            try:
+                self.write(frame)
+                self.written += 1
+            except Exception as error:
+                self._failed(error)
+        try:
+            self.finish()
+        except Exception as error:
+            self._failed(error)
+
+    def _failed(self, error):
+        # Yalnızca ilk hata yazdırılır; sonrakiler sayılır
+        if self.error is None:
+            print(f"{self.name}: yazılamadı: {error!r}")
+        self.errors += 1
+        self.error = error
+
+    def close(self):
+        if self.is_alive():
+            self._queue.put(None)
+        self.join()
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "errors": self.errors,
+                "high_water": self.high_water}
+
+
+class ImageSequenceWriter(AsyncWriter):
+    def __init__(self, directory, prefix, extension=".png", png_compression=3,
+                 jpeg_quality=95, queue_size=32, drop_when_full=False):
+        self.namer = SequentialNamer(directory, prefix, extension)
+        self.params = image_write_params(extension, png_compression, jpeg_quality)
+        super().__init__(f"{prefix}-images", queue_size, drop_when_full)
+
+    def write(self, frame):
+        cv2.imwrite(self.namer.next_path(), frame, self.params)
+
+
+class VideoFileWriter(AsyncWriter):
+    def __init__(self, path, fps, size, fourcc="XVID", queue_size=32, drop_when_full=False):
+        self.path = path
+        self.capture = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        super().__init__(os.path.basename(path), queue_size, drop_when_full)
+
+    def write(self, frame):
+        self.capture.write(frame)
+
+    def finish(self):
+        self.capture.release()
+
+
+class Recorder:
+    """Group of named AsyncWriters that are closed and reported together."""
+
+    def __init__(self):
+        self.writers = {}
+
+    def add(self, name, writer):
+        self.writers[name] = writer
+        return writer
+
+    def submit(self, name, frame, copy=True):
+        return self.writers[name].submit(frame, copy)
+
+    def __contains__(self, name):
+        return name in self.writers
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.report()
+
+    def report(self):
+        for name, writer in self.writers.items():
+            stats = writer.stats()
+            print(
+                f"{name}: {stats['written']} yazıldı, {stats['dropped']} atlandı, "
+                f"{stats.get('errors', 0)} hata, kuyruk en yüksek {stats['high_water']}"
+            )
@@ -0,0 +1,188 @@
+import numpy as np
+
+from buffer_pool import BufferPool
+from voxel_grid import voxel_centroids
+
+# Packed voxel key: 21 bits per axis, offset so that negative coordinates stay positive.
+KEY_BITS = 21
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+
+# Per voxel: mean xyz and color (float32), hit count, last seen frame, key,
+# and its (key, slot) entry in the sorted index.
+BYTES_PER_VOXEL = 3 * 4 + 3 * 4 + 4 + 4 + 8 + 16
+
+
+def pack_keys(voxel_ids):
+    """(V, 3) integer voxel coordinates -> one int64 per voxel, ordered like the rows."""
+    packed = voxel_ids[:, 0] + KEY_OFFSET
+    for axis in (1, 2):
+        np.left_shift(packed, KEY_BITS, out=packed)
+        np.bitwise_or(packed, voxel_ids[:, axis] + KEY_OFFSET, out=packed)
+    return packed
+
+
+class SceneMap:
+    """Sparse voxel map fused from successive point clouds.
+
+    Voxels live in compact arrays (one row per voxel), so the render/export
+    set is a view of the first `size` rows and never has to be rebuilt. A
+    sorted (key, row) index finds the voxels a frame touches with one
+    searchsorted, and each frame updates only those:
+
+    - position and color are running means whose weight is capped at
+      `max_weight`, so stale observations fade once the scene changes;
+    - voxels not seen for `max_age` frames are evicted (checked every
+      `evict_interval` frames);
+    - at most `max_memory_mb` of voxel data is kept; when the map is full
+      the least recently seen voxels make room for new ones.
+
+    Points are fused in the frame they are given in; pass a 4x4
+    camera-to-world pose to integrate() when the camera moves.
+    """
+
+    def __init__(self, voxel_size=0.02, max_age=300, max_weight=50, max_memory_mb=256,
+                 evict_interval=10, pool=None):
+        self.voxel_size = voxel_size
+        self.max_age = max_age
+        self.max_weight = max_weight
+        self.evict_interval = evict_interval
+        self.capacity = max(1, int(max_memory_mb * 1e6) // BYTES_PER_VOXEL)
+        self.pool = pool or BufferPool()
+        self.reset()
+
+    def reset(self):
+        capacity = self.capacity
+        self.xyz = np.empty((capacity, 3), dtype=np.float32)
+        self.colors = np.empty((capacity, 3), dtype=np.float32)
+        self.hits = np.zeros(capacity, dtype=np.uint32)
+        self.last_seen = np.zeros(capacity, dtype=np.int32)
+        self.slot_keys = np.empty(capacity, dtype=np.int64)
+        self._index_keys = np.empty(0, dtype=np.int64)
+        self._index_slots = np.empty(0, dtype=np.int64)
+        self.size = 0
+        self.frame = 0
+        self.evicted = 0
+
+    @property
+    def nbytes(self):
+        return self.size * BYTES_PER_VOXEL
+
+    def integrate(self, xyz, colors=None, pose=None):
+        """Fuse one cloud (colors uint8 0-255 or float 0-1) into the map."""
+        self.frame += 1
+        if pose is not None:
+            world = self.pool.get("map.world", xyz.shape, np.float32)
+            np.matmul(xyz, np.asarray(pose[:3, :3], dtype=np.float32).T, out=world)
+            np.add(world, np.asarray(pose[:3, 3], dtype=np.float32), out=world)
+            xyz = world
+
+        voxel_ids, _, mean_xyz, mean_colors = voxel_centroids(xyz, colors, self.voxel_size, pool=self.pool)
+        if mean_colors is None:
+            mean_colors = np.ones_like(mean_xyz)
+        elif colors.dtype == np.uint8:
+            np.multiply(mean_colors, 1.0 / 255.0, out=mean_colors)
+
+        if voxel_ids.size and (voxel_ids.min() <= -KEY_OFFSET or voxel_ids.max() >= KEY_OFFSET):
+            in_range = (np.abs(voxel_ids) < KEY_OFFSET).all(axis=1)
+            voxel_ids, mean_xyz, mean_colors = voxel_ids[in_range], mean_xyz[in_range], mean_colors[in_range]
+        keys = pack_keys(voxel_ids)
+
+        found, pos = self._lookup(keys)
+        new_count = len(keys) - int(np.count_nonzero(found))
+        if self.size + new_count > self.capacity:
+            # Make room with some slack so a full map does not evict on every frame.
+            self._evict_oldest(self.size + new_count - self.capacity + self.capacity // 20)
+            found, pos = self._lookup(keys)
+
+        self._update(self._index_slots[pos[found]], mean_xyz[found], mean_colors[found])
+        new = ~found
+        if new.any():
+            self._insert(keys[new], pos[new], mean_xyz[new], mean_colors[new])
+
+        if self.frame % self.evict_interval == 0:
+            self.evict_stale()
+
+    def _lookup(self, keys):
+        pos = np.searchsorted(self._index_keys, keys)
+        found = pos < len(self._index_keys)
+        found[found] = self._index_keys[pos[found]] == keys[found]
+        return found, pos
+
+    def _update(self, slots, mean_xyz, mean_colors):
+        hits = self.hits[slots]
+        rate = np.minimum(hits, self.max_weight).astype(np.float32)
+        rate += 1.0
+        np.reciprocal(rate, out=rate)
+        rate = rate[:, None]
+        for values, observed in ((self.xyz, mean_xyz), (self.colors, mean_colors)):
+            current = values[slots]
+            # current += (observed - current) * rate, gathered and scattered once
+            delta = np.subtract(observed, current, dtype=np.float32)
+            delta *= rate
+            current += delta
+            values[slots] = current
+        hits += 1
+        self.hits[slots] = hits
+        self.last_seen[slots] = self.frame
+
+    def _insert(self, keys, pos, mean_xyz, mean_colors):
+        count = min(len(keys), self.capacity - self.size)
+        if count < len(keys):
+            keys, pos, mean_xyz, mean_colors = keys[:count], pos[:count], mean_xyz[:count], mean_colors[:count]
+        slots = np.arange(self.size, self.size + count)
+        self.xyz[slots] = mean_xyz
+        self.colors[slots] = mean_colors
+        self.hits[slots] = 1
+        self.last_seen[slots] = self.frame
+        self.slot_keys[slots] = keys
+        # pos comes from the index before insertion, which is what np.insert expects.
+        self._index_keys = np.insert(self._index_keys, pos, keys)
+        self._index_slots = np.insert(self._index_slots, pos, slots)
+        self.size += count
+
+    def evict_stale(self):
+        """Drop voxels that have not been seen for more than max_age frames."""
+        age = self.frame - self.last_seen[:self.size]
+        self._remove(np.flatnonzero(age > self.max_age))
+
+    def _evict_oldest(self, count):
+        count = min(count, self.size)
+        if count > 0:
+            self._remove(np.argpartition(self.last_seen[:self.size], count - 1)[:count])
+
+    def _remove(self, slots):
+        if len(slots) == 0:
+            return
+        slots = np.unique(slots)
+        keep = np.ones(len(self._index_keys), dtype=bool)
+        keep[np.searchsorted(self._index_keys, self.slot_keys[slots])] = False
+        self._index_keys = self._index_keys[keep]
+        self._index_slots = self._index_slots[keep]
+
+        # Keep the rows compact: live voxels from the tail move into the holes.
+        new_size = self.size - len(slots)
+        holes = slots[slots < new_size]
+        tail = np.arange(new_size, self.size)
+        movers = tail[~np.isin(tail, slots, assume_unique=True)]
+        for values in (self.xyz, self.colors, self.hits, self.last_seen, self.slot_keys):
+            values[holes] = values[movers]
+        self._index_slots[np.searchsorted(self._index_keys, self.slot_keys[holes])] = holes
+        self.size = new_size
+        self.evicted += len(slots)
+
+    def render_set(self):
+        """(xyz, colors 0-1) of every voxel in the map: float32 views, valid until the next integrate()."""
+        return self.xyz[:self.size], self.colors[:self.size]
+
+    def export_set(self):
+        """render_set() plus the hit count of every voxel."""
+        xyz, colors = self.render_set()
+        return xyz, colors, self.hits[:self.size]
+
+    def stats(self):
+        return {
+            "voxels": self.size,
+            "megabytes": self.nbytes / 1e6,
+            "evicted": self.evicted,
+            "frames": self.frame,
+        }
@@ -0,0 +1,340 @@
+"""CPU stereo depth for recorded left/right pairs, without the ZED SDK or a GPU.
+
+Images from the ZED (frame sequences, stereo AVIs, .zcap recordings) are
+already rectified, so depth only needs the left camera intrinsics and the
+baseline: depth = fx * baseline / disparity.
+
+Disparity comes from OpenCV SGBM (or block matching), computed as horizontal
+strips on a thread pool. OpenCV releases the GIL inside compute(), so the
+strips run on all cores; each strip is matched with `overlap` extra rows on
+both sides so the seams match the full-frame result.
+
+Outputs use the layouts the rest of the code expects: float32 HxW depth in
+meters (NaN where unknown), and HxWx4 XYZRGBA clouds with the color packed
+like MEASURE.XYZRGBA, ready for point_cloud.decode_xyzrgba.
+"""
+import argparse
+import configparser
+import glob
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from point_cloud import COLOR_CHANNELS, decode_xyzrgba
+from point_cloud_export import write_ply
+from recorder import AsyncWriter
+
+ALGORITHMS = ("sgbm", "bm")
+
+# Section suffix of each resolution in a ZED calibration file (SN<serial>.conf)
+ZED_CONF_SECTIONS = {"HD2K": "2K", "HD1080": "FHD", "HD720": "HD", "VGA": "VGA"}
+ZED_RESOLUTIONS = {"HD2K": (2208, 1242), "HD1080": (1920, 1080), "HD720": (1280, 720), "VGA": (672, 376)}
+
+
+class StereoCalibration:
+    """Rectified pinhole camera: left intrinsics in pixels and the baseline in meters."""
+
+    def __init__(self, fx, fy, cx, cy, baseline, width=None, height=None):
+        self.fx = fx
+        self.fy = fy
+        self.cx = cx
+        self.cy = cy
+        self.baseline = baseline
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_file(cls, path, resolution="HD720"):
+        """JSON ({"fx", "fy", "cx", "cy", "baseline", "width", "height"}) or a ZED SN<serial>.conf file."""
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as handle:
+                values = json.load(handle)
+            return cls(**{key: values[key] for key in ("fx", "fy", "cx", "cy", "baseline", "width", "height")
+                          if key in values})
+        # ZED calibration: [LEFT_CAM_<res>] fx/fy/cx/cy in pixels, [STEREO] Baseline in millimeters
+        conf = configparser.ConfigParser()
+        conf.read(path)
+        left = conf[f"LEFT_CAM_{ZED_CONF_SECTIONS[resolution]}"]
+        width, height = ZED_RESOLUTIONS[resolution]
+        return cls(float(left["fx"]), float(left["fy"]), float(left["cx"]), float(left["cy"]),
+                   float(conf["STEREO"]["Baseline"]) / 1000.0, width, height)
+
+    def scaled(self, width, height):
+        """The same camera for images of another size (e.g. a downscaled recording)."""
+        if self.width is None or (self.width, self.height) == (width, height):
+            return self
+        sx, sy = width / self.width, height / self.height
+        return StereoCalibration(self.fx * sx, self.fy * sy, self.cx * sx, self.cy * sy, self.baseline, width, height)
+
+
+def strip_bounds(height, strips, overlap):
+    """(top, bottom, padded_top, padded_bottom) rows of each strip; the padding is matched, not kept."""
+    step = math.ceil(height / max(1, strips))
+    return [
+        (top, min(top + step, height), max(0, top - overlap), min(height, top + step + overlap))
+        for top in range(0, height, step)
+    ]
+
+
+def to_gray(image):
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+
+def xyzrgba_from_depth(depth, image, calibration, out=None):
+    """HxWx4 XYZRGBA cloud from depth and the left image (BGR/BGRA), NaN where depth is unknown."""
+    height, width = depth.shape
+    cloud = np.empty((height, width, 4), np.float32) if out is None else out
+    u = (np.arange(width, dtype=np.float32) - calibration.cx) / calibration.fx
+    v = (np.arange(height, dtype=np.float32) - calibration.cy) / calibration.fy
+    np.multiply(depth, u[None, :], out=cloud[..., 0])
+    np.multiply(depth, v[:, None], out=cloud[..., 1])
+    cloud[..., 2] = depth
+    # Same byte order as the SDK's packed float: R, G, B, A
+    rgba = np.empty((height, width, 4), np.uint8)
+    rgba[..., COLOR_CHANNELS["r"]] = image[..., 2]
+    rgba[..., COLOR_CHANNELS["g"]] = image[..., 1]
+    rgba[..., COLOR_CHANNELS["b"]] = image[..., 0]
+    rgba[..., COLOR_CHANNELS["a"]] = 255
+    cloud[..., 3] = rgba.view(np.float32)[..., 0]
+    return cloud
+
+
+class StereoMatcher:
+    """Strip-parallel SGBM / block matching on rectified pairs.
+
+    strips defaults to twice the worker count so a slow strip does not leave
+    the other cores idle at the end of a frame.
+    """
+
+    def __init__(self, calibration, algorithm="sgbm", num_disparities=128, block_size=5, workers=None,
+                 strips=None, overlap=16, min_depth=0.3, max_depth=20.0):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown stereo algorithm: {algorithm}")
+        self.calibration = calibration
+        self.algorithm = algorithm
+        # Both matchers want a multiple of 16; block matching also an odd block of at least 5
+        self.num_disparities = max(16, int(math.ceil(num_disparities / 16)) * 16)
+        self.block_size = block_size if algorithm == "sgbm" else max(5, block_size | 1)
+        self.workers = workers or os.cpu_count() or 1
+        self.strips = strips or 2 * self.workers
+        self.overlap = overlap
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="stereo-strip")
+        self.pairs = 0
+        self.seconds = 0.0
+
+    def _create(self):
+        if self.algorithm == "bm":
+            return cv2.StereoBM_create(self.num_disparities, self.block_size)
+        area = self.block_size * self.block_size
+        return cv2.StereoSGBM_create(
+            minDisparity=0, numDisparities=self.num_disparities, blockSize=self.block_size,
+            P1=8 * area, P2=32 * area, disp12MaxDiff=1, uniquenessRatio=10,
+            speckleWindowSize=100, speckleRange=2, mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY,
+        )
+
+    def _match_strip(self, left, right, disparity, bounds):
+        top, bottom, padded_top, padded_bottom = bounds
+        # A matcher per call: creating one is cheap and they are not safe to share between threads
+        strip = self._create().compute(left[padded_top:padded_bottom], right[padded_top:padded_bottom])
+        # Fixed point, 4 fractional bits; invalid pixels come out negative
+        np.multiply(strip[top - padded_top:bottom - padded_top], np.float32(1 / 16), out=disparity[top:bottom])
+
+    def disparity(self, left, right):
+        """float32 HxW disparity in pixels (<= 0 where unmatched)."""
+        left, right = to_gray(left), to_gray(right)
+        height, width = left.shape
+        disparity = np.empty((height, width), np.float32)
+        bounds = strip_bounds(height, self.strips, self.overlap)
+        list(self._executor.map(lambda strip: self._match_strip(left, right, disparity, strip), bounds))
+        return disparity
+
+    def depth(self, left, right):
+        """float32 HxW depth in meters, NaN where unmatched or outside [min_depth, max_depth]."""
+        start = time.perf_counter()
+        disparity = self.disparity(left, right)
+        calibration = self.calibration.scaled(disparity.shape[1], disparity.shape[0])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            depth = np.float32(calibration.fx * calibration.baseline) / disparity
+        depth[~((disparity > 0) & (depth >= self.min_depth) & (depth <= self.max_depth))] = np.nan
+        self.pairs += 1
+        self.seconds += time.perf_counter() - start
+        return depth
+
+    def cloud(self, left, right):
+        """(depth, HxWx4 XYZRGBA cloud) of a pair."""
+        depth = self.depth(left, right)
+        calibration = self.calibration.scaled(depth.shape[1], depth.shape[0])
+        return depth, xyzrgba_from_depth(depth, left, calibration)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def stats(self):
+        return {"pairs": self.pairs, "pairs_per_s": self.pairs / max(self.seconds, 1e-9), "workers": self.workers}
+
+
+def _indexed(paths, prefix):
+    pattern = re.compile(rf"^{re.escape(prefix)}_(\d+)\.\w+$")
+    return {
+        int(match.group(1)): path
+        for path, match in ((path, pattern.match(os.path.basename(path))) for path in paths)
+        if match
+    }
+
+
+def iter_pairs(path):
+    """(label, left, right) for a capture directory, a leftCamera AVI or a .zcap recording.
+
+    A directory yields its left/Left_<n> + right/Right_<n> images, then the
+    frames of every video/leftCamera_<n>.avi + rightCamera_<n>.avi pair.
+    """
+    if path.endswith(".zcap"):
+        from capture_file import CaptureReader
+
+        reader = CaptureReader(path)
+        try:
+            for index in range(len(reader)):
+                frame = reader[index]
+                yield str(index), np.asarray(frame["left"]), np.asarray(frame["right"])
+        finally:
+            reader.close()
+        return
+    if path.endswith(".avi"):
+        yield from _iter_video_pair(path, path.replace("leftCamera", "rightCamera"))
+        return
+
+    lefts = _indexed(glob.glob(os.path.join(path, "left", "*")), "Left")
+    rights = _indexed(glob.glob(os.path.join(path, "right", "*")), "Right")
+    for index in sorted(lefts.keys() & rights.keys()):
+        left = cv2.imread(lefts[index], cv2.IMREAD_UNCHANGED)
+        right = cv2.imread(rights[index], cv2.IMREAD_UNCHANGED)
+        if left is not None and right is not None:
+            yield str(index), left, right
+    for left_path in sorted(glob.glob(os.path.join(path, "video", "leftCamera_*.avi"))):
+        yield from _iter_video_pair(left_path, left_path.replace("leftCamera", "rightCamera"))
+
+
+def _iter_video_pair(left_path, right_path):
+    name = os.path.splitext(os.path.basename(left_path))[0].replace("leftCamera", "video")
+    left_video, right_video = cv2.VideoCapture(left_path), cv2.VideoCapture(right_path)
+    index = 0
+    try:
+        while True:
+            ok_left, left = left_video.read()
+            ok_right, right = right_video.read()
+            if not (ok_left and ok_right):
+                break
+            yield f"{name}_{index}", left, right
+            index += 1
+    finally:
+        left_video.release()
+        right_video.release()
+
+
+class StereoOutputWriter(AsyncWriter):
+    """Writes Depth_<label>.png (16-bit millimeters, 0 = unknown) and optionally Cloud_<label>.ply."""
+
+    def __init__(self, directory, clouds=False, queue_size=8):
+        self.directory = directory
+        self.clouds = clouds
+        os.makedirs(os.path.join(directory, "depth"), exist_ok=True)
+        if clouds:
+            os.makedirs(os.path.join(directory, "cloud"), exist_ok=True)
+        super().__init__("stereo-output", queue_size)
+
+    def write(self, item):
+        label, depth, cloud = item
+        millimeters = np.nan_to_num(depth * 1000.0, nan=0.0)
+        cv2.imwrite(os.path.join(self.directory, "depth", f"Depth_{label}.png"),
+                    np.clip(millimeters, 0, 65535).astype(np.uint16))
+        if cloud is not None:
+            xyz, colors = decode_xyzrgba(cloud)
+            write_ply(os.path.join(self.directory, "cloud", f"Cloud_{label}.ply"), xyz, colors)
+
+
+def throughput_report(pairs, calibration, core_counts, **matcher_options):
+    """pairs/s of the same in-memory pairs for each worker count (no reading or writing)."""
+    print(f"{len(pairs)} çift, {pairs[0][1].shape[1]}x{pairs[0][1].shape[0]}:")
+    baseline = None
+    for cores in core_counts:
+        matcher = StereoMatcher(calibration, workers=cores, **matcher_options)
+        matcher.depth(pairs[0][1], pairs[0][2])  # warm-up
+        start = time.perf_counter()
+        for _, left, right in pairs:
+            matcher.depth(left, right)
+        rate = len(pairs) / (time.perf_counter() - start)
+        matcher.close()
+        baseline = baseline or rate
+        print(f"  {cores:3d} çekirdek: {rate:6.2f} çift/s  (x{rate / baseline:.2f})")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Kayıtlı sol/sağ görüntülerden CPU ile derinlik ve nokta bulutu")
+    parser.add_argument("input", type=str, help="Kayıt klasörü (images/<gün-ay-yıl>), leftCamera_<n>.avi ya da .zcap")
+    parser.add_argument("--calibration", type=str, required=True, help="Kalibrasyon: .json ya da ZED SN<seri>.conf")
+    parser.add_argument("--resolution", type=str, choices=list(ZED_CONF_SECTIONS), default="HD720",
+                        help="ZED .conf dosyasından okunacak çözünürlük")
+    parser.add_argument("--output", type=str, default=None, help="Çıktı klasörü (Varsayılan: <input>/stereo)")
+    parser.add_argument("--algorithm", type=str, choices=ALGORITHMS, default="sgbm")
+    parser.add_argument("--num_disparities", type=int, default=128)
+    parser.add_argument("--block_size", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None, help="İş parçacığı sayısı (Varsayılan: tüm çekirdekler)")
+    parser.add_argument("--clouds", action="store_true", help="Her çift için XYZRGB .ply de yaz")
+    parser.add_argument("--report", type=int, default=0,
+                        help="İşlemek yerine ilk N çiftle çekirdek sayısına göre çift/s raporu ver")
+    parser.add_argument("--cores", type=int, nargs="+", default=None, help="Raporda denenecek çekirdek sayıları")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    calibration = StereoCalibration.from_file(args.calibration, args.resolution)
+    options = {"algorithm": args.algorithm, "num_disparities": args.num_disparities, "block_size": args.block_size}
+
+    if args.report:
+        pairs = []
+        for pair in iter_pairs(args.input):
+            pairs.append(pair)
+            if len(pairs) == args.report:
+                break
+        if not pairs:
+            print(f"{args.input}: sol/sağ çift bulunamadı")
+            return
+        cpu_count = os.cpu_count() or 1
+        cores = args.cores or sorted({1, 2, 4, 8, 16, cpu_count} & set(range(1, cpu_count + 1)))
+        throughput_report(pairs, calibration, cores, **options)
+        return
+
+    output = args.output or os.path.join(os.path.dirname(args.input) if os.path.isfile(args.input) else args.input,
+                                         "stereo")
+    matcher = StereoMatcher(calibration, workers=args.workers, **options)
+    writer = StereoOutputWriter(output, clouds=args.clouds)
+    start = time.perf_counter()
+    for label, left, right in iter_pairs(args.input):
+        if args.clouds:
+            depth, cloud = matcher.cloud(left, right)
+        else:
+            depth, cloud = matcher.depth(left, right), None
+        writer.submit((label, depth, cloud), copy=False)
+    writer.close()
+    matcher.close()
+    elapsed = time.perf_counter() - start
+    stats = matcher.stats()
+    print(
+        f"{stats['pairs']} çift -> {output}: {stats['pairs'] / max(elapsed, 1e-9):.2f} çift/s toplam, "
+        f"eşleştirme {stats['pairs_per_s']:.2f} çift/s ({stats['workers']} iş parçacığı)"
+    )
+
+
+if __name__ == "__main__":
+    main()
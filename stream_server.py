@@ -0,0 +1,525 @@
+"""Headless publishing of color, depth and decimated point clouds to local subscribers.
+
+Frames are posted with publish(frame) from the grab loop, which never blocks:
+a single encoder stage keeps only the latest frame and encodes each stream at
+most once per frame, and only when some subscriber is due for it. The encoded
+message is then fanned out to every subscriber's own small mailbox; a sender
+thread per subscriber drains it. A subscriber that falls behind loses its
+oldest messages, and one whose socket stays blocked for `send_timeout` is
+disconnected, so a laggy viewer never slows down capture or other viewers.
+
+Subscribers connect over TCP or a Unix socket and send one JSON line naming
+the streams they want and the highest rate for each, e.g.
+`{"color": 15, "cloud": 5}` (0 = every frame). Every message is a HEADER
+followed by its payload:
+
+- color: JPEG of the left image;
+- depth: 16-bit PNG of depth in millimeters, 0 where depth is missing;
+- depth_zdc: the same millimeters as a depth_codec packet (intra-only, since
+  subscribers may skip frames), smaller and faster to encode than PNG;
+- depth_view: JPEG of the colorized depth;
+- cloud: `width` points as float32 XYZ (meters) followed by uint8 RGB.
+
+Browsers can watch http://host:port/color.mjpg and /depth.mjpg (MJPEG, an
+optional ?fps= limit) without any client code.
+
+    python stream_server.py --synthetic --http_port 8080
+    python stream_server.py --serial 12345678 --port 9000 --unix /tmp/zed.sock
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from buffer_pool import BufferPool
+from depth_codec import DepthDecoder, DepthEncoder
+from depth_colorizer import DepthColorizer
+from frame_source import RESOLUTIONS, FrameGrabber, ReplayFrameSource, SyntheticFrameSource, ZEDFrameSource
+from pipeline import Frame, LatestMailbox, StageWorker
+from point_cloud import decode_xyzrgba
+
+STREAMS = {"color": 1, "depth": 2, "depth_view": 3, "cloud": 4, "depth_zdc": 5}
+STREAM_NAMES = {number: name for name, number in STREAMS.items()}
+MJPEG_PATHS = {"/color.mjpg": "color", "/depth.mjpg": "depth_view"}
+
+# magic, stream, frame id, timestamp (ns), width (points for clouds), height, payload bytes
+HEADER = struct.Struct("<4sB3xQqIII")
+MAGIC = b"ZEDS"
+MJPEG_BOUNDARY = b"frame"
+HANDSHAKE_TIMEOUT = 2.0
+# Disconnected subscribers kept for stats(); older ones only count in the totals
+DISCONNECTED_HISTORY = 32
+
+
+class Message:
+    """One encoded stream frame, shared read-only by every subscriber it is sent to."""
+
+    __slots__ = ("stream", "header", "payload")
+
+    def __init__(self, stream, info, width, height, payload):
+        self.stream = stream
+        self.payload = memoryview(payload).cast("B")
+        self.header = HEADER.pack(MAGIC, STREAMS[stream], info.frame_id, info.timestamp,
+                                  width, height, len(self.payload))
+
+
+def binary_framing(message):
+    return (message.header, message.payload)
+
+
+def mjpeg_framing(message):
+    part = b"--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % (
+        MJPEG_BOUNDARY, len(message.payload))
+    return (part, message.payload, b"\r\n")
+
+
+class Subscriber:
+    """A connected client: wanted streams with their minimum interval, and a sender thread.
+
+    offer() only appends to a bounded mailbox that drops the oldest message
+    when full; the sender thread does the (possibly slow) socket writes.
+    """
+
+    def __init__(self, connection, name, rates, framing, queue_size=2, send_timeout=1.0):
+        self.connection = connection
+        self.name = name
+        self.intervals = {stream: 1.0 / fps if fps > 0 else 0.0 for stream, fps in rates.items()}
+        self.framing = framing
+        self.mailbox = LatestMailbox(queue_size)
+        self.next_due = dict.fromkeys(self.intervals, 0.0)
+        self.sent = 0
+        self.bytes_sent = 0
+        self.error = None
+        connection.settimeout(send_timeout)
+        self.thread = threading.Thread(target=self._send_loop, name=f"stream-{name}", daemon=True)
+
+    def due(self, stream, now):
+        return stream in self.next_due and now >= self.next_due[stream]
+
+    def offer(self, message, now):
+        # Rate limit on the schedule, not on the last send, so frame jitter does not lower the rate;
+        # after a gap longer than the interval the schedule restarts from now
+        interval = self.intervals[message.stream]
+        scheduled = self.next_due[message.stream]
+        self.next_due[message.stream] = (scheduled if now - scheduled < interval else now) + interval
+        self.mailbox.put(Frame(None, message))
+
+    @property
+    def connected(self):
+        return not self.mailbox.closed
+
+    def _send_loop(self):
+        try:
+            while not self.mailbox.closed:
+                frame = self.mailbox.get(timeout=0.5)
+                if frame is None:
+                    continue
+                for part in self.framing(frame.data):
+                    self.connection.sendall(part)
+                    self.bytes_sent += len(part)
+                self.sent += 1
+        except OSError as error:
+            # Includes socket.timeout: a client that stops reading is cut off
+            self.error = error
+        finally:
+            self.close()
+
+    def close(self):
+        self.mailbox.close()
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def stats(self):
+        return {
+            "streams": sorted(self.intervals),
+            "sent": self.sent,
+            "dropped": self.mailbox.dropped,
+            "mb_sent": self.bytes_sent / 1e6,
+            "error": None if self.error is None else repr(self.error),
+        }
+
+
+def cloud_from_depth(depth, left, stride, focal):
+    """Decimated XYZ / RGB from a depth map and its BGRA image with a pinhole model (no SDK cloud)."""
+    height, width = depth.shape
+    depth = depth[::stride, ::stride]
+    valid = np.isfinite(depth)
+    z = depth[valid]
+    rows, cols = np.nonzero(valid)
+    xyz = np.empty((len(z), 3), dtype=np.float32)
+    np.multiply(cols * stride - width / 2, z / focal, out=xyz[:, 0], casting="unsafe")
+    np.multiply(rows * stride - height / 2, z / focal, out=xyz[:, 1], casting="unsafe")
+    xyz[:, 2] = z
+    colors = left[::stride, ::stride][valid][:, 2::-1]
+    return xyz, colors
+
+
+class StreamServer:
+    """Publishes frames from one camera to TCP, Unix-socket and MJPEG-over-HTTP subscribers.
+
+    publish(frame) takes a Frame whose data has "left" (BGRA), "depth"
+    (float32 meters) and optionally "cloud" (XYZRGBA) and releases it once
+    encoded. Clouds are decimated to at most `max_cloud_points`; without an
+    SDK cloud they are back-projected from depth with `focal` (pixels,
+    default 0.6 x width).
+    """
+
+    def __init__(self, host="127.0.0.1", port=9000, unix_path=None, http_port=None,
+                 jpeg_quality=80, png_compression=1, max_cloud_points=50_000, focal=None,
+                 depth_range=(0.4, 5.0), queue_size=2, send_timeout=1.0):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.http_port = http_port
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.png_params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        self.max_cloud_points = max_cloud_points
+        self.focal = focal
+        self.depth_colorizer = DepthColorizer(*depth_range, colormap="Colormap")
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.pool = BufferPool()
+        self.depth_encoder = DepthEncoder(keyframe_interval=1, pool=self.pool)
+        self.encoder = StageWorker("stream-encoder", self._encode)
+        self.subscribers = []
+        self.disconnected = deque(maxlen=DISCONNECTED_HISTORY)
+        self.disconnects = 0
+        self.disconnected_sent = 0
+        self.disconnected_dropped = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._running = False
+        self.encoded = dict.fromkeys(STREAMS, 0)
+        self.encode_seconds = dict.fromkeys(STREAMS, 0.0)
+
+    def start(self):
+        self._running = True
+        if self.port is not None:
+            listener = socket.create_server((self.host, self.port))
+            self.port = listener.getsockname()[1]
+            self._listen(listener, self._handshake_binary, "tcp")
+        if self.unix_path is not None:
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.unix_path)
+            listener.listen()
+            self._listen(listener, self._handshake_binary, "unix")
+        if self.http_port is not None:
+            listener = socket.create_server((self.host, self.http_port))
+            self.http_port = listener.getsockname()[1]
+            self._listen(listener, self._handshake_http, "http")
+        self.encoder.start()
+        return self
+
+    def _listen(self, listener, handshake, kind):
+        listener.settimeout(0.5)
+        thread = threading.Thread(target=self._accept_loop, args=(listener, handshake, kind),
+                                  name=f"stream-{kind}-accept", daemon=True)
+        self._listeners.append((listener, thread))
+        thread.start()
+
+    def _accept_loop(self, listener, handshake, kind):
+        while self._running:
+            try:
+                connection, address = listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            # The handshake reads from the client, so it must not hold up the accept loop
+            threading.Thread(target=self._add_subscriber, args=(connection, address, handshake, kind),
+                             daemon=True).start()
+
+    def _add_subscriber(self, connection, address, handshake, kind):
+        connection.settimeout(HANDSHAKE_TIMEOUT)
+        try:
+            rates, framing = handshake(connection)
+        except (OSError, ValueError) as error:
+            print(f"stream: {kind} istemcisi reddedildi: {error!r}")
+            connection.close()
+            return
+        name = f"{kind}-{address[1] if isinstance(address, tuple) else len(self.subscribers)}"
+        subscriber = Subscriber(connection, name, rates, framing, self.queue_size, self.send_timeout)
+        with self._lock:
+            self.subscribers.append(subscriber)
+        subscriber.thread.start()
+
+    def _handshake_binary(self, connection):
+        line = b""
+        while not line.endswith(b"\n"):
+            chunk = connection.recv(1)
+            if not chunk or len(line) > 4096:
+                raise ValueError("incomplete subscription line")
+            line += chunk
+        rates = json.loads(line) or dict.fromkeys(STREAMS, 0)
+        if not isinstance(rates, dict):
+            raise ValueError(f"subscription must be a JSON object, got {type(rates).__name__}")
+        unknown = set(rates) - set(STREAMS)
+        if unknown:
+            raise ValueError(f"unknown streams {sorted(unknown)}")
+        try:
+            return {stream: float(fps) for stream, fps in rates.items()}, binary_framing
+        except TypeError:
+            raise ValueError(f"stream rates must be numbers: {rates}") from None
+
+    def _handshake_http(self, connection):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = connection.recv(4096)
+            if not chunk or len(request) > 16384:
+                raise ValueError("incomplete HTTP request")
+            request += chunk
+        method, target = request.split(b"\r\n", 1)[0].decode("latin-1").split(" ")[:2]
+        url = urlsplit(target)
+        if method != "GET" or url.path not in MJPEG_PATHS:
+            body = b"".join(b'<img src="%s"> ' % path.encode() for path in MJPEG_PATHS)
+            status = b"200 OK" if url.path == "/" else b"404 Not Found"
+            connection.sendall(b"HTTP/1.0 %s\r\nContent-Type: text/html\r\nContent-Length: %d\r\n\r\n%s"
+                               % (status, len(body), body))
+            raise ValueError(f"not a stream: {target}")
+        fps = float(parse_qs(url.query).get("fps", ["0"])[0])
+        connection.sendall(
+            b"HTTP/1.0 200 OK\r\nCache-Control: no-cache\r\n"
+            b"Content-Type: multipart/x-mixed-replace; boundary=%s\r\n\r\n" % MJPEG_BOUNDARY
+        )
+        return {MJPEG_PATHS[url.path]: fps}, mjpeg_framing
+
+    def publish(self, frame):
+        """Hand a frame to the encoder; an unencoded older frame is released and dropped."""
+        self.encoder.submit(frame)
+
+    def wants(self):
+        """Streams some subscriber is due for, so callers can skip retrieving the rest."""
+        now = time.monotonic()
+        with self._lock:
+            return {stream for stream in STREAMS for sub in self.subscribers if sub.due(stream, now)}
+
+    def _encode(self, frame):
+        now = time.monotonic()
+        with self._lock:
+            gone = [sub for sub in self.subscribers if not sub.connected]
+            for subscriber in gone:
+                self.subscribers.remove(subscriber)
+            self._retire(gone)
+            subscribers = list(self.subscribers)
+        for stream, encode in (("color", self._encode_color), ("depth", self._encode_depth),
+                               ("depth_zdc", self._encode_depth_zdc), ("depth_view", self._encode_depth_view),
+                               ("cloud", self._encode_cloud)):
+            due = [sub for sub in subscribers if sub.due(stream, now)]
+            if not due:
+                continue
+            start = time.perf_counter()
+            message = encode(frame)
+            self.encode_seconds[stream] += time.perf_counter() - start
+            self.encoded[stream] += 1
+            # Encoded once, the same Message object goes to every subscriber
+            for subscriber in due:
+                subscriber.offer(message, now)
+
+    def _jpeg(self, image):
+        ok, encoded = cv2.imencode(".jpg", image, self.jpeg_params)
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return encoded
+
+    def _encode_color(self, frame):
+        left = frame.data["left"]
+        height, width = left.shape[:2]
+        bgr = cv2.cvtColor(left, cv2.COLOR_BGRA2BGR, dst=self.pool.get("stream.bgr", (height, width, 3), np.uint8))
+        return Message("color", frame.info, width, height, self._jpeg(bgr))
+
+    def _encode_depth(self, frame):
+        depth = frame.data["depth"]
+        height, width = depth.shape
+        millimeters = self.pool.get("stream.mm", (height, width), np.float32)
+        np.multiply(depth, 1000.0, out=millimeters)
+        # NaN/inf and out-of-range depth become 0, the "no depth" value
+        millimeters[~((millimeters > 0) & (millimeters < 65535))] = 0
+        depth_mm = self.pool.get("stream.depth_mm", (height, width), np.uint16)
+        np.copyto(depth_mm, millimeters, casting="unsafe")
+        ok, encoded = cv2.imencode(".png", depth_mm, self.png_params)
+        if not ok:
+            raise ValueError("PNG encoding failed")
+        return Message("depth", frame.info, width, height, encoded)
+
+    def _encode_depth_zdc(self, frame):
+        depth = frame.data["depth"]
+        height, width = depth.shape
+        return Message("depth_zdc", frame.info, width, height, self.depth_encoder.encode(depth))
+
+    def _encode_depth_view(self, frame):
+        depth = frame.data["depth"]
+        height, width = depth.shape
+        rgb = self.depth_colorizer.colorize(depth)
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=self.pool.get("stream.depth_bgr", (height, width, 3), np.uint8))
+        return Message("depth_view", frame.info, width, height, self._jpeg(bgr))
+
+    def _encode_cloud(self, frame):
+        depth = frame.data["depth"]
+        height, width = depth.shape
+        stride = max(1, math.ceil(math.sqrt(height * width / self.max_cloud_points)))
+        if "cloud" in frame.data:
+            xyz, colors = decode_xyzrgba(frame.data["cloud"][::stride, ::stride])
+        else:
+            xyz, colors = cloud_from_depth(depth, frame.data["left"], stride, self.focal or width * 0.6)
+        count = len(xyz)
+        payload = np.empty(count * 15, dtype=np.uint8)
+        payload[:count * 12].view(np.float32).reshape(count, 3)[:] = xyz
+        payload[count * 12:].reshape(count, 3)[:] = colors
+        return Message("cloud", frame.info, count, 1, payload)
+
+    def stop(self):
+        self._running = False
+        for listener, thread in self._listeners:
+            thread.join()
+            listener.close()
+        self._listeners = []
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+        self.encoder.stop()
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+            subscriber.thread.join(self.send_timeout + 1.0)
+        with self._lock:
+            self._retire(subscribers)
+
+    def _retire(self, subscribers):
+        """Move gone subscribers into the bounded history and the running totals (caller holds _lock)."""
+        for subscriber in subscribers:
+            self.disconnects += 1
+            self.disconnected_sent += subscriber.sent
+            self.disconnected_dropped += subscriber.mailbox.dropped
+            self.disconnected.append(subscriber)
+
+    def stats(self):
+        with self._lock:
+            subscribers = {sub.name: sub.stats() for sub in [*self.subscribers, *self.disconnected]}
+            connected = len(self.subscribers)
+            disconnected = {"count": self.disconnects, "sent": self.disconnected_sent,
+                            "dropped": self.disconnected_dropped}
+        return {
+            "connected": connected,
+            "disconnected": disconnected,
+            "subscribers": subscribers,
+            "frames": self.encoder.stats(),
+            "encoded": dict(self.encoded),
+            "encode_ms": {stream: 1000 * seconds / max(self.encoded[stream], 1)
+                          for stream, seconds in self.encode_seconds.items()},
+        }
+
+
+class StreamClient:
+    """Minimal subscriber for the binary protocol, for scripts and the throughput benchmark."""
+
+    def __init__(self, address, rates=None):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.connection = socket.socket(family, socket.SOCK_STREAM)
+        self.connection.connect(address)
+        self.connection.sendall(json.dumps(rates or {}).encode() + b"\n")
+        self.file = self.connection.makefile("rb")
+
+    def read(self):
+        """(stream, frame id, timestamp, width, height, payload bytes), or None once the server is gone."""
+        header = self.file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return None
+        magic, stream, frame_id, timestamp, width, height, length = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("Stream out of sync")
+        payload = self.file.read(length)
+        if len(payload) < length:
+            # Cut off mid-message, e.g. disconnected as a slow client
+            return None
+        return STREAM_NAMES[stream], frame_id, timestamp, width, height, payload
+
+    def close(self):
+        self.file.close()
+        self.connection.close()
+
+
+def decode_message(stream, width, height, payload):
+    """Payload -> arrays: BGR image, uint16 depth (mm), or (xyz, rgb) for clouds."""
+    if stream == "depth_zdc":
+        return DepthDecoder().decode_quantized(payload)
+    if stream == "cloud":
+        data = np.frombuffer(payload, dtype=np.uint8)
+        return data[:width * 12].view(np.float32).reshape(width, 3), data[width * 12:].reshape(width, 3)
+    flags = cv2.IMREAD_UNCHANGED if stream == "depth" else cv2.IMREAD_COLOR
+    return cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), flags)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Kamerayı pencere açmadan yerel abonelere yayınlar")
+    sources = parser.add_mutually_exclusive_group(required=True)
+    sources.add_argument("--serial", type=int, default=None, help="Açılacak ZED kameranın seri numarası (0 = ilk bulunan)")
+    sources.add_argument("--capture", type=str, help="Kamera yerine oynatılacak .zcap kaydı")
+    sources.add_argument("--synthetic", action="store_true", help="Kamera yerine sentetik kareler")
+    parser.add_argument("--resolution", type=str, choices=list(RESOLUTIONS), default="HD720",
+                        help="Canlı/sentetik kameranın çözünürlüğü. (Varsayılan: HD720)")
+    parser.add_argument("--fps", type=int, default=30, help="Canlı/sentetik kameranın FPS değeri. (Varsayılan: 30)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Dinlenecek adres. (Varsayılan: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=9000, help="TCP portu. (Varsayılan: 9000)")
+    parser.add_argument("--unix", type=str, default=None, help="Ek olarak dinlenecek Unix soket yolu")
+    parser.add_argument("--http_port", type=int, default=8080, help="MJPEG HTTP portu, 0 = kapalı. (Varsayılan: 8080)")
+    parser.add_argument("--jpeg_quality", type=int, default=80, help="JPEG kalitesi, 0-100. (Varsayılan: 80)")
+    parser.add_argument("--max_cloud_points", type=int, default=50_000,
+                        help="Yayınlanan nokta bulutundaki en fazla nokta sayısı. (Varsayılan: 50000)")
+    parser.add_argument("--queue_size", type=int, default=2,
+                        help="Abone başına bekleyebilecek en fazla mesaj, dolunca en eskisi atılır. (Varsayılan: 2)")
+    return parser.parse_args()
+
+
+def build_source(args):
+    if args.capture:
+        # Kayıt milimetre ile kaydedilmiş olabilir: ReplayFrameSource derinliği metreye çevirir
+        return FrameGrabber(ReplayFrameSource(args.capture, paced=True, loop=True))
+    if args.synthetic:
+        return FrameGrabber(SyntheticFrameSource(args.resolution, args.fps, paced=True))
+    return FrameGrabber(ZEDFrameSource(args.resolution, args.fps, depth_mode="NEURAL", units="METER",
+                                       serial_number=args.serial or None), cloud=True)
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    source = build_source(args)
+    server = StreamServer(
+        args.host, args.port, args.unix, args.http_port or None, jpeg_quality=args.jpeg_quality,
+        max_cloud_points=args.max_cloud_points, queue_size=args.queue_size,
+    ).start()
+    source.open()
+    print(f"yayın: tcp://{args.host}:{server.port}"
+          + (f", http://{args.host}:{server.http_port}/" if server.http_port else "")
+          + (f", unix:{args.unix}" if args.unix else ""))
+    last_stats = time.monotonic()
+    try:
+        while True:
+            try:
+                frame = source.grab()
+            except EOFError:
+                break
+            if frame is not None:
+                server.publish(frame)
+            if time.monotonic() - last_stats >= 5.0:
+                last_stats = time.monotonic()
+                stats = server.stats()
+                print(f"{stats['connected']} abone, kodlanan: {stats['encoded']}, "
+                      f"atlanan kare: {stats['frames']['dropped']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        source.close()
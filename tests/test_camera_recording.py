@@ -0,0 +1,57 @@
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera import Camera
+from capture_file import CaptureReader
+from frame_source import SyntheticFrameSource
+
+FRAMES = 3
+
+
+def recording_args(**overrides):
+    args = dict(
+        frame_rate=30, video_resolution="VGA", video_save=False, frame_save=False, raw_save=True,
+        save_time=60, frame_time=1.0, show=False, queue_size=8, drop_when_full=False,
+        image_format="png", png_compression=1, jpeg_quality=90, depth_codec="zlib",
+        keyframe_interval=2, profile=False, profile_log=None,
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def source_depths(frames):
+    source = SyntheticFrameSource("VGA", frames=frames)
+    source.open()
+    depth = source.new_mat()
+    depths = []
+    for _ in range(frames):
+        source.grab(depth=True)
+        source.retrieve_depth(depth)
+        depths.append(np.array(depth.get_data()))
+    source.close()
+    return depths
+
+
+def test_codec_recording_keeps_meter_depth(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source = SyntheticFrameSource("VGA", frames=FRAMES)
+    assert source.depth_unit == "METER"
+    Camera(recording_args(), source=source)
+
+    (path,) = glob.glob("images/*/raw/*.zcap")
+    reader = CaptureReader(path)
+    assert reader.depth is not None
+    assert len(reader) == FRAMES
+    for index, expected in enumerate(source_depths(FRAMES)):
+        depth = reader[index]["depth"]
+        valid = np.isfinite(expected) & (expected > 0)
+        np.testing.assert_array_equal(np.isfinite(depth), valid)
+        # Millimeter quantization, not whole meters
+        np.testing.assert_allclose(depth[valid], expected[valid], atol=0.0006)
+    reader.close()
@@ -1,6 +1,6 @@
+import json
+import os
 import sys
-import open3d as o3d
-import numpy as np
 from PyQt5.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -12,12 +12,45 @@ from PyQt5.QtWidgets import (
     QSplitter,
     QPushButton,
     QFrame,
+    QCheckBox,
+    QSpinBox,
 )
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QVector3D
+from PyQt5.QtCore import Qt, QEvent, QTimer
 from PyQt5.QtGui import QPixmap
-from ZEDCamera import ZEDCameraThread
-import pyqtgraph.opengl as gl
+
+# Toggle button colors per camera state
+STATE_COLORS = {"red": "#DC3545", "amber": "#E0A800", "green": "#28A745"}
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+# Camera selector entry -> camera thread output the camera pane subscribes to
+CAMERA_OUTPUTS = {"Left Camera": "left", "Right Camera": "right", "Both Cameras": "side_by_side"}
+# Per pane: shown at startup, and the rate in Hz it asks for (0 = every frame)
+PANE_DEFAULTS = {
+    "camera": {"enabled": True, "rate": 0},
+    "depth": {"enabled": True, "rate": 0},
+    "point_cloud": {"enabled": True, "rate": 0},
+}
+
+
+# Target frame rates offered by the adaptive quality controller (0 = off)
+TARGET_FPS = (0, 30, 15, 10, 5)
+# ZEDCameraThread.plane_mode values offered by the plane selector
+PLANE_MODES = ("off", "mark", "remove")
+
+
+def load_config(path=CONFIG_PATH):
+    """config.json as a dict; a missing or empty file means defaults everywhere."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as handle:
+        text = handle.read()
+    return json.loads(text) if text.strip() else {}
+
+
+def pane_settings(config):
+    """Pane settings from the "panes" section, completed with PANE_DEFAULTS."""
+    return {pane: {**defaults, **config.get("panes", {}).get(pane, {})} for pane, defaults in PANE_DEFAULTS.items()}
+
 
 class EnhancedMainWindow(QMainWindow):
     def __init__(self):
@@ -31,20 +64,80 @@ class EnhancedMainWindow(QMainWindow):
         self.main_layout = QVBoxLayout()
         self.central_widget.setLayout(self.main_layout)
         self.setCentralWidget(self.central_widget)
+        self.config = load_config()
+        self.panes = pane_settings(self.config)
+        self.quality_config = self.config.get("quality", {})
 
         # Initialize top control panel and main content
         self.init_top_control_panel()
         self.init_main_content()
 
-        # Initialize ZED camera thread
-        self.camera_thread = ZEDCameraThread()
+        # Kamera iş parçacığı ve 3B görünüm, pencere açıldıktan sonra finish_startup'ta kurulur:
+        # ZED SDK, OpenCV ve pyqtgraph.opengl yüklenirken pencere boş beklemez
+        self.camera_thread = None
+        self.camera_running = False  # Kamera başlangıçta kapalı
+        self.display_sizes = {}
+        self.plane_summary = None
+        self.set_toggle_state("Loading...", "red", enabled=False)
+        # Kare başına maliyet: yakalama ve her aşama (abonesi olmayan aşama 0 ms)
+        self.frame_cost_label = QLabel()
+        self.statusBar().addPermanentWidget(self.frame_cost_label)
+        # 3B görünüm istatistikleri kalıcı etikette: durum ve hata mesajlarının üzerine yazmaz
+        self.render_stats_label = QLabel()
+        self.statusBar().addPermanentWidget(self.render_stats_label)
+        QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """Import the heavy modules, then build the 3D view and the camera thread."""
+        from ZEDCamera import ZEDCameraThread
+        from depth_colorizer import COLORMAPS
+
+        self.depth_option_selector.addItems(list(COLORMAPS))
+        self.init_point_cloud_widget()
+        self.content_layout.replaceWidget(self.gl_placeholder, self.gl_widget)
+        self.gl_placeholder.deleteLater()
+
+        self.gl_widget.setVisible(self.view_3d_checkbox.isChecked())
+
+        # Initialize ZED camera thread; the panes subscribe to the outputs they show
+        profile = self.config.get("profile", {})
+        self.camera_thread = ZEDCameraThread(
+            outputs=(), quality=self.quality_config,
+            profile=self.profile_checkbox.isChecked(), profile_log=profile.get("log") or None,
+            static_scene=dict(self.config.get("static_scene", {}), enabled=self.static_scene_checkbox.isChecked()),
+            planes=dict(self.config.get("planes", {}), mode=PLANE_MODES[self.plane_selector.currentIndex()]),
+            cloud_filter=dict(self.config.get("cloud_filter", {}), enabled=self.cloud_filter_checkbox.isChecked()),
+        )
+        self.gl_widget.profiler = self.camera_thread.profiler
         self.camera_thread.image_signal.connect(self.update_camera_display)
         self.camera_thread.depth_signal.connect(self.update_depth_display)
         self.camera_thread.point_cloud_signal.connect(self.update_point_cloud_display)
-        self.camera_running = False  # Kamera başlangıçta kapalı
+        self.camera_thread.camera_state_signal.connect(self.update_camera_state)
+        self.camera_thread.pipeline_stats_signal.connect(self.update_pipeline_stats)
+        self.camera_thread.quality_signal.connect(self.update_quality)
+        self.camera_thread.profile_signal.connect(self.update_profile_overlay)
+        self.camera_thread.plane_signal.connect(self.update_planes)
+        self.update_quality(self.camera_thread.quality_state())
+        # Seçimler kamera iş parçacığı kurulmadan önce değişmiş olabilir
+        self.on_combo_box_1_changed(self.combo_box_1.currentText())
+        self.on_combo_box_2_changed(self.combo_box_2.currentText())
+        self.gl_widget.view_moved.connect(self.camera_thread.view_position_signal.emit)
+        self.gl_widget.render_stats.connect(self.update_render_stats)
 
         self.camera_selector.currentTextChanged.connect(self.camera_selection_changed)
         self.depth_option_selector.currentTextChanged.connect(self.depth_selection_changed)
+        self.depth_auto_range_checkbox.toggled.connect(self.depth_auto_range_changed)
+        self.scene_map_checkbox.toggled.connect(self.scene_map_changed)
+        self.organized_checkbox.toggled.connect(self.organized_cloud_changed)
+        self.camera_thread.pick_result_signal.connect(self.update_pick_result)
+        self.view_3d_checkbox.toggled.connect(self.view_3d_changed)
+        self.profile_checkbox.toggled.connect(self.profile_changed)
+        self.static_scene_checkbox.toggled.connect(self.camera_thread.static_scene_signal.emit)
+        self.plane_selector.currentIndexChanged.connect(self.plane_mode_changed)
+        self.cloud_filter_checkbox.toggled.connect(self.camera_thread.cloud_filter_signal.emit)
+        self.camera_display_area.installEventFilter(self)
+        self.refresh_subscriptions()
+        self.set_toggle_state("Disconnected", "red")
 
     def init_top_control_panel(self):
         """Initialize the top control panel with a toggle button, two combo boxes and a save button."""
@@ -63,24 +156,78 @@ class EnhancedMainWindow(QMainWindow):
         self.toggle_button.clicked.connect(self.toggle_camera)
         self.control_layout.addWidget(self.toggle_button)
 
-        # Birinci ComboBox
+        # Birinci ComboBox: uyarlamalı kalitenin hedef FPS'i
         self.combo_box_1 = QComboBox()
-        self.combo_box_1.addItems(["Option 1", "Option 2", "Option 3"])
+        self.combo_box_1.addItems([f"Target: {fps} FPS" if fps else "Target: Off" for fps in TARGET_FPS])
+        target_fps = self.quality_config.get("target_fps", 0)
+        if target_fps in TARGET_FPS:
+            self.combo_box_1.setCurrentIndex(TARGET_FPS.index(target_fps))
         self.combo_box_1.setStyleSheet(
             "padding: 5px; color: #ffffff; background-color: #333;"
         )
         self.combo_box_1.currentTextChanged.connect(self.on_combo_box_1_changed)
         self.control_layout.addWidget(self.combo_box_1)
 
-        # İkinci ComboBox
+        # İkinci ComboBox: kalite seviyesi, otomatik ya da elle sabitlenmiş (0 = en iyi)
         self.combo_box_2 = QComboBox()
-        self.combo_box_2.addItems(["Option A", "Option B", "Option C"])
+        levels = self.quality_config.get("levels", 6)
+        self.combo_box_2.addItems(["Quality: Auto"] + [f"Quality: {level}" for level in range(levels)])
         self.combo_box_2.setStyleSheet(
             "padding: 5px; color: #ffffff; background-color: #333;"
         )
         self.combo_box_2.currentTextChanged.connect(self.on_combo_box_2_changed)
         self.control_layout.addWidget(self.combo_box_2)
 
+        # Uygulanan kalite ayarları: voksel, bulut adımı, ekran ve derinlik ölçeği
+        self.quality_label = QLabel()
+        self.quality_label.setStyleSheet("padding: 5px; color: #aaaaaa; font-size: 12px;")
+        self.control_layout.addWidget(self.quality_label)
+
+        # 3B görünüm kapalıyken nokta bulutu ne alınır ne hesaplanır
+        self.view_3d_checkbox = QCheckBox("3D View")
+        self.view_3d_checkbox.setChecked(self.panes["point_cloud"]["enabled"])
+        self.view_3d_checkbox.setStyleSheet("padding: 5px; color: #ffffff;")
+        self.control_layout.addWidget(self.view_3d_checkbox)
+
+        # Performans katmanı: aşama süreleri (p50/p95/p99) ve kameradan ekrana gecikme
+        self.profile_checkbox = QCheckBox("Profile")
+        self.profile_checkbox.setChecked(self.config.get("profile", {}).get("enabled", False))
+        self.profile_checkbox.setStyleSheet("padding: 5px; color: #ffffff;")
+        self.control_layout.addWidget(self.profile_checkbox)
+
+        # Sabit sahne: değişmeyen derinlik ve bulut yeniden hesaplanmaz, değişen bölgeler ayrıca hesaplanır
+        self.static_scene_checkbox = QCheckBox("Static Scene")
+        self.static_scene_checkbox.setChecked(self.config.get("static_scene", {}).get("enabled", False))
+        self.static_scene_checkbox.setStyleSheet("padding: 5px; color: #ffffff;")
+        self.control_layout.addWidget(self.static_scene_checkbox)
+
+        # Düzlem ayırma: zemin / masa noktaları 3B görünümde boyanır ya da buluttan çıkarılır
+        self.plane_selector = QComboBox()
+        self.plane_selector.addItems([f"Planes: {mode.capitalize()}" for mode in PLANE_MODES])
+        plane_mode = self.config.get("planes", {}).get("mode", "off")
+        if plane_mode in PLANE_MODES:
+            self.plane_selector.setCurrentIndex(PLANE_MODES.index(plane_mode))
+        self.plane_selector.setStyleSheet(
+            "padding: 5px; color: #ffffff; background-color: #333;"
+        )
+        self.control_layout.addWidget(self.plane_selector)
+
+        # Bulut filtreleri: aralık dışı, uçuşan ve yalnız noktalar çözülmeden önce atılır
+        self.cloud_filter_checkbox = QCheckBox("Filters")
+        self.cloud_filter_checkbox.setChecked(self.config.get("cloud_filter", {}).get("enabled", False))
+        self.cloud_filter_checkbox.setStyleSheet("padding: 5px; color: #ffffff;")
+        self.control_layout.addWidget(self.cloud_filter_checkbox)
+
+        # Sahne haritası: kareler zamanla tek bir voksel haritasında birleştirilir
+        self.scene_map_checkbox = QCheckBox("Scene Map")
+        self.scene_map_checkbox.setStyleSheet("padding: 5px; color: #ffffff;")
+        self.control_layout.addWidget(self.scene_map_checkbox)
+
+        # Düzenli bulut: HxW ızgara korunur, vokselleştirme yerine adımlı seyreltme
+        self.organized_checkbox = QCheckBox("Organized Cloud")
+        self.organized_checkbox.setStyleSheet("padding: 5px; color: #ffffff;")
+        self.control_layout.addWidget(self.organized_checkbox)
+
         # Kaydet Butonu
         self.save_button = QPushButton("Save")
         self.save_button.setStyleSheet(
@@ -89,22 +236,87 @@ class EnhancedMainWindow(QMainWindow):
         self.save_button.clicked.connect(self.on_save_button_clicked)
         self.control_layout.addWidget(self.save_button)
 
+        # Sürekli kayıt: her N. nokta bulutu karesi kaydedilir (0 = kapalı)
+        self.save_every_spinbox = QSpinBox()
+        self.save_every_spinbox.setRange(0, 1000)
+        self.save_every_spinbox.setPrefix("Every ")
+        self.save_every_spinbox.setSuffix(" frames")
+        self.save_every_spinbox.setSpecialValueText("Every: off")
+        self.save_every_spinbox.setStyleSheet(
+            "padding: 5px; color: #ffffff; background-color: #333;"
+        )
+        self.save_every_spinbox.valueChanged.connect(self.on_save_every_changed)
+        self.control_layout.addWidget(self.save_every_spinbox)
+
         self.main_layout.addWidget(self.control_panel)
 
     def on_combo_box_1_changed(self, text):
-        """Birinci ComboBox'un değeri değiştiğinde yapılacak işlemler."""
-        print("Combo Box 1 seçimi değişti:", text)
-        # Buraya metni kullanarak gerekli mantığı ekleyebilirsiniz.
+        """Hedef FPS: kalite denetleyicisi aşamaları bu kare süresinin altında tutar (Off = kapalı)."""
+        if self.camera_thread is None:
+            return
+        self.camera_thread.target_fps_signal.emit(float(TARGET_FPS[self.combo_box_1.currentIndex()]))
 
     def on_combo_box_2_changed(self, text):
-        """İkinci ComboBox'un değeri değiştiğinde yapılacak işlemler."""
-        print("Combo Box 2 seçimi değişti:", text)
-        # Buraya metni kullanarak gerekli mantığı ekleyebilirsiniz.
+        """Kalite seviyesi: Auto denetleyiciye bırakır, sayı o seviyeyi sabitler."""
+        if self.camera_thread is None:
+            return
+        self.camera_thread.quality_level_signal.emit(self.combo_box_2.currentIndex() - 1)
+
+    def plane_mode_changed(self, index):
+        if self.camera_thread is None:
+            return
+        self.plane_summary = None
+        self.camera_thread.plane_mode_signal.emit(PLANE_MODES[index])
+
+    def update_planes(self, summary):
+        self.plane_summary = summary
+
+    def profile_changed(self, enabled):
+        if self.camera_thread is None:
+            return
+        self.camera_thread.profile_enabled_signal.emit(enabled)
+        if not enabled:
+            self.profile_overlay.hide()
+
+    def update_profile_overlay(self, snapshot):
+        """Span percentiles from the camera thread, GUI paints and grab-to-screen latency included."""
+        from instrumentation import format_summary
+
+        if not self.profile_checkbox.isChecked():
+            return
+        self.profile_overlay.setText(
+            "\n".join([f"{'span (ms)':<20}  {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}"] + format_summary(snapshot))
+        )
+        self.profile_overlay.adjustSize()
+        self.place_profile_overlay()
+        self.profile_overlay.show()
+        self.profile_overlay.raise_()
+
+    def place_profile_overlay(self):
+        margin = 12
+        self.profile_overlay.move(
+            self.central_widget.width() - self.profile_overlay.width() - margin,
+            self.control_panel.height() + margin,
+        )
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.place_profile_overlay()
+
+    def update_quality(self, quality):
+        self.quality_label.setText(f"Level {quality['level']}: {quality['description']}")
 
     def on_save_button_clicked(self):
-        """Save butonuna tıklandığında yapılacak işlemler."""
-        print("Save butonuna tıklandı.")
-        # Burada seçimleri bir dosyaya kaydetme veya başka bir işlem gerçekleştirebilirsiniz.
+        """Save butonu: sıradaki nokta bulutu arka planda dosyaya yazılır."""
+        if self.camera_thread is None:
+            return
+        self.camera_thread.snapshot_signal.emit()
+
+    def on_save_every_changed(self, every_n):
+        """Her N. karede nokta bulutu kaydı (0 = kapalı)."""
+        if self.camera_thread is None:
+            return
+        self.camera_thread.snapshot_every_signal.emit(every_n)
 
 
     def init_main_content(self):
@@ -114,16 +326,27 @@ class EnhancedMainWindow(QMainWindow):
         # Initialize left panel
         self.init_left_panel()
 
-        # Initialize point cloud widget
-        self.init_point_cloud_widget()
+        # Placeholder until finish_startup creates the OpenGL view
+        self.gl_placeholder = QLabel("Loading 3D view...")
+        self.gl_placeholder.setAlignment(Qt.AlignCenter)
+        self.gl_placeholder.setStyleSheet("background-color: #000000; color: #aaaaaa;")
 
         self.content_layout.addWidget(self.left_splitter)
-        self.content_layout.addWidget(self.gl_widget)
+        self.content_layout.addWidget(self.gl_placeholder)
         self.content_layout.setStretch(0, 2)
         self.content_layout.setStretch(1, 3)
 
         self.main_layout.addLayout(self.content_layout)
 
+        # Yarı saydam performans katmanı, içeriğin sağ üst köşesinde
+        self.profile_overlay = QLabel(self.central_widget)
+        self.profile_overlay.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 170); color: #9be39b; font-family: monospace; "
+            "font-size: 11px; padding: 6px;"
+        )
+        self.profile_overlay.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.profile_overlay.hide()
+
     def init_left_panel(self):
         """Initialize the left panel with camera and option selectors."""
         self.left_splitter = QSplitter(Qt.Vertical)
@@ -145,8 +368,12 @@ class EnhancedMainWindow(QMainWindow):
         self.camera_selector.setStyleSheet(
             "min-width: 150px; max-width: 200px; padding: 5px; color: #ffffff; background-color: #333;"
         )
+        # Kamera görüntüsüne tıklanan pikselin 3B noktası ve uzaklığı
+        self.pick_label = QLabel("Click the image to measure")
+        self.pick_label.setStyleSheet("color: #aaaaaa; font-size: 12px;")
         camera_row_layout.addWidget(camera_label)
         camera_row_layout.addWidget(self.camera_selector)
+        camera_row_layout.addWidget(self.pick_label)
 
         self.camera_display_area = QLabel("Camera Display Area")
         self.camera_display_area.setStyleSheet(
@@ -167,12 +394,14 @@ class EnhancedMainWindow(QMainWindow):
         option_label = QLabel("Depth Option:")
         option_label.setStyleSheet("color: #ffffff; font-size: 12px; margin-right: 10px;")
         self.depth_option_selector = QComboBox()
-        self.depth_option_selector.addItems(["Grayscale", "Colormap"])
         self.depth_option_selector.setStyleSheet(
             "min-width: 150px; max-width: 200px; padding: 5px; color: #ffffff; background-color: #333;"
         )
+        self.depth_auto_range_checkbox = QCheckBox("Auto Range")
+        self.depth_auto_range_checkbox.setStyleSheet("color: #ffffff; font-size: 12px;")
         option_row_layout.addWidget(option_label)
         option_row_layout.addWidget(self.depth_option_selector)
+        option_row_layout.addWidget(self.depth_auto_range_checkbox)
 
         self.depth_display_area = QLabel("Option Display Area")
         self.depth_display_area.setStyleSheet(
@@ -183,11 +412,16 @@ class EnhancedMainWindow(QMainWindow):
 
         self.left_splitter.addWidget(self.camera_selection_widget)
         self.left_splitter.addWidget(self.option_selection_widget)
+        self.camera_selection_widget.setVisible(self.panes["camera"]["enabled"])
+        self.option_selection_widget.setVisible(self.panes["depth"]["enabled"])
 
     def init_point_cloud_widget(self):
         """Initialize the 3D point cloud display area."""
+        import pyqtgraph.opengl as gl
+        from point_cloud_view import PointCloudView
+
         # Create a GLViewWidget for 3D visualization
-        self.gl_widget = gl.GLViewWidget()
+        self.gl_widget = PointCloudView(point_size=2)
         self.gl_widget.setCameraPosition(distance=10)
         self.gl_widget.opts['distance'] = 20
         # Add a grid for reference
@@ -195,9 +429,8 @@ class EnhancedMainWindow(QMainWindow):
         grid.scale(2, 2, 1)
         self.gl_widget.addItem(grid)
 
-        # Initialize the scatter plot item for point cloud
-        self.scatter = gl.GLScatterPlotItem()
-        self.gl_widget.addItem(self.scatter)
+        # The view owns the scatter plot item and uploads prepared batches to it
+        self.scatter = self.gl_widget.scatter
 
     def toggle_camera(self):
         """Toggle the camera state between connected and disconnected."""
@@ -207,64 +440,181 @@ class EnhancedMainWindow(QMainWindow):
             self.start_camera()
 
     def start_camera(self):
-        """Start the ZED camera thread."""
-        if not self.camera_thread.isRunning():
-            self.camera_thread.start()
-        self.camera_thread.cameraStart()
-        self.camera_running = True
-        self.toggle_button.setText("Connected")
-        self.toggle_button.setStyleSheet(
-            "padding: 10px; color: #ffffff; background-color: #28A745; border: none; font-size: 14px;"
-        )
+        """Start the ZED camera thread; the camera opens in the background."""
+        # Ekran boyutları iş parçacığı başlamadan gönderilir, ilk kare doğru boyutta gelir
+        self.display_sizes = {}
+        self.sync_display_size("camera", self.camera_display_area)
+        self.sync_display_size("depth", self.depth_display_area)
+        if self.camera_thread.cameraStart():
+            self.camera_running = True
+            self.set_toggle_state("Connecting...", "amber")
 
     def stop_camera(self):
-        """Stop the ZED camera thread."""
-        if self.camera_thread.isRunning():
-            self.camera_thread.stop()  # Kamerayı güvenli şekilde durdur
+        """Stop the ZED camera thread without blocking the GUI; the button returns on "stopped"."""
         self.camera_running = False
-        self.toggle_button.setText("Disconnected")
+        if self.camera_thread.isRunning():
+            self.camera_thread.stop(wait=False)  # Kamerayı güvenli şekilde durdur
+            self.set_toggle_state("Disconnecting...", "amber", enabled=False)
+        else:
+            self.set_toggle_state("Disconnected", "red")
+
+    def set_toggle_state(self, text, color, enabled=True):
+        self.toggle_button.setText(text)
+        self.toggle_button.setEnabled(enabled)
         self.toggle_button.setStyleSheet(
-            "padding: 10px; color: #ffffff; background-color: #DC3545; border: none; font-size: 14px;"
+            f"padding: 10px; color: #ffffff; background-color: {STATE_COLORS[color]}; border: none; font-size: 14px;"
         )
-        
-    def update_camera_display(self, qimage):
-        """Update the camera display with the latest frame."""
-        if self.camera_running:
-            self.camera_display_area.setPixmap(
-                QPixmap.fromImage(qimage).scaled(
-                    self.camera_display_area.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
-                )
-            )
 
-    def update_depth_display(self, qimage):
+    def update_camera_state(self, state, message):
+        """Follow the camera thread: SDK loading / opening, first frame, failure, stop."""
+        if state in ("loading", "opening"):
+            if self.camera_running:
+                self.set_toggle_state("Connecting...", "amber")
+                self.statusBar().showMessage("Loading ZED SDK..." if state == "loading" else "Opening camera...")
+        elif state == "streaming":
+            self.set_toggle_state("Connected", "green")
+            self.statusBar().clearMessage()
+        else:
+            self.camera_running = False
+            self.set_toggle_state("Disconnected", "red")
+            if state == "failed":
+                self.statusBar().showMessage(message)
+
+
+    def update_camera_display(self, display_image):
+        """Update the camera display with the latest frame (already scaled by the camera thread)."""
+        if self.camera_running:
+            profiler = self.camera_thread.profiler
+            with profiler.span("gui.paint.camera"):
+                self.camera_display_area.setPixmap(QPixmap.fromImage(display_image.qimage))
+            profiler.frame_shown("camera", display_image.info.frame_id)
+        display_image.release()
+        self.sync_display_size("camera", self.camera_display_area)
+
+    def update_depth_display(self, display_image):
         """Update the depth display with the selected option."""
         if self.camera_running:
-            self.depth_display_area.setPixmap(
-                QPixmap.fromImage(qimage).scaled(
-                    self.depth_display_area.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
-                )
-            )
-
-    def update_point_cloud_display(self, point_cloud_data):
+            profiler = self.camera_thread.profiler
+            with profiler.span("gui.paint.depth"):
+                self.depth_display_area.setPixmap(QPixmap.fromImage(display_image.qimage))
+            profiler.frame_shown("depth", display_image.info.frame_id)
+        display_image.release()
+        self.sync_display_size("depth", self.depth_display_area)
+
+    def sync_display_size(self, pane, label):
+        """Tell the camera thread when a pane's label was resized so it scales frames to fit."""
+        size = label.contentsRect().size()
+        size = (size.width(), size.height())
+        if self.display_sizes.get(pane) != size:
+            self.display_sizes[pane] = size
+            self.camera_thread.display_size_signal.emit(pane, *size)
+
+    def update_point_cloud_display(self, batch):
+        """Show a budgeted float32 XYZ/RGBA batch prepared by the point-cloud stage."""
         if self.camera_running:
+            self.gl_widget.show_batch(batch)
+        else:
+            batch.release()
 
-            xyz = point_cloud_data[:, :3]
-            colors = point_cloud_data[:, 3:]
-            
-            alpha = np.ones((colors.shape[0], 1))
-            colors = np.hstack((colors, alpha))
+    def update_render_stats(self, stats):
+        self.render_stats_label.setText(
+            f"3D: {stats['render_fps']:.1f} FPS, {stats['uploads_per_s']:.1f} uploads/s, "
+            f"{stats['points']} points, {stats['skipped_uploads']} unchanged uploads skipped"
+        )
 
-            self.scatter.setData(pos=xyz, color=colors, size=2, pxMode=True)
+    def update_pipeline_stats(self, stats):
+        cost = stats.get("frame_ms", {})
+        text = "Frame: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in cost.items())
+        # Sabit sahne: atlanan kare oranı ve saniyede kazanılan işlem süresi
+        static = {name: stats[name]["static"] for name in ("depth", "point_cloud")
+                  if "static" in stats.get(name, {})}
+        if static:
+            text += " | Static: " + ", ".join(
+                f"{name} {100 * values.get('skip_rate', 0.0):.0f}% skipped" for name, values in static.items()
+            ) + f", {sum(values.get('saved_ms_per_s', 0.0) for values in static.values()):.0f} ms/s saved"
+        # Filtreler: son karede her filtrenin attığı nokta ve kare başına kazanılan süre tahmini
+        filters = stats.get("point_cloud", {}).get("filters")
+        if filters:
+            removed = filters["last_removed"]
+            text += (f" | Filters: {sum(removed.values())} removed ("
+                     + ", ".join(f"{name} {count}" for name, count in removed.items())
+                     + f"), {filters['filter_ms']:.1f} ms, {filters['saved_ms']:.1f} ms saved")
+        # Düzlemler: bulunan düzlem sayısı, noktalarının oranı ve segmentasyon süresi
+        planes = self.plane_summary
+        if planes is not None and self.plane_selector.currentIndex() > 0:
+            text += (f" | Planes: {len(planes['planes'])}, {100 * planes['inlier_ratio']:.0f}% of points, "
+                     f"{planes['ms']:.1f} ms")
+        self.frame_cost_label.setText(text)
+
+    def refresh_subscriptions(self):
+        """Subscribe every visible pane to the output it shows; hidden panes and a minimized window cost nothing."""
+        if self.camera_thread is None:
+            return
+        panes = {
+            "camera": (CAMERA_OUTPUTS[self.camera_selector.currentText()], self.camera_selection_widget),
+            "depth": ("depth_view", self.option_selection_widget),
+            "point_cloud": ("point_cloud", self.gl_widget),
+        }
+        for pane, (output, widget) in panes.items():
+            # Önce eski abonelik kalkar: kamera seçimi değişince panelin çıktısı da değişir
+            self.camera_thread.unsubscribe_signal.emit(pane, "")
+            if widget.isVisible() and not self.isMinimized():
+                self.camera_thread.subscribe_signal.emit(output, pane, float(self.panes[pane]["rate"]))
+
+    def view_3d_changed(self, enabled):
+        self.gl_widget.setVisible(enabled)
+        self.refresh_subscriptions()
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.WindowStateChange:
+            self.refresh_subscriptions()
+        super().changeEvent(event)
 
     def camera_selection_changed(self, selection):
         self.camera_thread.camera_selection_signal.emit(selection)
+        self.refresh_subscriptions()
     
     def depth_selection_changed(self, selection):
         self.camera_thread.depth_option_signal.emit(selection)
 
+    def depth_auto_range_changed(self, enabled):
+        self.camera_thread.depth_auto_range_signal.emit(enabled)
+
+    def scene_map_changed(self, enabled):
+        self.camera_thread.scene_map_signal.emit(enabled)
+
+    def organized_cloud_changed(self, enabled):
+        self.camera_thread.organized_cloud_signal.emit(enabled)
+
+    def eventFilter(self, watched, event):
+        """Clicks on the camera pane become pick requests in 0-1 image coordinates."""
+        if watched is self.camera_display_area and event.type() == QEvent.MouseButtonPress:
+            pixmap = self.camera_display_area.pixmap()
+            if self.camera_running and pixmap is not None and not pixmap.isNull():
+                # QLabel draws the pixmap left-aligned and vertically centered
+                contents = self.camera_display_area.contentsRect()
+                top = contents.y() + (contents.height() - pixmap.height()) / 2
+                u = (event.pos().x() - contents.x()) / pixmap.width()
+                v = (event.pos().y() - top) / pixmap.height()
+                if 0 <= u < 1 and 0 <= v < 1:
+                    self.camera_thread.pick_signal.emit(u, v)
+        return super().eventFilter(watched, event)
+
+    def update_pick_result(self, result):
+        if result["pixel"] is None:
+            self.pick_label.setText("No depth for this view")
+        elif result["point"] is None:
+            self.pick_label.setText(f"({result['pixel'][1]}, {result['pixel'][0]}): no depth")
+        else:
+            x, y, z, distance = result["point"]
+            self.pick_label.setText(
+                f"({result['pixel'][1]}, {result['pixel'][0]}): "
+                f"x={x:.2f} y={y:.2f} z={z:.2f} m, distance {distance:.2f} m"
+            )
+
     def closeEvent(self, event):
         """Handle the close event to stop the camera thread."""
-        if self.camera_thread.isRunning():
+        if self.camera_thread is not None and self.camera_thread.isRunning():
             self.camera_thread.stop()
         super().closeEvent(event)
 
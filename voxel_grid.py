@@ -0,0 +1,189 @@
+import numpy as np
+
+from buffer_pool import pooled_empty
+
+VOXEL_MODES = ("centroid", "first", "nearest")
+COMPRESS_CHUNK = 1 << 15
+
+
+def voxel_keys(xyz, voxel_size, origin=None, pool=None):
+    """Quantize points to integer voxel coordinates.
+
+    The default origin matches Open3D's ``voxel_down_sample`` (min bound minus
+    half a voxel) so both implementations produce the same voxel grouping.
+    """
+    if origin is None:
+        origin = xyz.min(axis=0) - voxel_size * 0.5
+    scaled = pooled_empty(pool, "voxel.scaled", xyz.shape, xyz.dtype)
+    np.subtract(xyz, origin, out=scaled, casting="unsafe")
+    np.multiply(scaled, 1.0 / voxel_size, out=scaled, casting="unsafe")
+    np.floor(scaled, out=scaled)
+    keys = pooled_empty(pool, "voxel.keys", xyz.shape, np.int64)
+    np.copyto(keys, scaled, casting="unsafe")
+    return keys, origin
+
+
+def linearize_keys(keys, pool=None):
+    """Pack (N, 3) integer voxel keys into one int64 per point.
+
+    Returns (linear ids, number of cells in the bounding grid).
+    """
+    key_min = keys.min(axis=0)
+    dims = [int(d) for d in keys.max(axis=0) - key_min + 1]
+    span = dims[0] * dims[1] * dims[2]
+    if span >= 2 ** 63:
+        # Grid too large to pack, fall back to a row-wise unique.
+        _, linear = np.unique(keys - key_min, axis=0, return_inverse=True)
+        linear = linear.reshape(-1).astype(np.int64)
+        return linear, int(linear.max()) + 1
+
+    linear = pooled_empty(pool, "voxel.linear", len(keys), np.int64)
+    np.subtract(keys[:, 0], key_min[0], out=linear)
+    for axis in (1, 2):
+        np.multiply(linear, dims[axis], out=linear)
+        np.add(linear, keys[:, axis], out=linear)
+        np.subtract(linear, key_min[axis], out=linear)
+    return linear, span
+
+
+def group_voxels(linear, span, pool=None):
+    """Sort voxel ids and return (order, starts, counts) for each occupied voxel.
+
+    When the id and the point index fit in 63 bits together they are packed
+    into one int64 and sorted in place, which gives the stable order without
+    the extra index array np.argsort would allocate.
+    """
+    count = len(linear)
+    indices = np.arange(count) if pool is None else pool.arange(count)
+    index_bits = max(1, (count - 1).bit_length())
+    if (span - 1).bit_length() + index_bits <= 63:
+        packed = pooled_empty(pool, "voxel.packed", count, np.int64)
+        np.left_shift(linear, index_bits, out=packed)
+        np.bitwise_or(packed, indices, out=packed)
+        packed.sort()
+        order = pooled_empty(pool, "voxel.order", count, np.int64)
+        np.bitwise_and(packed, (1 << index_bits) - 1, out=order)
+        sorted_keys = np.right_shift(packed, index_bits, out=packed)
+    else:
+        order = np.argsort(linear, kind="stable")
+        sorted_keys = linear[order]
+
+    boundary = pooled_empty(pool, "voxel.boundary", count, bool)
+    boundary[:1] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=boundary[1:])
+    voxel_count = int(np.count_nonzero(boundary))
+
+    # Chunked compress keeps its internal index arrays small.
+    starts = pooled_empty(pool, "voxel.starts", voxel_count, np.int64)
+    filled = 0
+    for chunk in range(0, count, COMPRESS_CHUNK):
+        part = boundary[chunk:chunk + COMPRESS_CHUNK]
+        found = int(np.count_nonzero(part))
+        np.compress(part, indices[chunk:chunk + COMPRESS_CHUNK], out=starts[filled:filled + found])
+        filled += found
+    counts = pooled_empty(pool, "voxel.counts", voxel_count, np.int64)
+    np.subtract(starts[1:], starts[:-1], out=counts[:-1])
+    counts[-1] = count - starts[-1]
+    return order, starts, counts
+
+
+def _mean_per_voxel(values, order, starts, counts, pool, sums_name="voxel.sums"):
+    # Positions and colors share these buffers unless `sums_name` differs;
+    # the result must be used or cast out before the next call.
+    gathered = pooled_empty(pool, "voxel.gathered", values.shape, values.dtype)
+    np.take(values, order, axis=0, out=gathered, mode="clip")
+    # Accumulate in float64 so large voxels keep Open3D's precision.
+    wide = pooled_empty(pool, "voxel.wide", values.shape, np.float64)
+    np.copyto(wide, gathered)
+    sums = pooled_empty(pool, sums_name, (len(starts), values.shape[1]), np.float64)
+    np.add.reduceat(wide, starts, axis=0, out=sums)
+    np.divide(sums, counts[:, None], out=sums)
+    return sums
+
+
+def _cast(values, dtype, name, pool):
+    out = pooled_empty(pool, f"voxel.{name}.out", values.shape, dtype)
+    if np.issubdtype(dtype, np.integer):
+        np.rint(values, out=values)
+    np.copyto(out, values, casting="unsafe")
+    return out
+
+
+def voxel_centroids(xyz, colors=None, voxel_size=0.01, origin=(0.0, 0.0, 0.0), pool=None):
+    """Occupied voxels of a fixed grid: (keys, counts, mean xyz, mean colors).
+
+    Unlike voxel_downsample the grid does not move with the cloud, so keys
+    from different frames refer to the same cells. keys is (V, 3) int64 in
+    lexicographic order; the means are float64 and, with a pool, are views
+    valid until the next call. mean colors is None when colors is None.
+    """
+    xyz = np.asarray(xyz, dtype=np.float32)
+    if len(xyz) == 0:
+        empty_colors = None if colors is None else np.empty((0,) + colors.shape[1:])
+        return np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, 3)), empty_colors
+    keys, _ = voxel_keys(xyz, voxel_size, origin=np.asarray(origin, dtype=np.float32), pool=pool)
+    order, starts, counts = group_voxels(*linearize_keys(keys, pool=pool), pool=pool)
+
+    first = pooled_empty(pool, "voxel.first", len(starts), np.int64)
+    np.take(order, starts, out=first, mode="clip")
+    voxel_ids = pooled_empty(pool, "voxel.ids", (len(starts), 3), np.int64)
+    np.take(keys, first, axis=0, out=voxel_ids, mode="clip")
+
+    mean_xyz = _mean_per_voxel(xyz, order, starts, counts, pool)
+    mean_colors = None
+    if colors is not None:
+        mean_colors = _mean_per_voxel(colors, order, starts, counts, pool, sums_name="voxel.color_sums")
+    return voxel_ids, counts, mean_xyz, mean_colors
+
+
+def voxel_downsample(xyz, colors=None, voxel_size=0.01, mode="centroid", pool=None):
+    """Voxel-grid downsampling on float32 arrays without an Open3D round-trip.
+
+    mode:
+        "centroid" - average position and color of every voxel (Open3D behaviour)
+        "first"    - keep the first point that fell into each voxel
+        "nearest"  - keep the point closest to each voxel center
+
+    With a BufferPool the centroid and first modes run without large
+    allocations and return views into the pool, valid until the next call.
+
+    Returns (down_xyz, down_colors); down_colors is None when colors is None.
+    """
+    if mode not in VOXEL_MODES:
+        raise ValueError(f"Unknown voxel mode: {mode}")
+
+    xyz = np.asarray(xyz, dtype=np.float32)
+    if len(xyz) == 0:
+        empty_colors = None if colors is None else colors[:0]
+        return xyz.reshape(0, 3), empty_colors
+
+    keys, origin = voxel_keys(xyz, voxel_size, pool=pool)
+    order, starts, counts = group_voxels(*linearize_keys(keys, pool=pool), pool=pool)
+
+    if mode == "centroid":
+        sums = _mean_per_voxel(xyz, order, starts, counts, pool)
+        down_xyz = _cast(sums, np.float32, "xyz", pool)
+        down_colors = None
+        if colors is not None:
+            sums = _mean_per_voxel(colors, order, starts, counts, pool)
+            down_colors = _cast(sums, colors.dtype, "colors", pool)
+        return down_xyz, down_colors
+
+    if mode == "first":
+        picked = pooled_empty(pool, "voxel.picked", len(starts), np.int64)
+        np.take(order, starts, out=picked, mode="clip")
+    else:
+        centers = origin + (keys + 0.5) * voxel_size
+        dist = np.einsum("ij,ij->i", xyz - centers, xyz - centers)
+        voxel_ids = np.repeat(np.arange(len(starts)), counts)
+        # Within each voxel (already contiguous in `order`) bring the closest point first.
+        nearest = np.lexsort((dist[order], voxel_ids))
+        picked = order[nearest[starts]]
+
+    down_xyz = pooled_empty(pool, "voxel.xyz.out", (len(picked), 3), np.float32)
+    np.take(xyz, picked, axis=0, out=down_xyz, mode="clip")
+    down_colors = None
+    if colors is not None:
+        down_colors = pooled_empty(pool, "voxel.colors.out", (len(picked),) + colors.shape[1:], colors.dtype)
+        np.take(colors, picked, axis=0, out=down_colors, mode="clip")
+    return down_xyz, down_colors